@@ -0,0 +1,100 @@
+"""
+Admission control for the web server
+
+Requests are sorted into classes (cheap reads, searches, writes), each
+with its own Budget: at most `concurrency` requests of the class run at
+once, and at most `queue` more wait up to `wait` seconds for a slot.
+Anything beyond that is turned away at once, so a burst of slow searches
+fills its own budget instead of every request thread, and recipe pages
+keep being served.  The server answers rejected requests with 503 and a
+Retry-After header.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class Budget:
+    """Concurrency and wait-queue limits for one class of requests"""
+
+    def __init__(self, name: str, concurrency: int, queue: int = 0, wait: float = 1.0):
+        if concurrency < 1 or queue < 0:
+            raise ValueError(f"{name}: concurrency must be at least 1 and queue at least 0")
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.wait = wait
+        self._active = 0
+        self._waiting = 0
+        self._counters = dict(admitted=0, rejected=0, timed_out=0)
+        self._cond = threading.Condition()
+
+    def enter(self) -> bool:
+        """Take a slot, waiting in the queue if there is room; False if refused"""
+        with self._cond:
+            if self._active < self.concurrency and not self._waiting:
+                return self._admit()
+            if self._waiting >= self.queue:
+                self._counters['rejected'] += 1
+                return False
+
+            self._waiting += 1
+            deadline = time.monotonic() + self.wait
+            try:
+                while self._active >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timed_out'] += 1
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            return self._admit()
+
+    def _admit(self) -> bool:
+        self._active += 1
+        self._counters['admitted'] += 1
+        return True
+
+    def leave(self):
+        """Give back a slot taken by enter()"""
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return dict(self._counters, active=self._active, waiting=self._waiting,
+                        concurrency=self.concurrency, queue=self.queue)
+
+
+class AdmissionController:
+    """The budgets of every request class"""
+
+    def __init__(self, budgets: Dict[str, Tuple[int, int]], wait: float = 1.0):
+        """budgets maps a class name to its (concurrency, queue) limits"""
+        self.budgets = {name: Budget(name, concurrency, queue, wait)
+                        for name, (concurrency, queue) in budgets.items()}
+
+    def enter(self, name: Optional[str]) -> bool:
+        """Admit a request of class `name` (None or an unknown class is always admitted)"""
+        budget = self.budgets.get(name)
+        return budget.enter() if budget else True
+
+    def leave(self, name: Optional[str]):
+        budget = self.budgets.get(name)
+        if budget:
+            budget.leave()
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: budget.stats() for name, budget in self.budgets.items()}
+
+
+def parse_budget(text: str) -> Tuple[int, int]:
+    """'CONCURRENCY' or 'CONCURRENCY:QUEUE' as a (concurrency, queue) pair"""
+    concurrency, _, queue = text.partition(':')
+    try:
+        return int(concurrency), int(queue) if queue else 0
+    except ValueError:
+        raise ValueError(f"Expected CONCURRENCY[:QUEUE], got {text!r}") from None
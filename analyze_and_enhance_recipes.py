@@ -9,6 +9,7 @@ Analyze and enhance all main recipes with:
 import sqlite3
 import json
 from pathlib import Path
+from database import RecipeDatabase
 
 def get_main_recipes():
     """Get all non-Janet recipes"""
@@ -29,36 +30,29 @@ def get_main_recipes():
 
     return recipes
 
-def get_recipe_details(recipe_id):
-    """Get full recipe details including ingredients and instructions"""
-    conn = sqlite3.connect('recipes.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    # Get recipe
-    cursor.execute("SELECT * FROM recipes WHERE id = ?", (recipe_id,))
-    recipe = dict(cursor.fetchone())
-
-    # Get ingredients
-    cursor.execute("""
-        SELECT quantity, unit, ingredient_name, preparation
-        FROM ingredients
-        WHERE recipe_id = ?
-        ORDER BY id
-    """, (recipe_id,))
-    recipe['ingredients'] = [dict(row) for row in cursor.fetchall()]
-
-    # Get instructions
-    cursor.execute("""
-        SELECT step_number, instruction_text
-        FROM instructions
-        WHERE recipe_id = ?
-        ORDER BY step_number
-    """, (recipe_id,))
-    recipe['instructions'] = [dict(row) for row in cursor.fetchall()]
+def get_recipes_details(recipe_ids, db=None):
+    """Get full details of many recipes, hydrated in bulk
+
+    Pass an open RecipeDatabase to reuse it; without one a database is
+    opened and closed for this call.  Ingredients keep the order they
+    were stored in.
+    """
+    if db is None:
+        db = RecipeDatabase('recipes.db')
+        try:
+            return get_recipes_details(recipe_ids, db)
+        finally:
+            db.close()
+
+    recipes = db.get_recipes_bulk(recipe_ids)
+    for recipe in recipes:
+        recipe['ingredients'].sort(key=lambda ingredient: ingredient['id'])
+    return recipes
 
-    conn.close()
-    return recipe
+def get_recipe_details(recipe_id, db=None):
+    """Get full recipe details including ingredients and instructions"""
+    recipes = get_recipes_details([recipe_id], db)
+    return recipes[0] if recipes else None
 
 if __name__ == '__main__':
     recipes = get_main_recipes()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+ASGI entry point for the recipe API
+
+Serves exactly the routes of server.py (it wraps the same Flask app), but
+sockets are handled on an asyncio event loop: request bodies are read and
+responses written asynchronously, so a client on a slow network costs a
+coroutine instead of a thread.  Only the work in between -- routing,
+SQLite and JSON encoding -- runs on a bounded thread pool, whose threads
+keep their RecipeDatabase connections from one request to the next.
+
+Streamed responses (NDJSON listings) are produced on a pool thread into a
+small queue, so that thread is held for as long as the client takes to
+read them.
+
+    python asgi_app.py --port 8000 --threads 8      # needs: pip install uvicorn
+    uvicorn asgi_app:app --workers 4
+"""
+
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+import server
+
+# Chunks a streamed response may run ahead of the client
+STREAM_QUEUE_SIZE = 8
+
+
+class ThreadPoolASGI:
+    """ASGI app that runs a WSGI app on a bounded thread pool"""
+
+    def __init__(self, wsgi_app, threads: int = 8, max_body: int = 16 * 1024 * 1024):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.max_body = max_body
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise RuntimeError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = await self._read_body(receive)
+        if body is None:
+            await self._send_simple(send, 413, b'Request body too large')
+            return
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        cancelled = threading.Event()
+        producer = loop.run_in_executor(self.executor, self._produce,
+                                        self._environ(scope, body), queue, loop, cancelled)
+        try:
+            await self._forward(queue, send)
+        except BaseException:
+            # Client went away (or we were cancelled): stop the producer and
+            # unblock it if it is waiting for room in the queue
+            cancelled.set()
+            while not producer.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.sleep(0.01)
+            raise
+        finally:
+            await asyncio.shield(producer)
+
+    async def _read_body(self, receive) -> Optional[bytes]:
+        """The whole request body, or None if it exceeds max_body"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.max_body:
+                return None
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                break
+        return b''.join(chunks)
+
+    @staticmethod
+    async def _forward(queue: asyncio.Queue, send):
+        """Send what the producer queues: ('start', status, headers), chunks, then None"""
+        started = False
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            if isinstance(item, tuple):
+                _, status, headers = item
+                await send({
+                    'type': 'http.response.start',
+                    'status': int(status.split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in headers],
+                })
+                started = True
+            elif item:
+                await send({'type': 'http.response.body', 'body': item, 'more_body': True})
+        if started:
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    def _produce(self, environ: Dict, queue: asyncio.Queue, loop, cancelled: threading.Event):
+        """Run the WSGI app on a pool thread, queueing its response for _forward()"""
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response.update(status=status, headers=headers)
+            return lambda data: chunks_written.append(data)
+
+        chunks_written = []  # from the legacy write() callable
+        iterable = None
+        try:
+            try:
+                iterable = self.wsgi_app(environ, start_response)
+                for chunk in iterable:
+                    if cancelled.is_set():
+                        break
+                    if not response.get('sent'):
+                        put(('start', response['status'], response['headers']))
+                        response['sent'] = True
+                    for data in chunks_written + [chunk]:
+                        put(data)
+                    chunks_written.clear()
+                if not response.get('sent') and not cancelled.is_set():
+                    put(('start', response['status'], response['headers']))
+                    for data in chunks_written:
+                        put(data)
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        except Exception as e:
+            print(f"❌ Error on request {environ.get('PATH_INFO')}: {e}", file=sys.stderr)
+            if not response.get('sent') and not cancelled.is_set():
+                put(('start', '500 Internal Server Error', [('Content-Type', 'text/plain')]))
+                put(b'Internal server error')
+        finally:
+            if not cancelled.is_set():
+                put(None)
+
+    @staticmethod
+    def _environ(scope, body: bytes) -> Dict:
+        """WSGI environ for an ASGI HTTP scope"""
+        server_name, server_port = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server_name,
+            'SERVER_PORT': str(server_port),
+            'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+            'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            environ[name] = f"{environ[name]},{value}" if name in environ else value
+        environ['CONTENT_LENGTH'] = str(len(body))
+        return environ
+
+    @staticmethod
+    async def _send_simple(send, status: int, body: bytes):
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'text/plain'),
+                                (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+# For `uvicorn asgi_app:app`; main() makes its own with --threads
+app = ThreadPoolASGI(server.app)
+
+
+def main():
+    """Serve the API with uvicorn"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Recipe API on an ASGI server (uvicorn)')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to bind to (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='Port to bind to (default: 8000)')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='Threads for database and JSON work (default: 8)')
+    parser.add_argument('--response-cache-mb', type=float, default=32,
+                        help='Memory for cached read responses, 0 to disable (default: 32)')
+    parser.add_argument('--no-sql-timing', action='store_true',
+                        help="Don't time SQL statements (drops DB time from /api/metrics)")
+    args = parser.parse_args()
+
+    if uvicorn is None:
+        parser.error("uvicorn is not installed. Run: pip install uvicorn")
+
+    if not args.no_sql_timing:
+        server.db.enable_profiling(statements=False)
+    server.upgrade_database()
+    if args.response_cache_mb <= 0:
+        server.response_cache = None
+    elif args.response_cache_mb != 32:
+        server.response_cache = server.ResponseCache(max_bytes=int(args.response_cache_mb * 1024 * 1024))
+
+    print(f"🚀 ASGI server at http://{args.host}:{args.port} ({args.threads} worker threads)")
+    uvicorn.run(ThreadPoolASGI(server.app, threads=args.threads),
+                host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
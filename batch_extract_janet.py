@@ -7,6 +7,8 @@ import sqlite3
 import json
 from pathlib import Path
 
+from database import RecipeDatabase
+
 # Progress tracking file
 PROGRESS_FILE = "janet_extraction_progress.json"
 
@@ -47,63 +49,57 @@ def check_if_recipe_exists(filename, db_path='recipes.db'):
     conn.close()
     return result
 
-def insert_recipe(filename, recipe_data, db_path='recipes.db'):
-    """Insert a new recipe into the database"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
+def insert_recipes(recipes, db_path='recipes.db', errors=None):
+    """Insert several recipes ({filename: recipe_data}) in one transaction
+
+    Returns {filename: recipe_id} for the recipes stored.  Rows are written
+    by RecipeDatabase.add_recipes; the calorie column it doesn't know about
+    is filled in before the single commit.  A recipe that can't be stored
+    is left out and, if `errors` is given, recorded there as
+    {filename: exception}; the others still go in.
+    """
+    filenames = list(recipes)
+    rows = []
+    for filename in filenames:
+        recipe_data = recipes[filename]
+        rows.append({
+            'title': recipe_data.get('title'),
+            'description': recipe_data.get('description', ''),
+            'servings': recipe_data.get('servings', ''),
+            'prep_time_minutes': recipe_data.get('prep_time_minutes'),
+            'cook_time_minutes': recipe_data.get('cook_time_minutes'),
+            'source_attribution': 'Janet Mason Cookbook',
+            'original_filename': filename,
+            'file_path': f"Janet Mason/{filename}",
+            'ingredients': recipe_data.get('ingredients', []),
+            'instructions': recipe_data.get('instructions', []),
+        })
+
+    db = RecipeDatabase(db_path)
     try:
-        file_path = f"Janet Mason/{filename}"
-
-        # Insert recipe
-        cursor.execute('''
-            INSERT INTO recipes (
-                title, description, servings, prep_time_minutes, cook_time_minutes,
-                calories_per_serving, source_attribution, original_filename, file_path
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            recipe_data['title'],
-            recipe_data.get('description', ''),
-            recipe_data.get('servings', ''),
-            recipe_data.get('prep_time_minutes'),
-            recipe_data.get('cook_time_minutes'),
-            recipe_data.get('calories_per_serving'),
-            'Janet Mason Cookbook',
-            filename,
-            file_path
-        ))
-
-        recipe_id = cursor.lastrowid
-
-        # Insert ingredients
-        for idx, ingredient in enumerate(recipe_data.get('ingredients', []), 1):
-            cursor.execute('''
-                INSERT INTO ingredients (recipe_id, quantity, unit, ingredient_name, preparation, ingredient_order)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                recipe_id,
-                ingredient.get('quantity'),
-                ingredient.get('unit'),
-                ingredient.get('name'),
-                ingredient.get('preparation'),
-                idx
-            ))
-
-        # Insert instructions
-        for idx, instruction in enumerate(recipe_data.get('instructions', []), 1):
-            cursor.execute('''
-                INSERT INTO instructions (recipe_id, step_number, instruction_text)
-                VALUES (?, ?, ?)
-            ''', (recipe_id, idx, instruction))
-
-        conn.commit()
-        return recipe_id
-
-    except Exception as e:
-        conn.rollback()
-        raise e
+        with db.transaction() as conn:
+            def skip(row, error):
+                if errors is not None:
+                    errors[row['original_filename']] = error
+
+            recipe_ids = {filename: recipe_id
+                          for filename, recipe_id in zip(filenames, db.add_recipes(rows, on_error=skip))
+                          if recipe_id is not None}
+            conn.executemany(
+                'UPDATE recipes SET calories_per_serving = ? WHERE id = ?',
+                [(recipes[filename].get('calories_per_serving'), recipe_id)
+                 for filename, recipe_id in recipe_ids.items()])
+        return recipe_ids
     finally:
-        conn.close()
+        db.close()
+
+def insert_recipe(filename, recipe_data, db_path='recipes.db'):
+    """Insert a new recipe into the database"""
+    errors = {}
+    recipe_ids = insert_recipes({filename: recipe_data}, db_path, errors)
+    if filename in errors:
+        raise errors[filename]
+    return recipe_ids[filename]
 
 def mark_completed(filename):
     """Mark a file as completed"""
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Benchmark RecipeDatabase and the Flask API across synthetic corpus sizes.
+
+Each corpus comes from generate_corpus.py (built on first use) and is
+copied to a scratch file, so write benchmarks never touch the originals.
+Every benchmark records throughput and latency percentiles; results are
+written to JSON and compared against a stored baseline:
+
+    python benchmark.py --sizes 1k,10k --save-baseline   # record a baseline
+    python benchmark.py --sizes 1k,10k                    # compare against it
+
+Exits with code 1 when a benchmark regresses past --threshold.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from database import RecipeDatabase
+from export_to_json import write_recipes_json
+from generate_corpus import CorpusModel, generate_corpus, parse_sizes, size_label
+
+try:
+    import server
+except ImportError:
+    server = None
+    print("Flask not installed; API benchmarks will be skipped. Run: pip install flask flask-cors")
+
+RESULTS_DIR = 'benchmarks'
+
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(0, min(len(sorted_samples) - 1, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[rank]
+
+
+def measure(operation: Callable[[int], int], ops: int, warmup: int = 5) -> Dict:
+    """Time `ops` calls of operation(i); it returns how many items it handled"""
+    for i in range(warmup):
+        operation(-1 - i)
+
+    latencies = []
+    items = 0
+    start = time.perf_counter()
+    for i in range(ops):
+        op_start = time.perf_counter()
+        items += operation(i) or 1
+        latencies.append(time.perf_counter() - op_start)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'ops': ops,
+        'items': items,
+        'seconds': elapsed,
+        'ops_per_sec': ops / elapsed if elapsed else 0.0,
+        'items_per_sec': items / elapsed if elapsed else 0.0,
+        'mean_ms': elapsed * 1000 / ops if ops else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+def database_benchmarks(db: RecipeDatabase, model: CorpusModel, seed: int, ops: int,
+                        scratch_dir: str) -> Dict[str, Callable[[], Dict]]:
+    """Benchmarks against the RecipeDatabase API, keyed by name"""
+    rng = random.Random(seed)
+    conn = db.connect()
+    ids = [row['id'] for row in conn.execute("SELECT id FROM recipes ORDER BY id")]
+    terms = [word.strip('.,:;!?()').lower() for word in model.title_words]
+    terms = [term for term in terms if len(term) > 3] or ['recipe']
+    # Recipes written by the benchmarks come from a different seed than the corpus
+    write_seed = seed + 1
+    pages = {'cursor': None}
+
+    def add_recipe(i):
+        db.add_recipe(model.recipe(write_seed, len(ids) + 10_000 + i))
+
+    def bulk_insert(i):
+        base = len(ids) + 1_000_000 + (i + 10) * 500
+        db.add_recipes((model.recipe(write_seed, base + n) for n in range(500)), batch_size=500)
+        return 500
+
+    def get_recipe(i):
+        db.get_recipe(rng.choice(ids))
+
+    def get_recipes_page(i):
+        recipes, pages['cursor'] = db.get_recipes_page(50, pages['cursor'])
+        return len(recipes)
+
+    def get_all_recipes_offset(i):
+        return len(db.get_all_recipes(limit=50, offset=rng.randrange(len(ids))))
+
+    def search_recipes(i):
+        return len(db.search_recipes(rng.choice(terms), limit=50))
+
+    def get_statistics(i):
+        db.get_statistics()
+
+    def update_recipe(i):
+        recipe_id = rng.choice(ids)
+        db.update_recipe(recipe_id, {'title': f"Benchmark edit {i}", 'rating': i % 6})
+
+    def export_json(i):
+        return write_recipes_json(db.iter_full_recipes(), os.path.join(scratch_dir, 'export.json'))
+
+    return {
+        'add_recipe': lambda: measure(add_recipe, ops),
+        'bulk_insert': lambda: measure(bulk_insert, max(1, ops // 50), warmup=1),
+        'get_recipe': lambda: measure(get_recipe, ops),
+        'get_recipes_page': lambda: measure(get_recipes_page, ops),
+        'get_all_recipes_offset': lambda: measure(get_all_recipes_offset, ops),
+        'search_recipes': lambda: measure(search_recipes, ops),
+        'get_statistics': lambda: measure(get_statistics, ops),
+        'update_recipe': lambda: measure(update_recipe, ops),
+        'export_database_to_json': lambda: measure(export_json, 1, warmup=0),
+    }
+
+
+def api_benchmarks(db: RecipeDatabase, model: CorpusModel, seed: int,
+                   ops: int) -> Dict[str, Callable[[], Dict]]:
+    """Benchmarks through the Flask app (in-process test client)"""
+    if server is None:
+        return {}
+
+    server.db = db
+    if server.response_cache is not None:
+        # Cache keys don't name the database: start empty for each corpus
+        server.response_cache = server.ResponseCache(max_bytes=server.response_cache.max_bytes,
+                                                     ttl=server.response_cache.ttl)
+    client = server.app.test_client()
+    rng = random.Random(seed)
+    ids = [row['id'] for row in db.connect().execute("SELECT id FROM recipes ORDER BY id")]
+    terms = [word.strip('.,:;!?()').lower() for word in model.title_words]
+    terms = [term for term in terms if len(term) > 3] or ['recipe']
+
+    def get(url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        response.get_data()
+
+    return {
+        'api_get_recipe': lambda: measure(lambda i: get(f"/api/recipes/{rng.choice(ids)}"), ops),
+        'api_list_recipes': lambda: measure(lambda i: get("/api/recipes?limit=50"), ops),
+        'api_search': lambda: measure(lambda i: get(f"/api/search?q={rng.choice(terms)}&limit=50"), ops),
+        'api_statistics': lambda: measure(lambda i: get("/api/statistics"), ops),
+    }
+
+
+def run_size(model: CorpusModel, size: int, corpus_dir: str, seed: int, ops: int,
+             only: List[str]) -> Dict[str, Dict]:
+    """Run every selected benchmark against a scratch copy of one corpus"""
+    source = os.path.join(corpus_dir, f"recipes_{size_label(size)}.db")
+    if not os.path.exists(source):
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_corpus(model, size, corpus_dir, seed=seed, write_json=False)
+
+    scratch_dir = tempfile.mkdtemp(prefix='recipe-bench-')
+    db_path = os.path.join(scratch_dir, 'recipes.db')
+    shutil.copy(source, db_path)
+    db = RecipeDatabase(db_path)
+
+    results = {}
+    try:
+        benchmarks = {**database_benchmarks(db, model, seed, ops, scratch_dir),
+                      **api_benchmarks(db, model, seed, ops)}
+        for name, run in benchmarks.items():
+            if only and name not in only:
+                continue
+            results[name] = run()
+            print(f"  {name:<26} {results[name]['ops_per_sec']:>10,.1f} ops/s"
+                  f"  p50 {results[name]['p50_ms']:>8.2f} ms  p95 {results[name]['p95_ms']:>8.2f} ms"
+                  f"  p99 {results[name]['p99_ms']:>8.2f} ms")
+    finally:
+        db.close()
+        shutil.rmtree(scratch_dir)
+    return results
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Benchmarks whose p50/p95 latency or throughput moved past threshold"""
+    regressions = []
+    print(f"\n{'size':>6} {'benchmark':<26} {'p50 Δ':>8} {'p95 Δ':>8} {'ops/s Δ':>8}")
+    for label, benchmarks in results['results'].items():
+        for name, current in benchmarks.items():
+            previous = baseline.get('results', {}).get(label, {}).get(name)
+            if not previous:
+                continue
+            changes = {
+                'p50': current['p50_ms'] / previous['p50_ms'] - 1 if previous['p50_ms'] else 0.0,
+                'p95': current['p95_ms'] / previous['p95_ms'] - 1 if previous['p95_ms'] else 0.0,
+                'ops/s': (previous['ops_per_sec'] / current['ops_per_sec'] - 1
+                          if current['ops_per_sec'] else 0.0),
+            }
+            worse = [key for key, change in changes.items() if change > threshold]
+            marker = '  ✗' if worse else ''
+            print(f"{label:>6} {name:<26} {changes['p50']:>+8.0%} {changes['p95']:>+8.0%} "
+                  f"{-changes['ops/s']:>+8.0%}{marker}")
+            if worse:
+                regressions.append(f"{label} {name}: {', '.join(worse)} worse than baseline")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark RecipeDatabase and the API')
+    parser.add_argument('--sizes', type=parse_sizes, default=[1_000, 10_000],
+                        help='Corpus sizes to run, e.g. 1k,10k,100k,1m (default: 1k,10k)')
+    parser.add_argument('--ops', type=int, default=200,
+                        help='Timed operations per benchmark (default: 200)')
+    parser.add_argument('--only', default='',
+                        help='Comma-separated benchmark names to run (default: all)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--corpus-dir', default='corpus', help='Corpus directory (default: corpus)')
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, 'latest.json'),
+                        help='Where to write results (default: benchmarks/latest.json)')
+    parser.add_argument('--baseline', default=os.path.join(RESULTS_DIR, 'baseline.json'),
+                        help='Baseline to compare against (default: benchmarks/baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store these results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative slowdown counted as a regression (default: 0.2)')
+    args = parser.parse_args()
+
+    model = CorpusModel.from_sources()
+    only = [name.strip() for name in args.only.split(',') if name.strip()]
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'ops': args.ops,
+        },
+        'results': {},
+    }
+
+    for size in args.sizes:
+        print(f"\n⏱  {size:,} recipes")
+        results['results'][size_label(size)] = run_size(model, size, args.corpus_dir,
+                                                        args.seed, args.ops, only)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        shutil.copy(args.output, args.baseline)
+        print(f"📌 Saved as baseline: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) past {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            raise SystemExit(1)
+        print(f"\n✓ No regressions past {args.threshold:.0%}")
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Benchmark the WSGI and ASGI server stacks side by side over real sockets.
+
+Each stack is started as a subprocess on a scratch copy of a synthetic
+corpus (see generate_corpus.py) and driven by an asyncio load generator:
+--clients keep-alive connections send requests back to back while
+--slow-clients connections trickle their request headers in, the way a
+phone on a poor network does.  For every stack the run reports throughput,
+latency percentiles of the fast clients, failures and the server's peak
+thread count:
+
+    dev      server.py                          (Flask development server)
+    prefork  server.py --workers N --threads T
+    asgi     asgi_app.py --threads T            (needs: pip install uvicorn)
+
+    python benchmark_servers.py --size 10k --clients 32 --slow-clients 64
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from benchmark import RESULTS_DIR, percentile
+from generate_corpus import CorpusModel, generate_corpus, parse_sizes, size_label
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STACKS = ('dev', 'prefork', 'asgi')
+
+
+def stack_command(stack: str, port: int, workers: int, threads: int) -> List[str]:
+    """Command line that serves the API on `port` with the given stack"""
+    common = ['--port', str(port), '--response-cache-mb', '0', '--no-sql-timing']
+    if stack == 'dev':
+        return [sys.executable, os.path.join(REPO_DIR, 'server.py')] + common
+    if stack == 'prefork':
+        return [sys.executable, os.path.join(REPO_DIR, 'server.py'), '--workers', str(workers),
+                '--threads', str(threads)] + common
+    return [sys.executable, os.path.join(REPO_DIR, 'asgi_app.py'), '--threads', str(threads)] + common
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError), socket.create_connection(('127.0.0.1', port), timeout=0.5):
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"Server did not start listening on port {port}")
+
+
+def process_threads(pid: int) -> int:
+    """Threads in `pid` and its children (Linux /proc; 0 elsewhere)"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('Threads:'))
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, StopIteration):
+            continue
+    return total
+
+
+async def read_response(reader: asyncio.StreamReader) -> bool:
+    """Read one HTTP/1.1 response; returns whether the connection stays open"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return False
+    return headers.get('connection', '').lower() != 'close' and lines[0].startswith('HTTP/1.1')
+
+
+async def fast_client(port: int, paths: List[str], deadline: float, rng: random.Random,
+                      latencies: List[float], counters: Dict):
+    """Send requests back to back, reconnecting when the server closes"""
+    reader = writer = None
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f"GET {rng.choice(paths)} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+            await writer.drain()
+            keep = await asyncio.wait_for(read_response(reader), timeout=30)
+            latencies.append(time.perf_counter() - start)
+            counters['requests'] += 1
+            if not keep:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            counters['failures'] += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def slow_client(port: int, path: str, deadline: float, delay: float, counters: Dict):
+    """Trickle one header line per `delay` seconds, then read the response"""
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f"GET {path} HTTP/1.1\r\n".encode())
+            for n in range(5):
+                await asyncio.sleep(delay)
+                writer.write(f"X-Slow-{n}: {'x' * 20}\r\n".encode())
+                await writer.drain()
+            writer.write(b"Host: bench\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            await asyncio.wait_for(read_response(reader), timeout=30)
+            counters['slow_requests'] += 1
+            writer.close()
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            counters['slow_failures'] += 1
+
+
+async def drive(port: int, paths: List[str], clients: int, slow_clients: int, slow_delay: float,
+                duration: float, seed: int, pid: int) -> Dict:
+    latencies: List[float] = []
+    counters = {'requests': 0, 'failures': 0, 'slow_requests': 0, 'slow_failures': 0}
+    deadline = time.monotonic() + duration
+    peak_threads = 0
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while time.monotonic() < deadline:
+            peak_threads = max(peak_threads, process_threads(pid))
+            await asyncio.sleep(0.25)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        sample_threads(),
+        *(slow_client(port, paths[0], deadline, slow_delay, counters) for _ in range(slow_clients)),
+        *(fast_client(port, paths, deadline, random.Random(seed + n), latencies, counters)
+          for n in range(clients)),
+    )
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return dict(counters,
+                seconds=elapsed,
+                requests_per_sec=counters['requests'] / elapsed if elapsed else 0.0,
+                p50_ms=percentile(latencies, 50) * 1000,
+                p95_ms=percentile(latencies, 95) * 1000,
+                p99_ms=percentile(latencies, 99) * 1000,
+                max_ms=latencies[-1] * 1000 if latencies else 0.0,
+                peak_threads=peak_threads)
+
+
+def run_stack(stack: str, db_path: str, paths: List[str], args) -> Optional[Dict]:
+    """Start one stack in a scratch directory, load it, and stop it"""
+    if stack == 'asgi':
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            print("  asgi      skipped (pip install uvicorn)")
+            return None
+
+    scratch_dir = tempfile.mkdtemp(prefix=f'recipe-{stack}-')
+    shutil.copy(db_path, os.path.join(scratch_dir, 'recipes.db'))
+    port = free_port()
+    process = subprocess.Popen(stack_command(stack, port, args.workers, args.threads),
+                               cwd=scratch_dir, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        result = asyncio.run(drive(port, paths, args.clients, args.slow_clients, args.slow_delay,
+                                   args.duration, args.seed, process.pid))
+    finally:
+        process.send_signal(signal.SIGINT if stack == 'dev' else signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    print(f"  {stack:<8} {result['requests_per_sec']:>9,.1f} req/s  p50 {result['p50_ms']:>8.2f} ms"
+          f"  p95 {result['p95_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms"
+          f"  fail {result['failures']:>4}  slow {result['slow_requests']:>4}/"
+          f"{result['slow_failures']:<4} threads {result['peak_threads']:>4}")
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the WSGI and ASGI stacks side by side')
+    parser.add_argument('--size', type=parse_sizes, default=[10_000],
+                        help='Corpus size, e.g. 1k or 10k (default: 10k)')
+    parser.add_argument('--stacks', default=','.join(STACKS),
+                        help=f"Comma-separated stacks to run (default: {','.join(STACKS)})")
+    parser.add_argument('--clients', type=int, default=32,
+                        help='Concurrent keep-alive clients (default: 32)')
+    parser.add_argument('--slow-clients', type=int, default=64,
+                        help='Concurrent clients trickling their headers (default: 64)')
+    parser.add_argument('--slow-delay', type=float, default=1.0,
+                        help='Seconds between a slow client\'s header lines (default: 1)')
+    parser.add_argument('--duration', type=float, default=15,
+                        help='Seconds per stack (default: 15)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes for prefork (default: CPU count)')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='Request threads per prefork worker / ASGI pool size (default: 8)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--corpus-dir', default='corpus', help='Corpus directory (default: corpus)')
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, 'servers.json'),
+                        help='Where to write results (default: benchmarks/servers.json)')
+    args = parser.parse_args()
+
+    size = args.size[0]
+    db_path = os.path.join(args.corpus_dir, f"recipes_{size_label(size)}.db")
+    if not os.path.exists(db_path):
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_corpus(CorpusModel.from_sources(), size, args.corpus_dir,
+                            seed=args.seed, write_json=False)
+
+    rng = random.Random(args.seed)
+    paths = ([f"/api/recipes/{rng.randint(1, size)}" for _ in range(200)]
+             + [f"/api/recipes?limit=20&offset={rng.randrange(size)}" for _ in range(100)]
+             + ["/api/statistics"])
+
+    print(f"\n⏱  {size:,} recipes, {args.clients} clients + {args.slow_clients} slow clients, "
+          f"{args.duration:g}s per stack")
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'size': size, 'clients': args.clients, 'slow_clients': args.slow_clients,
+            'slow_delay': args.slow_delay, 'duration': args.duration,
+            'workers': args.workers, 'threads': args.threads, 'cpus': os.cpu_count(),
+        },
+        'results': {},
+    }
+    for stack in [name.strip() for name in args.stacks.split(',') if name.strip()]:
+        if stack not in STACKS:
+            parser.error(f"Unknown stack: {stack}")
+        result = run_stack(stack, db_path, paths, args)
+        if result is not None:
+            results['results'][stack] = result
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression check.
+
+Seeds a throwaway database from schema.sql, drives every RecipeDatabase
+method and the maintenance scripts against it while recording each SQL
+statement they run, then looks at EXPLAIN QUERY PLAN for every statement.
+
+Fails (exit code 1) when:
+  - a request-path statement does a full SCAN of a large table, or sorts
+    or de-duplicates through a temporary B-tree;
+  - a batch/maintenance statement scans a large table other than the one
+    driving the loop (a full scan per outer row);
+  - a foreign key column has no index (cascading deletes would scan);
+  - a public RecipeDatabase method was not exercised by this script.
+
+Run it after changing any SQL, schema index or maintenance script.
+"""
+
+import argparse
+import builtins
+import contextlib
+import importlib
+import io
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+from database import RecipeDatabase
+from query_profiler import ProfiledConnection, QueryProfiler
+
+REPO_DIR = Path(__file__).resolve().parent
+SCHEMA_FILE = REPO_DIR / 'schema.sql'
+
+# Tables that grow with the collection; a full scan of these is a finding
+LARGE_TABLES = {'recipes', 'ingredients', 'instructions', 'recipe_tags',
+                'recipe_images', 'recipe_docs', 'cooking_log'}
+
+# Phases that run per API request; they must stay on indexes
+HOT_PHASES = {'add_recipe', 'get_recipe', 'get_recipe_json', 'get_recipe_document',
+              'get_recipe_documents', 'get_recipes_version', 'get_recipes_modified',
+              'get_recipes_bulk',
+              'get_all_recipes', 'iter_recipes', 'get_recipes_page', 'search_recipes',
+              'update_recipe', 'delete_recipe', 'write_batch', 'get_statistics',
+              # Maintenance helpers called once per recipe or per imported file
+              'enhance_instructions.update_instruction',
+              'analyze_and_enhance_recipes.get_recipe_details',
+              'enhance_all_recipes.get_recipe_by_id',
+              'enhance_all_recipes.update_recipe_description',
+              'batch_extract_janet.check_if_recipe_exists',
+              'extract_janet_images.find_recipe_by_filename',
+              'extract_janet_images.update_recipe_in_database',
+              'extract_janet_images.insert_new_recipe'}
+
+# Public methods that never touch SQL on their own
+NON_QUERY_METHODS = {'connect', 'disconnect', 'close', 'transaction', 'snapshot',
+                     'enable_profiling', 'query_stats'}
+
+# Known, accepted plan steps: (phase, plan detail prefix) -> reason
+ALLOWED = {
+    ('search_recipes', 'USE TEMP B-TREE FOR ORDER BY'):
+        'matches are ordered by bm25 rank, which only exists per match',
+}
+
+_STATEMENT = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b', re.IGNORECASE)
+_QUOTED = re.compile(r"'(?:[^']|'')*'")
+_FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+_SCAN = re.compile(r'^SCAN (\w+)')
+
+
+class CapturingProfiler(QueryProfiler):
+    """Profiler that also remembers which phase ran each statement"""
+
+    def __init__(self):
+        super().__init__()
+        self.phase = None
+        self.statement_phases = defaultdict(set)  # sql -> phases
+
+    def record(self, sql, elapsed, rows=0):
+        super().record(sql, elapsed, rows)
+        if self.phase is not None:
+            self.statement_phases[sql].add(self.phase)
+
+
+@contextlib.contextmanager
+def capture_raw_connections(profiler):
+    """Route the maintenance scripts' sqlite3.connect() through the profiler
+
+    Covers the scripts' own connections and the RecipeDatabase instances
+    they open.
+    """
+    original = sqlite3.connect
+
+    def connect(*args, **kwargs):
+        if kwargs.get('factory', sqlite3.Connection) is sqlite3.Connection:
+            kwargs['factory'] = ProfiledConnection
+        conn = original(*args, **kwargs)
+        if isinstance(conn, ProfiledConnection):
+            conn.profiler = profiler
+        return conn
+
+    sqlite3.connect = connect
+    try:
+        yield
+    finally:
+        sqlite3.connect = original
+
+
+def sample_recipe(rng, n):
+    """A recipe with a realistic spread of child rows"""
+    words = ['chicken', 'pasta', 'lemon', 'garlic', 'basil', 'curry', 'tomato',
+             'onion', 'butter', 'cream', 'beef', 'rice', 'ginger', 'mushroom']
+    return {
+        'title': f"{rng.choice(words).title()} {rng.choice(words)} {n}",
+        'description': ' '.join(rng.choices(words, k=12)),
+        'source_attribution': rng.choice(['Janet', 'Epicurious', 'NYT Cooking', None]),
+        'original_filename': f"recipe_{n}.pdf",
+        'file_path': f"recipes/recipe_{n}.pdf",
+        'cuisine_type': rng.choice(['Italian', 'Indian', 'French', None]),
+        'favorite': rng.random() < 0.1,
+        'ingredients': [{'quantity': str(rng.randint(1, 4)), 'unit': 'cup',
+                         'name': rng.choice(words)}
+                        for _ in range(rng.randint(3, 12))],
+        'instructions': [{'text': f"Step with {rng.choice(words)}, all ingredients"}
+                         for _ in range(rng.randint(2, 8))],
+        'tags': rng.sample(['quick', 'vegetarian', 'dinner', 'holiday', 'spicy'], k=2),
+    }
+
+
+def exercise_database(db, profiler, recipes):
+    """Call every public RecipeDatabase method that runs SQL"""
+    rng = random.Random(7)
+    exercised = set()
+
+    @contextlib.contextmanager
+    def phase(name):
+        profiler.phase = name
+        exercised.add(name)
+        try:
+            yield
+        finally:
+            profiler.phase = None
+
+    with phase('initialize_database'):
+        db.initialize_database(str(SCHEMA_FILE))
+    with phase('add_recipes'):
+        ids = db.add_recipes(sample_recipe(rng, n) for n in range(recipes))
+    with phase('add_recipe'):
+        new_id = db.add_recipe(sample_recipe(rng, recipes))
+        db.add_recipe({'title': 'Empty shell', 'original_filename': 'empty.pdf',
+                      'file_path': 'recipes/empty.pdf'})
+    with phase('get_recipe_json'):
+        db.get_recipe_json(ids[0])
+        db.get_recipe_json(ids[0])
+    with phase('get_recipe_document'):
+        db.get_recipe_document(ids[4])
+    # One document dropped, as an outside writer would, so the in-memory build runs too
+    db.connect().execute("DELETE FROM recipe_docs WHERE recipe_id = ?", (ids[5],))
+    with phase('get_recipe_documents'):
+        db.get_recipe_documents(ids[4:40] + [-1])
+    with phase('get_recipes_version'):
+        db.get_recipes_version()
+    with phase('get_recipes_modified'):
+        db.get_recipes_modified()
+    with phase('get_recipe'):
+        db.get_recipe(ids[1])
+        db.get_recipe(-1)
+        db.get_recipe(ids[1], fields=['title'], include=['tags'])
+    with phase('get_recipes_bulk'):
+        db.get_recipes_bulk(ids[:50])
+    with phase('iter_full_recipes'):
+        for _ in db.iter_full_recipes(batch_size=100):
+            pass
+    with phase('get_all_recipes'):
+        db.get_all_recipes()
+        db.get_all_recipes(limit=20, offset=40)
+    with phase('iter_recipes'):
+        for _ in db.iter_recipes(include=['tags'], batch_size=50):
+            pass
+    with phase('get_recipes_page'):
+        page, cursor = db.get_recipes_page(20)
+        db.get_recipes_page(20, cursor, fields=['title'], include=['ingredients', 'images'])
+    with phase('search_recipes'):
+        db.search_recipes('chicken garlic')
+        db.search_recipes('past', limit=10)
+    with phase('update_recipe'):
+        db.update_recipe(new_id, {'title': 'Renamed', 'favorite': True})
+        recipe = db.get_recipe(ids[2])
+        recipe['ingredients'] = [{'name': ing['ingredient_name'], 'quantity': ing['quantity']}
+                                 for ing in recipe['ingredients'][1:]] + [{'name': 'salt'}]
+        recipe['instructions'] = ['Preheat the oven'] + [step['instruction_text']
+                                                         for step in recipe['instructions'][1:]]
+        recipe['tags'] = ['weeknight']
+        db.update_recipe(ids[2], recipe)
+    with phase('delete_recipe'):
+        db.delete_recipe(ids[3])
+    with phase('write_batch'):
+        db.write_batch([
+            {'op': 'create', 'recipe': sample_recipe(rng, recipes + 1)},
+            {'op': 'update', 'id': ids[6], 'recipe': {'rating': 4, 'tags': ['batch']}},
+            {'op': 'delete', 'id': ids[7]},
+            {'op': 'delete', 'id': -1},
+        ])
+    with phase('get_statistics'):
+        db.get_statistics()
+    with phase('sync_search_index'):
+        db.sync_search_index()
+    with phase('rebuild_search_index'):
+        db.rebuild_search_index()
+    with phase('rebuild_statistics'):
+        db.rebuild_statistics()
+    db.connect().execute("DELETE FROM recipe_docs WHERE recipe_id = ?", (ids[8],))
+    with phase('refresh_derived_data'):
+        db.refresh_derived_data()
+    with phase('check_recipe_docs'):
+        db.check_recipe_docs(repair=True)
+
+    return exercised
+
+
+def exercise_scripts(profiler, recipe_id):
+    """Run the maintenance scripts against recipes.db in the current directory"""
+    extracted = {'title': 'Scanned card', 'description': 'From a photo', 'servings': 4,
+                 'prep_time_minutes': 10, 'cook_time_minutes': 20,
+                 'calories_per_serving': 300, 'source_attribution': 'Janet',
+                 'ingredients': [{'quantity': '1', 'unit': 'cup', 'name': 'flour',
+                                  'preparation': None}],
+                 'instructions': ['Mix everything']}
+    enhancement = {'description': 'Better', 'prep_time': 5, 'cook_time': 10, 'servings': 2}
+
+    # (module, function, args); per-item calls are checked like request paths
+    runs = [
+        ('cleanup_incomplete_recipes', 'cleanup_incomplete_recipes', ('recipes.db',)),
+        ('reformat_instructions', 'analyze_instructions', ('recipes.db',)),
+        ('reformat_instructions', 'update_instructions', ('recipes.db', False)),
+        ('enhance_instructions', 'get_all_recipes', ()),
+        ('enhance_instructions', 'update_instruction', (1, 'Stir well')),
+        ('analyze_and_enhance_recipes', 'get_main_recipes', ()),
+        ('analyze_and_enhance_recipes', 'get_recipe_details', (recipe_id,)),
+        ('analyze_and_enhance_recipes', 'get_recipes_details', (list(range(1, 40)),)),
+        ('enhance_all_recipes', 'get_recipe_by_id', (recipe_id,)),
+        ('enhance_all_recipes', 'update_recipe_description', (recipe_id, enhancement)),
+        ('add_calories', 'update_calories', ()),
+        ('export_to_json', 'export_database_to_json', ('recipes.db', 'export.json')),
+        ('batch_extract_janet', 'check_if_recipe_exists', ('recipe_5.pdf',)),
+        ('batch_extract_janet', 'insert_recipes', ({'IMG_1.JPG': extracted},)),
+        ('extract_janet_images', 'find_recipe_by_filename', ('recipe_5.pdf',)),
+        ('extract_janet_images', 'update_recipe_in_database', (recipe_id, extracted)),
+        ('extract_janet_images', 'insert_new_recipe', ('IMG_2.JPG', extracted)),
+    ]
+
+    if str(REPO_DIR) not in sys.path:
+        sys.path.insert(0, str(REPO_DIR))  # the scripts are imported from a scratch cwd
+    original_input = builtins.input
+    builtins.input = lambda prompt='': 'yes'
+    try:
+        with capture_raw_connections(profiler):
+            for module_name, function, args in runs:
+                module = importlib.import_module(module_name)
+                profiler.phase = f"{module_name}.{function}"
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        getattr(module, function)(*args)
+                finally:
+                    profiler.phase = None
+    finally:
+        builtins.input = original_input
+
+
+def placeholder_count(sql):
+    """Number of ? parameters, ignoring any inside string literals"""
+    return _QUOTED.sub('', sql).count('?')
+
+
+def explain(conn, sql):
+    """EXPLAIN QUERY PLAN rows as (id, parent, detail)"""
+    rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, [None] * placeholder_count(sql)).fetchall()
+    return [(row[0], row[1], row[3]) for row in rows]
+
+
+def plan_findings(plan, hot):
+    """Plan steps that break the rules for a hot or batch statement"""
+    details = {node: detail for node, _, detail in plan}
+    findings = []
+    seen_parents = set()
+    for node, parent, detail in plan:
+        match = _SCAN.match(detail)
+        if hot and detail.startswith('USE TEMP B-TREE'):
+            findings.append(detail)
+        if not match or match.group(1) not in LARGE_TABLES:
+            continue
+        if hot:
+            if _FULL_SCAN.match(detail):
+                findings.append(detail)
+        elif parent in seen_parents or details.get(parent, '').startswith('CORRELATED'):
+            # Only the loop driving a (sub)query may walk a whole table;
+            # any other scan repeats once per outer row
+            findings.append(detail)
+        seen_parents.add(parent)
+    return findings
+
+
+def is_allowed(detail, phases):
+    """Whether a finding is listed in ALLOWED for one of the phases"""
+    return any(name in phases and detail.startswith(prefix) for name, prefix in ALLOWED)
+
+
+def unindexed_foreign_keys(conn):
+    """(table, column) pairs that reference another table without an index"""
+    missing = []
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    for table in tables:
+        leading = set()
+        for index in conn.execute(f"PRAGMA index_list('{table}')").fetchall():
+            columns = conn.execute(f"PRAGMA index_info('{index[1]}')").fetchall()
+            if columns:
+                leading.add(columns[0][2])
+        for pk in conn.execute(f"PRAGMA table_info('{table}')").fetchall():
+            if pk[5] == 1:
+                leading.add(pk[1])
+        for fk in conn.execute(f"PRAGMA foreign_key_list('{table}')").fetchall():
+            if fk[3] not in leading:
+                missing.append((table, fk[3]))
+    return missing
+
+
+def check_query_plans(recipes=2000, verbose=False):
+    """Seed a database, capture every statement and check its plan"""
+    workdir = tempfile.mkdtemp(prefix='query-plans-')
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    failures = []
+    try:
+        # The live database also carries the calorie column the scripts write
+        conn = sqlite3.connect('recipes.db')
+        conn.executescript(SCHEMA_FILE.read_text())
+        conn.execute("ALTER TABLE recipes ADD COLUMN calories_per_serving INTEGER")
+        conn.close()
+
+        profiler = CapturingProfiler()
+        db = RecipeDatabase('recipes.db', profiler=profiler)
+        exercised = exercise_database(db, profiler, recipes)
+        db.close()
+        exercise_scripts(profiler, recipe_id=10)
+
+        public = {name for name in dir(RecipeDatabase)
+                  if not name.startswith('_') and callable(getattr(RecipeDatabase, name))}
+        for name in sorted(public - NON_QUERY_METHODS - exercised):
+            failures.append(f"RecipeDatabase.{name} is not exercised by check_query_plans.py")
+
+        conn = sqlite3.connect('recipes.db')
+        checked = 0
+        for sql, phases in sorted(profiler.statement_phases.items(), key=lambda item: sorted(item[1])):
+            if not _STATEMENT.match(sql):
+                continue
+            checked += 1
+            plan = explain(conn, sql)
+            hot_phases = sorted(phases & HOT_PHASES)
+            findings = [detail for detail in plan_findings(plan, bool(hot_phases))
+                        if not is_allowed(detail, phases)]
+            label = ', '.join(sorted(phases)) + (' [hot]' if hot_phases else '')
+            if verbose or findings:
+                print(f"\n{label}\n  {' '.join(sql.split())[:160]}")
+                for _, _, detail in plan:
+                    marker = '✗' if detail in findings else ' '
+                    print(f"   {marker} {detail}")
+            for detail in findings:
+                failures.append(f"{label}: {detail}")
+
+        for table, column in unindexed_foreign_keys(conn):
+            failures.append(f"Foreign key {table}.{column} has no index")
+        conn.close()
+    finally:
+        os.chdir(previous_cwd)
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+    print(f"\nChecked the plans of {checked} statements")
+    if failures:
+        print(f"\n❌ {len(failures)} query plan problem(s):")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("✓ No full scans or temp B-trees on request paths")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check EXPLAIN QUERY PLAN for every query')
+    parser.add_argument('--recipes', type=int, default=2000,
+                        help='Recipes to seed the scratch database with (default: 2000)')
+    parser.add_argument('--verbose', action='store_true', help='Print every plan')
+    args = parser.parse_args()
+
+    sys.exit(check_query_plans(args.recipes, args.verbose))
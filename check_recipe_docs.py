@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Check the cached recipe documents (recipe_docs) against the normalized
+recipe tables, and optionally repair them.
+"""
+
+import argparse
+import sys
+from database import RecipeDatabase
+
+def check_recipe_docs(db_path='recipes.db', repair=False):
+    """Report stale, missing and orphaned recipe documents."""
+    db = RecipeDatabase(db_path)
+    report = db.check_recipe_docs(repair=repair)
+    db.close()
+
+    print(f"Checked {report['checked']} recipes")
+    print(f"  Stale documents:    {len(report['stale'])}")
+    print(f"  Missing documents:  {len(report['missing'])} (built on first read)")
+    print(f"  Orphaned documents: {len(report['orphaned'])}")
+
+    for recipe_id in report['stale'][:10]:
+        print(f"  - ID {recipe_id}: document differs from its rows")
+    if len(report['stale']) > 10:
+        print(f"  ... and {len(report['stale']) - 10} more")
+
+    if repair:
+        print("\n✓ Rebuilt stale and missing documents, removed orphans")
+    elif report['stale'] or report['orphaned']:
+        print("\n⚠️  Run with --repair to rebuild them")
+
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check cached recipe documents')
+    parser.add_argument('--db', default='recipes.db',
+                        help='Database file path (default: recipes.db)')
+    parser.add_argument('--repair', action='store_true',
+                        help='Rebuild stale/missing documents and drop orphans')
+    args = parser.parse_args()
+
+    report = check_recipe_docs(args.db, repair=args.repair)
+    consistent = args.repair or not (report['stale'] or report['orphaned'])
+    sys.exit(0 if consistent else 1)
@@ -14,19 +14,18 @@ def cleanup_incomplete_recipes(db_path='recipes.db'):
     cursor = conn.cursor()
 
     try:
-        # Find recipes with no ingredients AND no instructions
+        # Find recipes with no ingredients AND no instructions (anti-joins
+        # probe the recipe_id indexes instead of fanning out and counting)
         cursor.execute("""
             SELECT
                 r.id,
                 r.title,
                 r.original_filename,
-                COUNT(DISTINCT i.id) as ingredient_count,
-                COUNT(DISTINCT ins.id) as instruction_count
+                0 as ingredient_count,
+                0 as instruction_count
             FROM recipes r
-            LEFT JOIN ingredients i ON r.id = i.recipe_id
-            LEFT JOIN instructions ins ON r.id = ins.recipe_id
-            GROUP BY r.id
-            HAVING ingredient_count = 0 AND instruction_count = 0
+            WHERE NOT EXISTS (SELECT 1 FROM ingredients i WHERE i.recipe_id = r.id)
+              AND NOT EXISTS (SELECT 1 FROM instructions ins WHERE ins.recipe_id = r.id)
             ORDER BY r.id
         """)
 
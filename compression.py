@@ -0,0 +1,71 @@
+"""
+Content-encoding helpers for the web server
+
+Dynamic responses (the JSON API) are compressed on the way out when the
+client accepts it and the body is big enough to be worth it.  Static files
+are never compressed per request: precompress_assets.py writes .br/.gz
+sidecars next to them at build time and the server picks the right one.
+"""
+
+import gzip
+import os
+from typing import Iterable, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content types worth compressing; images, PDFs and the like already are
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'application/xml',
+    'image/svg+xml', 'text/css', 'text/csv', 'text/html', 'text/javascript',
+    'text/plain', 'text/xml',
+}
+
+# Preferred first when the client rates several encodings equally
+SIDECAR_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def available_encodings() -> list:
+    """Encodings this process can produce, best first"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def choose_encoding(accept_encodings, offered: Iterable[str]) -> Optional[str]:
+    """Best encoding in `offered` for a werkzeug Accept-Encoding header"""
+    offered = list(offered)
+    if not offered:
+        return None
+    return accept_encodings.best_match(offered)
+
+
+def is_compressible(mimetype: Optional[str]) -> bool:
+    return mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def compress(data: bytes, encoding: str, dynamic: bool = True) -> bytes:
+    """Compress `data`; dynamic responses trade ratio for speed"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=5 if dynamic else 11)
+    if encoding == 'gzip':
+        # mtime=0 keeps the output (and sidecar files) byte-for-byte reproducible
+        return gzip.compress(data, compresslevel=6 if dynamic else 9, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def fresh_sidecars(path: str) -> dict:
+    """{encoding: sidecar path} for sidecars at least as new as `path`"""
+    try:
+        source_mtime = os.stat(path).st_mtime
+    except OSError:
+        return {}
+
+    sidecars = {}
+    for encoding, suffix in SIDECAR_SUFFIXES.items():
+        try:
+            if os.stat(path + suffix).st_mtime >= source_mtime:
+                sidecars[encoding] = path + suffix
+        except OSError:
+            continue
+    return sidecars
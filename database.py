@@ -4,358 +4,1344 @@ Database management module for recipe database
 
 import sqlite3
 import os
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+import re
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import base64
+import hashlib
 import json
+from query_profiler import ProfiledConnection, QueryProfiler
+
+# schema.sql next to this module, wherever the caller runs from
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
 
 
 class RecipeDatabase:
-    """Handles all database operations for recipes"""
+    """Handles all database operations for recipes
+
+    Each thread gets its own connection, opened and configured on first use
+    and then reused by every call made from that thread.  A single instance
+    can therefore be shared by all of the Flask worker threads.
+    """
 
-    def __init__(self, db_path: str = "recipes.db"):
+    # Recipe IDs per set-based hydration query (well under SQLite's bound
+    # parameter limit)
+    HYDRATE_CHUNK_SIZE = 500
+
+    def __init__(self, db_path: str = "recipes.db", busy_timeout_ms: int = 5000,
+                 profiler: Optional[QueryProfiler] = None):
         self.db_path = db_path
-        self.conn = None
-        self.cursor = None
+        self.busy_timeout_ms = busy_timeout_ms
+        self.profiler = profiler  # times every statement when set (see query_profiler)
+        self._local = threading.local()
+        self._connections = []  # every connection opened, so close() can reach them
+        self._connections_lock = threading.Lock()
+
+        # tag_name -> id for committed tags, shared by all threads; loaded on
+        # first use and dropped whenever another connection commits
+        self._tag_cache = None
+        self._tag_cache_lock = threading.Lock()
+        self._columns = None  # recipes column names, read on first projection
+
+        # Read paths never write.  When they find derived data that is
+        # behind (a missing recipe document, recipes queued for the search
+        # index), they pass a function that catches it up to write_behind,
+        # e.g. WriteCoordinator.submit; without one it waits for the next
+        # refresh_derived_data().
+        self.write_behind: Optional[Callable[[Callable], object]] = None
+
+        # SQLite handles must not be used on both sides of a fork()
+        if hasattr(os, 'register_at_fork'):
+            ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: ref() and ref()._forget_connections())
+
+    # ------------------------------------------------------------------
+    # Connection management
+    # ------------------------------------------------------------------
 
-    def connect(self):
-        """Connect to the database"""
-        self.conn = sqlite3.connect(self.db_path)
-        self.conn.row_factory = sqlite3.Row  # Return rows as dictionaries
-        self.cursor = self.conn.cursor()
+    def _open_connection(self) -> sqlite3.Connection:
+        """Open and configure a new connection"""
+        # isolation_level=None puts the driver in autocommit mode; transactions
+        # are managed explicitly by transaction() below.
+        conn = sqlite3.connect(self.db_path, isolation_level=None,
+                               check_same_thread=False,
+                               factory=ProfiledConnection if self.profiler else sqlite3.Connection)
+        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        if self.profiler:
+            conn.profiler = self.profiler
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.conn = conn
+            self._local.tx_depth = 0
+            self._local.data_version = None
+            self._local.pending_tags = {}  # tags seen inside the open transaction
+            self._local.dirty_docs = set()  # recipes whose document needs rebuilding
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
 
     def disconnect(self):
-        """Close database connection"""
-        if self.conn:
-            self.conn.close()
+        """Close this thread's connection (it is reopened on next use)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._connections_lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def close(self):
+        """Close every connection opened by this instance"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def _forget_connections(self):
+        """Drop connections inherited from the parent process without closing them
+
+        Closing would touch state the parent still uses; each thread in the
+        child simply opens a fresh connection on next use.
+        """
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._tag_cache = None
+        self._tag_cache_lock = threading.Lock()
+
+    def enable_profiling(self, slow_query_ms: Optional[float] = None,
+                         statements: bool = True) -> QueryProfiler:
+        """Start timing every SQL statement this instance runs
+
+        Open connections are closed so they reopen instrumented; call this
+        before the database is in use (e.g. at server start-up).  Statements
+        slower than slow_query_ms are logged as warnings.  statements=False
+        keeps only per-thread totals (see QueryProfiler).
+        """
+        self.profiler = QueryProfiler(slow_query_ms=slow_query_ms, statements=statements)
+        self.close()
+        return self.profiler
+
+    def query_stats(self) -> List[Dict]:
+        """Per-statement counts, latency percentiles and rows (empty if not profiling)"""
+        return self.profiler.snapshot() if self.profiler else []
+
+    @contextmanager
+    def transaction(self):
+        """Run a block inside a transaction on this thread's connection
+
+        The outermost block takes the write lock up front (BEGIN IMMEDIATE) and
+        commits on success or rolls back on error.  Nested blocks become
+        savepoints, so a failing inner block only undoes its own changes.
+        """
+        conn = self.connect()
+        depth = self._local.tx_depth
+        if depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        else:
+            conn.execute(f"SAVEPOINT sp_{depth}")
+            # What the enclosing transaction had gathered before this block
+            saved = (set(self._local.dirty_docs), dict(self._local.pending_tags))
+        self._local.tx_depth = depth + 1
+        try:
+            yield conn
+            if depth == 0:
+                self._before_commit(conn)
+        except BaseException:
+            self._local.tx_depth = depth
+            if depth == 0:
+                conn.execute("ROLLBACK")
+                self._after_rollback()
+            else:
+                conn.execute(f"ROLLBACK TO sp_{depth}")
+                conn.execute(f"RELEASE sp_{depth}")
+                self._local.dirty_docs, self._local.pending_tags = saved
+            raise
+        self._local.tx_depth = depth
+        if depth == 0:
+            conn.execute("COMMIT")
+            self._after_commit()
+        else:
+            conn.execute(f"RELEASE sp_{depth}")
+
+    def _before_commit(self, conn: sqlite3.Connection):
+        """Bring derived data up to date before an outermost commit"""
+        self._flush_search_queue(conn)
+        self._flush_recipe_docs(conn)
+
+    def _after_commit(self):
+        """Publish state that is only valid once the transaction is durable"""
+        pending = self._local.pending_tags
+        if pending:
+            with self._tag_cache_lock:
+                if self._tag_cache is not None:
+                    self._tag_cache.update(pending)
+            self._local.pending_tags = {}
 
-    def initialize_database(self, schema_file: str = "schema.sql"):
-        """Initialize database with schema"""
-        self.connect()
+    def _after_rollback(self):
+        """Forget state gathered by work that was just undone"""
+        self._local.pending_tags = {}
+        self._local.dirty_docs = set()
+
+    @contextmanager
+    def snapshot(self):
+        """Run several reads against one consistent view of the database
+
+        Opens a deferred (read) transaction unless one is already active on
+        this thread, in which case the enclosing transaction is reused.
+        """
+        conn = self.connect()
+        if self._local.tx_depth:
+            yield conn
+            return
+        conn.execute("BEGIN")
+        self._local.tx_depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.tx_depth = 0
+            conn.execute("COMMIT")
+
+    def initialize_database(self, schema_file: str = SCHEMA_FILE) -> Dict[str, int]:
+        """Create or upgrade the schema, then catch up derived data
+
+        Safe to run on every start: existing tables are kept, tables and
+        triggers added since the database was created are added, and
+        refresh_derived_data() fills in what they need.  Returns its counts.
+        """
+        conn = self.connect()
         with open(schema_file, 'r') as f:
             schema = f.read()
-        self.cursor.executescript(schema)
-        self.conn.commit()
+
+        # Early schemas declared recipes_fts as an external-content table over
+        # recipes, which has none of the ingredient/instruction/tag columns;
+        # replace it with the standalone index
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'recipes_fts'"
+        ).fetchone()
+        if row and 'content=recipes' in row['sql'].replace(' ', ''):
+            conn.execute("DROP TABLE recipes_fts")
+
+        # recipe_docs is a cache; documents stored without validators are
+        # simply dropped and rebuilt on demand
+        columns = [row['name'] for row in conn.execute("PRAGMA table_info(recipe_docs)")]
+        if columns and 'etag' not in columns:
+            conn.execute("DROP TABLE recipe_docs")
+
+        conn.executescript(schema)
+
+        if conn.execute("SELECT 1 FROM recipes_fts LIMIT 1").fetchone() is None:
+            self.rebuild_search_index()
+        if conn.execute("SELECT 1 FROM recipe_stats WHERE dimension = 'total'").fetchone() is None:
+            self.rebuild_statistics()
+        derived = self.refresh_derived_data()
         print(f"Database initialized: {self.db_path}")
-        self.disconnect()
+        return derived
+
+    def refresh_derived_data(self) -> Dict[str, int]:
+        """Index queued recipes and build every missing recipe document
+
+        Catches up after an upgrade or writers outside RecipeDatabase, so
+        the first reads don't find anything to rebuild.  Returns the number
+        of recipes 'indexed' and 'documents' built.
+        """
+        indexed = self.sync_search_index()
+        missing = [row['id'] for row in self.connect().execute("""
+            SELECT r.id FROM recipes r
+            LEFT JOIN recipe_docs d ON d.recipe_id = r.id
+            WHERE d.recipe_id IS NULL
+        """)]
+        built = 0
+        for start in range(0, len(missing), self.HYDRATE_CHUNK_SIZE):
+            built += self._backfill_recipe_docs(missing[start:start + self.HYDRATE_CHUNK_SIZE])
+        return {'indexed': indexed, 'documents': built}
+
+    def _defer(self, fn: Callable):
+        """Hand catch-up work found by a read to write_behind, if there is one"""
+        if self.write_behind is not None:
+            self.write_behind(fn)
+
+    # ------------------------------------------------------------------
+    # Full-text search index
+    # ------------------------------------------------------------------
+
+    def _flush_search_queue(self, conn: sqlite3.Connection) -> int:
+        """Rebuild the search documents of every queued recipe
+
+        Triggers queue a recipe id whenever the recipe or one of its child
+        rows changes; this turns the queue into recipes_fts rows in one pass.
+        Returns the number of recipes re-indexed.
+        """
+        if conn.execute("SELECT 1 FROM search_index_queue LIMIT 1").fetchone() is None:
+            return 0
+
+        conn.execute("""
+            DELETE FROM recipes_fts
+            WHERE rowid IN (SELECT recipe_id FROM search_index_queue)
+        """)
+        conn.execute("""
+            INSERT INTO recipes_fts (
+                rowid, title, description, ingredients_text,
+                instructions_text, tags_text
+            )
+            SELECT r.id, r.title, r.description,
+                   (SELECT group_concat(ingredient_name, ' ') FROM (
+                        SELECT ingredient_name FROM ingredients
+                        WHERE recipe_id = r.id ORDER BY ingredient_order)),
+                   (SELECT group_concat(instruction_text, ' ') FROM (
+                        SELECT instruction_text FROM instructions
+                        WHERE recipe_id = r.id ORDER BY step_number)),
+                   (SELECT group_concat(t.tag_name, ' ')
+                    FROM recipe_tags rt JOIN tags t ON t.id = rt.tag_id
+                    WHERE rt.recipe_id = r.id)
+            FROM recipes r
+            WHERE r.id IN (SELECT recipe_id FROM search_index_queue)
+        """)
+        return conn.execute("DELETE FROM search_index_queue").rowcount
+
+    def sync_search_index(self) -> int:
+        """Index recipes queued by writers outside RecipeDatabase"""
+        conn = self.connect()
+        if conn.execute("SELECT 1 FROM search_index_queue LIMIT 1").fetchone() is None:
+            return 0
+        with self.transaction() as conn:
+            return self._flush_search_queue(conn)
+
+    def rebuild_search_index(self) -> int:
+        """Re-index every recipe from scratch"""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM recipes_fts")
+            conn.execute("INSERT OR IGNORE INTO search_index_queue (recipe_id) SELECT id FROM recipes")
+            return self._flush_search_queue(conn)
+
+    @staticmethod
+    def _fts_match_query(search_term: str) -> str:
+        """Turn free text into an FTS5 query where every word must match as a prefix"""
+        return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', search_term))
 
     def add_recipe(self, recipe_data: Dict) -> int:
         """Add a new recipe to database"""
-        self.connect()
+        with self.transaction() as conn:
+            return self._insert_recipes(conn, [recipe_data])[0]
 
-        # Insert main recipe
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            INSERT INTO recipes (
-                title, description, prep_time_minutes, cook_time_minutes,
-                total_time_minutes, servings, difficulty, cuisine_type,
-                meal_type, source_attribution, source_url, original_filename,
-                file_path, notes, rating, favorite, vegetarian, vegan,
-                gluten_free, dairy_free
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            recipe_data.get('title'),
-            recipe_data.get('description'),
-            recipe_data.get('prep_time_minutes'),
-            recipe_data.get('cook_time_minutes'),
-            recipe_data.get('total_time_minutes'),
-            recipe_data.get('servings'),
-            recipe_data.get('difficulty', 'Unknown'),
-            recipe_data.get('cuisine_type'),
-            recipe_data.get('meal_type'),
-            recipe_data.get('source_attribution'),
-            recipe_data.get('source_url'),
-            recipe_data.get('original_filename'),
-            recipe_data.get('file_path'),
-            recipe_data.get('notes'),
-            recipe_data.get('rating'),
-            recipe_data.get('favorite', 0),
-            recipe_data.get('vegetarian', 0),
-            recipe_data.get('vegan', 0),
-            recipe_data.get('gluten_free', 0),
-            recipe_data.get('dairy_free', 0)
-        ))
-
-        recipe_id = cursor.lastrowid
+    def add_recipes(self, recipes: Iterable[Dict], batch_size: int = 500,
+                    on_batch: Optional[Callable[[Dict], None]] = None,
+                    on_error: Optional[Callable[[Dict, Exception], None]] = None) -> List[Optional[int]]:
+        """Add many recipes, committing once per batch
+
+        Each recipe goes in under its own savepoint, so one that can't be
+        stored (a NOT NULL column left empty, a bad value) is undone alone:
+        on_error (if given) receives it and the exception, its ID comes
+        back as None, and the rest of the batch still commits.  Errors of
+        the database itself (locked, disk full, missing table) are raised.
+
+        Tag names come from the shared tag cache, and large imports are not
+        bound by a commit per recipe.  After each batch commits, on_batch
+        (if given) receives running totals: batches, recipes, failed, rows,
+        elapsed seconds and rows_per_sec.  Returns the new recipe IDs in
+        input order.
+        """
+        recipe_ids = []
+        progress = {'batches': 0, 'recipes': 0, 'failed': 0, 'rows': 0}
+        started = time.perf_counter()
+
+        def flush(batch):
+            batch_ids = []
+            with self.transaction() as conn:
+                for recipe_data in batch:
+                    try:
+                        with self.transaction():
+                            batch_ids.append(self._insert_recipes(conn, [recipe_data])[0])
+                    except sqlite3.OperationalError:
+                        raise
+                    except Exception as e:
+                        batch_ids.append(None)
+                        if on_error:
+                            on_error(recipe_data, e)
+            recipe_ids.extend(batch_ids)
+
+            stored = [recipe_data for recipe_data, recipe_id in zip(batch, batch_ids)
+                      if recipe_id is not None]
+            progress['batches'] += 1
+            progress['recipes'] += len(stored)
+            progress['failed'] += len(batch) - len(stored)
+            progress['rows'] += self._count_rows(stored)
+            if on_batch:
+                elapsed = time.perf_counter() - started
+                on_batch(dict(progress, elapsed=elapsed,
+                              rows_per_sec=progress['rows'] / elapsed if elapsed else 0.0))
+
+        batch = []
+        for recipe_data in recipes:
+            batch.append(recipe_data)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+        return recipe_ids
+
+    @staticmethod
+    def _count_rows(recipes: List[Dict]) -> int:
+        """Rows written for a batch of recipes (recipe rows plus child rows)"""
+        return sum(
+            1 + len(recipe.get('ingredients') or []) + len(recipe.get('instructions') or [])
+            + len(set(recipe.get('tags') or [])) + len(recipe.get('images') or [])
+            for recipe in recipes
+        )
+
+    def _insert_recipes(self, conn: sqlite3.Connection, recipes: List[Dict]) -> List[int]:
+        """Insert recipes and their child rows (caller manages the transaction)"""
+        cursor = conn.cursor()
+        recipe_ids = []
+        ingredient_rows = []
+        instruction_rows = []
+        image_rows = []
+        tag_links = []
+
+        for recipe_data in recipes:
+            # Insert main recipe
+            cursor.execute("""
+                INSERT INTO recipes (
+                    title, description, prep_time_minutes, cook_time_minutes,
+                    total_time_minutes, servings, difficulty, cuisine_type,
+                    meal_type, source_attribution, source_url, original_filename,
+                    file_path, notes, rating, favorite, vegetarian, vegan,
+                    gluten_free, dairy_free, date_added, date_modified
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                          COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))
+            """, (
+                recipe_data.get('title'),
+                recipe_data.get('description'),
+                recipe_data.get('prep_time_minutes'),
+                recipe_data.get('cook_time_minutes'),
+                recipe_data.get('total_time_minutes'),
+                recipe_data.get('servings'),
+                recipe_data.get('difficulty', 'Unknown'),
+                recipe_data.get('cuisine_type'),
+                recipe_data.get('meal_type'),
+                recipe_data.get('source_attribution'),
+                recipe_data.get('source_url'),
+                recipe_data.get('original_filename'),
+                recipe_data.get('file_path'),
+                recipe_data.get('notes'),
+                recipe_data.get('rating'),
+                recipe_data.get('favorite', 0),
+                recipe_data.get('vegetarian', 0),
+                recipe_data.get('vegan', 0),
+                recipe_data.get('gluten_free', 0),
+                recipe_data.get('dairy_free', 0),
+                recipe_data.get('date_added'),
+                recipe_data.get('date_modified')
+            ))
+
+            recipe_id = cursor.lastrowid
+            recipe_ids.append(recipe_id)
+
+            for idx, ingredient in enumerate(recipe_data.get('ingredients') or []):
+                ingredient_rows.append(self._ingredient_row(recipe_id, idx + 1, ingredient))
+
+            for idx, instruction in enumerate(recipe_data.get('instructions') or []):
+                instruction_rows.append(self._instruction_row(recipe_id, idx + 1, instruction))
+
+            for tag_name in dict.fromkeys(recipe_data.get('tags') or []):
+                tag_links.append((recipe_id, tag_name))
+
+            for idx, image_path in enumerate(recipe_data.get('images') or []):
+                image_rows.append((recipe_id, image_path, 'original', idx))
+
+        self._local.dirty_docs.update(recipe_ids)
 
         # Insert ingredients
-        if 'ingredients' in recipe_data:
-            for idx, ingredient in enumerate(recipe_data['ingredients']):
-                cursor.execute("""
-                    INSERT INTO ingredients (
-                        recipe_id, ingredient_order, quantity, unit,
-                        ingredient_name, preparation, ingredient_group
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    recipe_id,
-                    idx + 1,
-                    ingredient.get('quantity'),
-                    ingredient.get('unit'),
-                    ingredient.get('name'),
-                    ingredient.get('preparation'),
-                    ingredient.get('group')
-                ))
+        cursor.executemany("""
+            INSERT INTO ingredients (
+                recipe_id, ingredient_order, quantity, unit,
+                ingredient_name, preparation, ingredient_group
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, ingredient_rows)
 
         # Insert instructions
-        if 'instructions' in recipe_data:
-            for idx, instruction in enumerate(recipe_data['instructions']):
-                if isinstance(instruction, str):
-                    instruction_text = instruction
-                    instruction_group = None
-                else:
-                    instruction_text = instruction.get('text', instruction.get('instruction', ''))
-                    instruction_group = instruction.get('group')
-
-                cursor.execute("""
-                    INSERT INTO instructions (
-                        recipe_id, step_number, instruction_text, instruction_group
-                    ) VALUES (?, ?, ?, ?)
-                """, (recipe_id, idx + 1, instruction_text, instruction_group))
+        cursor.executemany("""
+            INSERT INTO instructions (
+                recipe_id, step_number, instruction_text, instruction_group
+            ) VALUES (?, ?, ?, ?)
+        """, instruction_rows)
 
         # Insert tags
-        if 'tags' in recipe_data:
-            for tag_name in recipe_data['tags']:
-                # Insert tag if it doesn't exist
-                cursor.execute(
-                    "INSERT OR IGNORE INTO tags (tag_name) VALUES (?)",
-                    (tag_name,)
-                )
-                # Get tag id
-                cursor.execute("SELECT id FROM tags WHERE tag_name = ?", (tag_name,))
-                tag_id = cursor.fetchone()[0]
-                # Link recipe to tag
-                cursor.execute(
-                    "INSERT INTO recipe_tags (recipe_id, tag_id) VALUES (?, ?)",
-                    (recipe_id, tag_id)
-                )
+        if tag_links:
+            tag_ids = self._resolve_tag_ids(cursor, [tag_name for _, tag_name in tag_links])
+            cursor.executemany(
+                "INSERT INTO recipe_tags (recipe_id, tag_id) VALUES (?, ?)",
+                [(recipe_id, tag_ids[tag_name]) for recipe_id, tag_name in tag_links]
+            )
 
         # Insert images
-        if 'images' in recipe_data:
-            for idx, image_path in enumerate(recipe_data['images']):
-                cursor.execute("""
-                    INSERT INTO recipe_images (
-                        recipe_id, image_path, image_type, display_order
-                    ) VALUES (?, ?, ?, ?)
-                """, (recipe_id, image_path, 'original', idx))
+        cursor.executemany("""
+            INSERT INTO recipe_images (
+                recipe_id, image_path, image_type, display_order
+            ) VALUES (?, ?, ?, ?)
+        """, image_rows)
 
-        self.conn.commit()
-        self.disconnect()
+        return recipe_ids
 
-        return recipe_id
+    @staticmethod
+    def _ingredient_row(recipe_id: int, order: int, ingredient: Dict) -> Tuple:
+        """Column values for one ingredients row"""
+        return (
+            recipe_id,
+            order,
+            ingredient.get('quantity'),
+            ingredient.get('unit'),
+            ingredient.get('name'),
+            ingredient.get('preparation'),
+            ingredient.get('group')
+        )
 
-    def get_recipe(self, recipe_id: int) -> Optional[Dict]:
-        """Get complete recipe by ID"""
-        self.connect()
+    @staticmethod
+    def _instruction_row(recipe_id: int, step_number: int, instruction) -> Tuple:
+        """Column values for one instructions row (instruction is text or a dict)"""
+        if isinstance(instruction, str):
+            instruction_text = instruction
+            instruction_group = None
+        else:
+            instruction_text = instruction.get('text', instruction.get('instruction', ''))
+            instruction_group = instruction.get('group')
+        return (recipe_id, step_number, instruction_text, instruction_group)
 
-        # Get main recipe data
-        self.cursor.execute("SELECT * FROM recipes WHERE id = ?", (recipe_id,))
-        recipe_row = self.cursor.fetchone()
+    def _resolve_tag_ids(self, cursor: sqlite3.Cursor, tag_names: Iterable[str]) -> Dict[str, int]:
+        """Map tag names to IDs, creating any tags that don't exist yet
 
-        if not recipe_row:
-            self.disconnect()
-            return None
+        Known tags come from the in-memory tag cache; only unknown names cost
+        an INSERT OR IGNORE and a lookup.
+        """
+        names = list(dict.fromkeys(tag_names))
+        cache = self._get_tag_cache(cursor.connection)
+        pending = self._local.pending_tags
+
+        tag_ids = {}
+        missing = []
+        for name in names:
+            tag_id = pending.get(name) or cache.get(name)
+            if tag_id is None:
+                missing.append(name)
+            else:
+                tag_ids[name] = tag_id
+
+        if not missing:
+            return tag_ids
+
+        cursor.executemany(
+            "INSERT OR IGNORE INTO tags (tag_name) VALUES (?)",
+            [(name,) for name in missing]
+        )
+        for start in range(0, len(missing), self.HYDRATE_CHUNK_SIZE):
+            chunk = missing[start:start + self.HYDRATE_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f"SELECT id, tag_name FROM tags WHERE tag_name IN ({placeholders})", chunk)
+            for row in cursor.fetchall():
+                tag_ids[row['tag_name']] = row['id']
+
+        # New IDs only join the shared cache once this transaction commits
+        pending.update((name, tag_ids[name]) for name in missing)
+        return tag_ids
+
+    def _get_tag_cache(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        """Return the shared tag cache, reloading it if it may be stale
+
+        PRAGMA data_version changes when any other connection (another
+        thread here, or another process such as a maintenance script)
+        commits, so a change means tags may have been added or removed
+        behind the cache's back.
+        """
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        with self._tag_cache_lock:
+            if data_version != self._local.data_version:
+                self._local.data_version = data_version
+                self._tag_cache = None
+            if self._tag_cache is None:
+                self._tag_cache = {
+                    row['tag_name']: row['id']
+                    for row in conn.execute("SELECT id, tag_name FROM tags")
+                }
+            return self._tag_cache
+
+    def get_recipe(self, recipe_id: int, fields: Optional[Iterable[str]] = None,
+                   include: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """Get a recipe by ID
+
+        With neither `fields` nor `include` this is the complete recipe from
+        the document cache.  Otherwise only the named recipe columns (plus
+        id) and the named child sections (see RECIPE_SECTIONS) are read;
+        either left as None means all of them.
+        """
+        if fields is None and include is None:
+            doc = self.get_recipe_json(recipe_id)
+            return json.loads(doc) if doc is not None else None
+
+        recipes = self.get_recipes_bulk([recipe_id], fields=fields, include=include)
+        return recipes[0] if recipes else None
+
+    def get_recipe_json(self, recipe_id: int) -> Optional[str]:
+        """Get complete recipe by ID as a JSON document"""
+        document = self.get_recipe_document(recipe_id)
+        return document[0] if document else None
+
+    def get_recipe_document(self, recipe_id: int) -> Optional[Tuple[str, str, Optional[str]]]:
+        """Get a recipe's JSON document with its validators
+
+        Returns (json, etag, date_modified), where etag is a hash of the
+        document, or None if there is no such recipe.  Served from
+        recipe_docs with one primary-key lookup; a document dropped by an
+        outside writer is assembled from the rows instead, and storing it
+        is left to write_behind.
+        """
+        return self.get_recipe_documents([recipe_id]).get(int(recipe_id))
+
+    def get_recipe_documents(self, recipe_ids) -> Dict[int, Tuple[str, str, Optional[str]]]:
+        """Get the JSON documents of many recipes
+
+        Returns {recipe_id: (json, etag, date_modified)} in the order the IDs
+        were given; unknown IDs are left out.  Documents are read from
+        recipe_docs a chunk at a time.  Missing ones are assembled from the
+        rows in the same snapshot without writing; storing them is left to
+        write_behind.
+        """
+        ids = list(dict.fromkeys(int(recipe_id) for recipe_id in recipe_ids))
+        docs = {}
+        with self.snapshot() as conn:
+            for start in range(0, len(ids), self.HYDRATE_CHUNK_SIZE):
+                chunk = ids[start:start + self.HYDRATE_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                for row in conn.execute(f"""
+                    SELECT recipe_id, doc, etag, modified FROM recipe_docs
+                    WHERE recipe_id IN ({placeholders})
+                """, chunk):
+                    docs[row['recipe_id']] = (row['doc'], row['etag'], row['modified'])
+
+            missing = [recipe_id for recipe_id in ids if recipe_id not in docs]
+            if missing:
+                built = self._build_recipe_docs(missing)
+                if built:
+                    docs.update(built)
+                    self._defer(lambda: self._backfill_recipe_docs(list(built)))
+
+        return {recipe_id: docs[recipe_id] for recipe_id in ids if recipe_id in docs}
+
+    def get_recipes_version(self) -> str:
+        """Opaque version that changes whenever a recipe or its child rows change
+
+        Combines the change counter with the database's random epoch, so a
+        regenerated database never repeats an earlier version.
+        """
+        counters = dict(self.connect().execute(
+            "SELECT name, value FROM change_counters WHERE name IN ('epoch', 'recipes')"
+        ).fetchall())
+        return f"{counters.get('epoch', 0):x}.{counters.get('recipes', 0)}"
+
+    def get_recipes_modified(self) -> Optional[datetime]:
+        """When a recipe or its child rows last changed (UTC, whole seconds)"""
+        row = self.connect().execute(
+            "SELECT value FROM change_counters WHERE name = 'recipes_modified'"
+        ).fetchone()
+        return datetime.fromtimestamp(row['value'], timezone.utc) if row else None
+
+    # ------------------------------------------------------------------
+    # Recipe document cache
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _encode_recipe_doc(recipe: Dict) -> str:
+        """Serialize an assembled recipe for recipe_docs"""
+        return json.dumps(recipe, ensure_ascii=False, separators=(',', ':'))
+
+    def _build_recipe_docs(self, recipe_ids) -> Dict[int, Tuple[str, str, Optional[str]]]:
+        """Assemble the documents of the given recipes (unknown IDs are skipped)
+
+        Returns {recipe_id: (json, etag, date_modified)}.
+        """
+        docs = {}
+        for recipe in self.get_recipes_bulk(recipe_ids):
+            doc = self._encode_recipe_doc(recipe)
+            etag = hashlib.blake2b(doc.encode('utf-8'), digest_size=16).hexdigest()
+            docs[recipe['id']] = (doc, etag, recipe.get('date_modified'))
+        return docs
+
+    def _backfill_recipe_docs(self, recipe_ids) -> int:
+        """Store documents for those of recipe_ids that still have none"""
+        with self.transaction() as conn:
+            placeholders = ','.join('?' * len(recipe_ids))
+            stored = {row['recipe_id'] for row in conn.execute(
+                f"SELECT recipe_id FROM recipe_docs WHERE recipe_id IN ({placeholders})",
+                list(recipe_ids))}
+            return len(self._store_recipe_docs(
+                conn, [recipe_id for recipe_id in recipe_ids if recipe_id not in stored]))
+
+    def _store_recipe_docs(self, conn: sqlite3.Connection,
+                           recipe_ids) -> Dict[int, Tuple[str, str, Optional[str]]]:
+        """Assemble and store the documents of the given recipes
+
+        Returns {recipe_id: (json, etag, date_modified)}.
+        """
+        docs = self._build_recipe_docs(recipe_ids)
+        conn.executemany(
+            "INSERT OR REPLACE INTO recipe_docs (recipe_id, doc, etag, modified) VALUES (?, ?, ?, ?)",
+            [(recipe_id,) + document for recipe_id, document in docs.items()]
+        )
+        return docs
+
+    def _flush_recipe_docs(self, conn: sqlite3.Connection):
+        """Rebuild documents of recipes changed in this transaction"""
+        dirty = self._local.dirty_docs
+        if dirty:
+            self._local.dirty_docs = set()
+            self._store_recipe_docs(conn, sorted(dirty))
+
+    def check_recipe_docs(self, repair: bool = False) -> Dict:
+        """Compare every cached document against the normalized tables
+
+        Returns the recipe IDs whose document is 'stale' (differs from the
+        rows), 'missing' (not built yet) or 'orphaned' (no such recipe), plus
+        the number 'checked'.  With repair=True stale and missing documents
+        are rebuilt and orphans removed.
+        """
+        report = {'checked': 0, 'stale': [], 'missing': [], 'orphaned': []}
+        conn = self.connect()
+
+        for recipe in self.iter_full_recipes():
+            report['checked'] += 1
+            row = conn.execute(
+                "SELECT doc FROM recipe_docs WHERE recipe_id = ?", (recipe['id'],)
+            ).fetchone()
+            if row is None:
+                report['missing'].append(recipe['id'])
+            elif json.loads(row['doc']) != recipe:
+                report['stale'].append(recipe['id'])
 
-        recipe = dict(recipe_row)
+        report['orphaned'] = [row['recipe_id'] for row in conn.execute("""
+            SELECT d.recipe_id FROM recipe_docs d
+            LEFT JOIN recipes r ON r.id = d.recipe_id
+            WHERE r.id IS NULL
+        """)]
+
+        if repair:
+            rebuild = report['stale'] + report['missing']
+            with self.transaction() as conn:
+                for start in range(0, len(rebuild), self.HYDRATE_CHUNK_SIZE):
+                    self._store_recipe_docs(conn, rebuild[start:start + self.HYDRATE_CHUNK_SIZE])
+                conn.executemany(
+                    "DELETE FROM recipe_docs WHERE recipe_id = ?",
+                    [(recipe_id,) for recipe_id in report['orphaned']]
+                )
+
+        return report
+
+    # Child collections of a complete recipe, each loaded from its own table
+    RECIPE_SECTIONS = ('ingredients', 'instructions', 'tags', 'images')
+
+    def _recipe_columns(self) -> List[str]:
+        """Column names of the recipes table"""
+        if self._columns is None:
+            self._columns = [row['name'] for row in
+                             self.connect().execute("PRAGMA table_info(recipes)")]
+        return self._columns
+
+    def _select_columns(self, fields: Optional[Iterable[str]], default: str = '*',
+                        required: Tuple[str, ...] = ('id',)) -> str:
+        """SELECT list for the requested recipe columns
+
+        `required` columns are always selected.  Raises ValueError for a
+        name that is not a recipes column.
+        """
+        if fields is None:
+            return default
+        columns = self._recipe_columns()
+        requested = list(dict.fromkeys(list(required) + [f for f in fields if f]))
+        unknown = [field for field in requested if field not in columns]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+        return ', '.join(f'"{field}"' for field in requested)
+
+    def _check_sections(self, include: Optional[Iterable[str]]) -> Tuple[str, ...]:
+        """Validated child sections to load; None means all of them"""
+        if include is None:
+            return self.RECIPE_SECTIONS
+        sections = tuple(dict.fromkeys(section for section in include if section))
+        unknown = [section for section in sections if section not in self.RECIPE_SECTIONS]
+        if unknown:
+            raise ValueError(f"Unknown include(s): {', '.join(unknown)}")
+        return sections
+
+    @staticmethod
+    def _check_limit(limit: Optional[int], offset: int = 0):
+        """Raise ValueError for a limit below 1 (None: no limit) or a negative offset"""
+        if limit is not None and limit < 1:
+            raise ValueError(f"limit must be a positive integer, got {limit}")
+        if offset < 0:
+            raise ValueError(f"offset must not be negative, got {offset}")
+
+    def get_recipes_bulk(self, recipe_ids, fields: Optional[Iterable[str]] = None,
+                         include: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Get complete recipes for many IDs
+
+        Child rows are loaded with one query per table for each chunk of IDs
+        rather than one query per recipe.  Recipes come back in the order the
+        IDs were given; unknown IDs are skipped.  `fields` and `include`
+        narrow the columns and child sections as for get_recipe().
+        """
+        ids = list(dict.fromkeys(int(recipe_id) for recipe_id in recipe_ids))
+        columns = self._select_columns(fields)
+        sections = self._check_sections(include)
+        found = {}
+
+        with self.snapshot() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(ids), self.HYDRATE_CHUNK_SIZE):
+                chunk = ids[start:start + self.HYDRATE_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f"SELECT {columns} FROM recipes WHERE id IN ({placeholders})", chunk)
+                rows = [dict(row) for row in cursor.fetchall()]
+                for recipe in self._hydrate_recipes(cursor, rows, sections):
+                    found[recipe['id']] = recipe
+
+        return [found[recipe_id] for recipe_id in ids if recipe_id in found]
+
+    def iter_full_recipes(self, batch_size: int = None):
+        """Yield every complete recipe in ID order, hydrating a batch at a time"""
+        batch_size = batch_size or self.HYDRATE_CHUNK_SIZE
+        last_id = 0
+
+        while True:
+            with self.snapshot() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT * FROM recipes
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                """, (last_id, batch_size))
+                rows = [dict(row) for row in cursor.fetchall()]
+                if not rows:
+                    return
+                batch = self._hydrate_recipes(cursor, rows)
+
+            yield from batch
+            last_id = rows[-1]['id']
+
+    def _hydrate_recipes(self, cursor: sqlite3.Cursor, recipes: List[Dict],
+                         sections: Iterable[str] = RECIPE_SECTIONS) -> List[Dict]:
+        """Attach ingredients, instructions, tags and images to recipe dicts
+
+        Runs one set-based query per requested child table and stitches the
+        rows onto their recipes in memory; tables not in `sections` are not
+        queried at all.
+        """
+        sections = tuple(sections)
+        by_id = {}
+        for recipe in recipes:
+            for section in sections:
+                recipe[section] = []
+            by_id[recipe['id']] = recipe
+
+        if not by_id or not sections:
+            return recipes
+
+        ids = list(by_id)
+        placeholders = ','.join('?' * len(ids))
 
         # Get ingredients
-        self.cursor.execute("""
-            SELECT * FROM ingredients
-            WHERE recipe_id = ?
-            ORDER BY ingredient_order
-        """, (recipe_id,))
-        recipe['ingredients'] = [dict(row) for row in self.cursor.fetchall()]
+        if 'ingredients' in sections:
+            cursor.execute(f"""
+                SELECT * FROM ingredients
+                WHERE recipe_id IN ({placeholders})
+                ORDER BY recipe_id, ingredient_order
+            """, ids)
+            for row in cursor.fetchall():
+                by_id[row['recipe_id']]['ingredients'].append(dict(row))
 
         # Get instructions
-        self.cursor.execute("""
-            SELECT * FROM instructions
-            WHERE recipe_id = ?
-            ORDER BY step_number
-        """, (recipe_id,))
-        recipe['instructions'] = [dict(row) for row in self.cursor.fetchall()]
+        if 'instructions' in sections:
+            cursor.execute(f"""
+                SELECT * FROM instructions
+                WHERE recipe_id IN ({placeholders})
+                ORDER BY recipe_id, step_number
+            """, ids)
+            for row in cursor.fetchall():
+                by_id[row['recipe_id']]['instructions'].append(dict(row))
 
         # Get tags
-        self.cursor.execute("""
-            SELECT t.tag_name FROM tags t
-            JOIN recipe_tags rt ON t.id = rt.tag_id
-            WHERE rt.recipe_id = ?
-        """, (recipe_id,))
-        recipe['tags'] = [row['tag_name'] for row in self.cursor.fetchall()]
+        if 'tags' in sections:
+            cursor.execute(f"""
+                SELECT rt.recipe_id, t.tag_name FROM recipe_tags rt
+                JOIN tags t ON t.id = rt.tag_id
+                WHERE rt.recipe_id IN ({placeholders})
+            """, ids)
+            for row in cursor.fetchall():
+                by_id[row['recipe_id']]['tags'].append(row['tag_name'])
 
         # Get images
-        self.cursor.execute("""
-            SELECT * FROM recipe_images
-            WHERE recipe_id = ?
-            ORDER BY display_order
-        """, (recipe_id,))
-        recipe['images'] = [dict(row) for row in self.cursor.fetchall()]
+        if 'images' in sections:
+            cursor.execute(f"""
+                SELECT * FROM recipe_images
+                WHERE recipe_id IN ({placeholders})
+                ORDER BY recipe_id, display_order
+            """, ids)
+            for row in cursor.fetchall():
+                by_id[row['recipe_id']]['images'].append(dict(row))
+
+        return recipes
 
-        self.disconnect()
-        return recipe
+    # Columns returned by the listing endpoints
+    SUMMARY_COLUMNS = """
+        id, title, description, cuisine_type, meal_type,
+        source_attribution, rating, favorite, prep_time_minutes,
+        cook_time_minutes, date_added, date_modified
+    """
 
-    def get_all_recipes(self, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
-        """Get all recipes (summary view)"""
-        self.connect()
+    def get_all_recipes(self, limit: Optional[int] = None, offset: int = 0,
+                        fields: Optional[Iterable[str]] = None,
+                        include: Iterable[str] = ()) -> List[Dict]:
+        """Get all recipes (summary view)
 
-        query = """
-            SELECT id, title, description, cuisine_type, meal_type,
-                   source_attribution, rating, favorite, prep_time_minutes,
-                   cook_time_minutes, date_added, date_modified
+        `fields` replaces the summary columns and `include` adds child
+        sections, as for get_recipe().
+        Deep offsets still scan every skipped row; prefer get_recipes_page.
+        """
+        self._check_limit(limit, offset)
+        columns = self._select_columns(fields, default=self.SUMMARY_COLUMNS)
+        sections = self._check_sections(include)
+
+        query = f"""
+            SELECT {columns}
             FROM recipes
-            ORDER BY date_modified DESC
+            ORDER BY date_modified DESC, id DESC
         """
+        params = ()
 
         if limit:
-            query += f" LIMIT {limit} OFFSET {offset}"
+            query += " LIMIT ? OFFSET ?"
+            params = (limit, offset)
 
-        self.cursor.execute(query)
-        recipes = [dict(row) for row in self.cursor.fetchall()]
+        with self.snapshot() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return self._hydrate_recipes(cursor, [dict(row) for row in cursor.fetchall()], sections)
 
-        self.disconnect()
-        return recipes
+    def iter_recipes(self, limit: Optional[int] = None, offset: int = 0,
+                     fields: Optional[Iterable[str]] = None, include: Iterable[str] = (),
+                     batch_size: Optional[int] = None) -> Iterator[Dict]:
+        """Yield recipes in get_all_recipes() order without building a list
 
-    def search_recipes(self, search_term: str) -> List[Dict]:
-        """Search recipes by title, description, ingredients"""
-        self.connect()
+        Rows are pulled from one cursor with fetchmany(), so memory stays
+        flat however many recipes there are; child sections in `include`
+        are loaded a batch at a time.  Arguments are validated before this
+        returns (ValueError), and the whole iteration reads one snapshot.
+        """
+        self._check_limit(limit, offset)
+        columns = self._select_columns(fields, default=self.SUMMARY_COLUMNS)
+        sections = self._check_sections(include)
+        batch_size = batch_size or self.HYDRATE_CHUNK_SIZE
 
-        search_pattern = f"%{search_term}%"
+        query = f"""
+            SELECT {columns}
+            FROM recipes
+            ORDER BY date_modified DESC, id DESC
+        """
+        params = ()
+        if limit:
+            query += " LIMIT ? OFFSET ?"
+            params = (limit, offset)
 
-        self.cursor.execute("""
-            SELECT DISTINCT r.id, r.title, r.description, r.cuisine_type,
-                   r.source_attribution, r.rating, r.favorite
-            FROM recipes r
-            LEFT JOIN ingredients i ON r.id = i.recipe_id
-            LEFT JOIN instructions inst ON r.id = inst.recipe_id
-            WHERE r.title LIKE ?
-               OR r.description LIKE ?
-               OR i.ingredient_name LIKE ?
-               OR inst.instruction_text LIKE ?
-            ORDER BY r.title
-        """, (search_pattern, search_pattern, search_pattern, search_pattern))
-
-        recipes = [dict(row) for row in self.cursor.fetchall()]
-
-        self.disconnect()
-        return recipes
+        def generate():
+            with self.snapshot() as conn:
+                rows = conn.cursor()
+                children = conn.cursor()
+                rows.execute(query, params)
+                while True:
+                    batch = [dict(row) for row in rows.fetchmany(batch_size)]
+                    if not batch:
+                        return
+                    yield from self._hydrate_recipes(children, batch, sections)
 
-    def update_recipe(self, recipe_id: int, recipe_data: Dict) -> bool:
-        """Update existing recipe"""
-        self.connect()
-        cursor = self.conn.cursor()
+        return generate()
 
-        # Update main recipe data
-        update_fields = []
-        update_values = []
+    def get_recipes_page(self, limit: int, cursor: Optional[str] = None,
+                         fields: Optional[Iterable[str]] = None,
+                         include: Iterable[str] = ()) -> Tuple[List[Dict], Optional[str]]:
+        """Get one page of recipes (summary view), newest first
+
+        Pages are addressed by an opaque cursor holding the (date_modified, id)
+        of the last row of the previous page, so every page is a single range
+        read on idx_recipes_modified however deep it is.  Returns the recipes
+        and the cursor for the next page (None on the last page).
+        `fields` and `include` work as for get_all_recipes().
+        Raises ValueError for a missing or non-positive limit, a malformed
+        cursor or an unknown field.
+        """
+        if limit is None:
+            raise ValueError("limit is required for paging")
+        self._check_limit(limit)
+        fields = list(fields) if fields is not None else None
+        columns = self._select_columns(fields, default=self.SUMMARY_COLUMNS,
+                                       required=('id', 'date_modified'))
+        sections = self._check_sections(include)
+        query = f"SELECT {columns} FROM recipes"
+        params = []
+
+        if cursor:
+            date_modified, last_id = self._decode_page_cursor(cursor)
+            query += " WHERE (date_modified, id) < (?, ?)"
+            params += [date_modified, last_id]
+
+        # Fetch one extra row to learn whether another page follows
+        query += " ORDER BY date_modified DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.snapshot() as conn:
+            db_cursor = conn.cursor()
+            db_cursor.execute(query, params)
+            recipes = [dict(row) for row in db_cursor.fetchall()]
+
+            next_cursor = None
+            if len(recipes) > limit:
+                recipes = recipes[:limit]
+                last = recipes[-1]
+                next_cursor = self._encode_page_cursor(last['date_modified'], last['id'])
+
+            if fields is not None and 'date_modified' not in fields:
+                for recipe in recipes:
+                    del recipe['date_modified']  # only selected to build the cursor
+            return self._hydrate_recipes(db_cursor, recipes, sections), next_cursor
 
-        for field in ['title', 'description', 'prep_time_minutes', 'cook_time_minutes',
-                     'total_time_minutes', 'servings', 'difficulty', 'cuisine_type',
-                     'meal_type', 'source_attribution', 'source_url', 'notes',
-                     'rating', 'favorite', 'vegetarian', 'vegan', 'gluten_free', 'dairy_free']:
-            if field in recipe_data:
-                update_fields.append(f"{field} = ?")
-                update_values.append(recipe_data[field])
+    @staticmethod
+    def _encode_page_cursor(date_modified: str, recipe_id: int) -> str:
+        """Pack a page position into an opaque URL-safe token"""
+        raw = json.dumps([date_modified, recipe_id], separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
 
+    @staticmethod
+    def _decode_page_cursor(token: str) -> Tuple[str, int]:
+        """Unpack a token made by _encode_page_cursor"""
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            date_modified, recipe_id = json.loads(base64.urlsafe_b64decode(padded))
+            return date_modified, int(recipe_id)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid page cursor: {token!r}") from e
+
+    # bm25() column weights: title, description, ingredients, instructions, tags
+    SEARCH_WEIGHTS = (10.0, 4.0, 3.0, 1.0, 5.0)
+
+    def search_recipes(self, search_term: str, limit: Optional[int] = None) -> List[Dict]:
+        """Search recipes by title, description, ingredients, instructions and tags
+
+        Uses the recipes_fts index: every word in the search term must match
+        (as a prefix), results are ranked by bm25 and carry a highlighted
+        snippet of the best matching text.
+        """
+        self._check_limit(limit)
+        match_query = self._fts_match_query(search_term)
+        if not match_query:
+            return []
+
+        cursor = self.connect().cursor()
+        # Recipes changed by maintenance scripts are indexed later (by
+        # write_behind, or the next refresh); the search itself never writes
+        if cursor.execute("SELECT 1 FROM search_index_queue LIMIT 1").fetchone() is not None:
+            self._defer(self.sync_search_index)
+
+        weights = ', '.join(str(weight) for weight in self.SEARCH_WEIGHTS)
+        cursor.execute(f"""
+            SELECT r.id, r.title, r.description, r.cuisine_type,
+                   r.source_attribution, r.rating, r.favorite,
+                   snippet(recipes_fts, -1, '<mark>', '</mark>', '…', 12) AS snippet,
+                   bm25(recipes_fts, {weights}) AS rank
+            FROM recipes_fts
+            JOIN recipes r ON r.id = recipes_fts.rowid
+            WHERE recipes_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        """, (match_query, limit if limit else -1))
+
+        return [dict(row) for row in cursor.fetchall()]
+
+    # Recipe columns update_recipe may change
+    UPDATABLE_FIELDS = (
+        'title', 'description', 'prep_time_minutes', 'cook_time_minutes',
+        'total_time_minutes', 'servings', 'difficulty', 'cuisine_type',
+        'meal_type', 'source_attribution', 'source_url', 'notes',
+        'rating', 'favorite', 'vegetarian', 'vegan', 'gluten_free', 'dairy_free'
+    )
+
+    INGREDIENT_COLUMNS = ('quantity', 'unit', 'ingredient_name', 'preparation', 'ingredient_group')
+    INSTRUCTION_COLUMNS = ('instruction_text', 'instruction_group')
+
+    def update_recipe(self, recipe_id: int, recipe_data: Dict) -> Optional[List[str]]:
+        """Update existing recipe
+
+        The new data is diffed against the stored rows and only what differs
+        is written: changed columns, and ingredient/instruction positions or
+        tags that were added, edited or removed.  Returns the sections that
+        changed ('recipe', 'ingredients', 'instructions', 'tags'; empty if
+        nothing did), or None if there is no such recipe.
+        """
+        with self.transaction() as conn:
+            return self._update_recipe(conn.cursor(), recipe_id, recipe_data)
+
+    def _update_recipe(self, cursor: sqlite3.Cursor, recipe_id: int,
+                       recipe_data: Dict) -> Optional[List[str]]:
+        """Apply an update inside the caller's transaction"""
+        cursor.execute("SELECT * FROM recipes WHERE id = ?", (recipe_id,))
+        current = cursor.fetchone()
+        if current is None:
+            return None
+
+        changed = []
+
+        # Update main recipe data
+        update_fields = [field for field in self.UPDATABLE_FIELDS
+                         if field in recipe_data and recipe_data[field] != current[field]]
         if update_fields:
-            update_values.append(recipe_id)
             cursor.execute(f"""
                 UPDATE recipes
-                SET {', '.join(update_fields)}
+                SET {', '.join(f"{field} = ?" for field in update_fields)}
                 WHERE id = ?
-            """, update_values)
+            """, [recipe_data[field] for field in update_fields] + [recipe_id])
+            changed.append('recipe')
 
         # Update ingredients if provided
         if 'ingredients' in recipe_data:
-            cursor.execute("DELETE FROM ingredients WHERE recipe_id = ?", (recipe_id,))
-            for idx, ingredient in enumerate(recipe_data['ingredients']):
-                cursor.execute("""
-                    INSERT INTO ingredients (
-                        recipe_id, ingredient_order, quantity, unit,
-                        ingredient_name, preparation, ingredient_group
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    recipe_id, idx + 1,
-                    ingredient.get('quantity'),
-                    ingredient.get('unit'),
-                    ingredient.get('name'),
-                    ingredient.get('preparation'),
-                    ingredient.get('group')
-                ))
+            rows = [self._ingredient_row(recipe_id, idx + 1, ingredient)[2:]
+                    for idx, ingredient in enumerate(recipe_data['ingredients'])]
+            if self._sync_child_rows(cursor, 'ingredients', 'ingredient_order',
+                                     self.INGREDIENT_COLUMNS, recipe_id, rows):
+                changed.append('ingredients')
 
         # Update instructions if provided
         if 'instructions' in recipe_data:
-            cursor.execute("DELETE FROM instructions WHERE recipe_id = ?", (recipe_id,))
-            for idx, instruction in enumerate(recipe_data['instructions']):
-                if isinstance(instruction, str):
-                    instruction_text = instruction
-                    instruction_group = None
-                else:
-                    instruction_text = instruction.get('text', instruction.get('instruction', ''))
-                    instruction_group = instruction.get('group')
-
-                cursor.execute("""
-                    INSERT INTO instructions (
-                        recipe_id, step_number, instruction_text, instruction_group
-                    ) VALUES (?, ?, ?, ?)
-                """, (recipe_id, idx + 1, instruction_text, instruction_group))
+            rows = [self._instruction_row(recipe_id, idx + 1, instruction)[2:]
+                    for idx, instruction in enumerate(recipe_data['instructions'])]
+            if self._sync_child_rows(cursor, 'instructions', 'step_number',
+                                     self.INSTRUCTION_COLUMNS, recipe_id, rows):
+                changed.append('instructions')
 
         # Update tags if provided
         if 'tags' in recipe_data:
-            cursor.execute("DELETE FROM recipe_tags WHERE recipe_id = ?", (recipe_id,))
-            for tag_name in recipe_data['tags']:
-                cursor.execute("INSERT OR IGNORE INTO tags (tag_name) VALUES (?)", (tag_name,))
-                cursor.execute("SELECT id FROM tags WHERE tag_name = ?", (tag_name,))
-                tag_id = cursor.fetchone()[0]
-                cursor.execute(
-                    "INSERT INTO recipe_tags (recipe_id, tag_id) VALUES (?, ?)",
-                    (recipe_id, tag_id)
-                )
+            if self._sync_recipe_tags(cursor, recipe_id, recipe_data['tags']):
+                changed.append('tags')
 
-        self.conn.commit()
-        self.disconnect()
-        return True
+        # Child-only edits still count as modifying the recipe
+        if changed and 'recipe' not in changed:
+            cursor.execute(
+                "UPDATE recipes SET date_modified = CURRENT_TIMESTAMP WHERE id = ?",
+                (recipe_id,)
+            )
+        if changed:
+            self._local.dirty_docs.add(recipe_id)
+
+        return changed
+
+    def _sync_child_rows(self, cursor: sqlite3.Cursor, table: str, order_column: str,
+                         columns: Tuple[str, ...], recipe_id: int, rows: List[Tuple]) -> bool:
+        """Make a recipe's ordered child rows match `rows` with minimal writes
+
+        rows[i] holds the values of `columns` for position i + 1.  Stored rows
+        are matched to positions by their order key: changed positions are
+        updated in place, new positions inserted and surplus rows deleted.
+        Returns True if anything was written.
+        """
+        cursor.execute(f"""
+            SELECT id, {order_column}, {', '.join(columns)}
+            FROM {table}
+            WHERE recipe_id = ?
+            ORDER BY {order_column}
+        """, (recipe_id,))
+
+        stored = {}
+        deletes = []
+        for row in cursor.fetchall():
+            if row[order_column] in stored:
+                deletes.append((row['id'],))  # duplicate position
+            else:
+                stored[row[order_column]] = (row['id'], tuple(row[column] for column in columns))
+
+        updates = []
+        inserts = []
+        for position, values in enumerate(rows, 1):
+            existing = stored.pop(position, None)
+            if existing is None:
+                inserts.append((recipe_id, position) + tuple(values))
+            elif existing[1] != tuple(values):
+                updates.append(tuple(values) + (existing[0],))
+        deletes.extend((row_id,) for row_id, _ in stored.values())
+
+        if deletes:
+            cursor.executemany(f"DELETE FROM {table} WHERE id = ?", deletes)
+        if updates:
+            cursor.executemany(f"""
+                UPDATE {table}
+                SET {', '.join(f"{column} = ?" for column in columns)}
+                WHERE id = ?
+            """, updates)
+        if inserts:
+            cursor.executemany(f"""
+                INSERT INTO {table} (recipe_id, {order_column}, {', '.join(columns)})
+                VALUES ({', '.join('?' * (len(columns) + 2))})
+            """, inserts)
+
+        return bool(deletes or updates or inserts)
+
+    def _sync_recipe_tags(self, cursor: sqlite3.Cursor, recipe_id: int, tag_names: List[str]) -> bool:
+        """Link and unlink tags so the recipe has exactly `tag_names`"""
+        cursor.execute("""
+            SELECT t.id, t.tag_name FROM tags t
+            JOIN recipe_tags rt ON t.id = rt.tag_id
+            WHERE rt.recipe_id = ?
+        """, (recipe_id,))
+        current = {row['tag_name']: row['id'] for row in cursor.fetchall()}
+
+        wanted = list(dict.fromkeys(tag_names))
+        removed = [(recipe_id, tag_id) for name, tag_id in current.items() if name not in wanted]
+        added = [name for name in wanted if name not in current]
+
+        if removed:
+            cursor.executemany(
+                "DELETE FROM recipe_tags WHERE recipe_id = ? AND tag_id = ?",
+                removed
+            )
+        if added:
+            tag_ids = self._resolve_tag_ids(cursor, added)
+            cursor.executemany(
+                "INSERT INTO recipe_tags (recipe_id, tag_id) VALUES (?, ?)",
+                [(recipe_id, tag_ids[name]) for name in added]
+            )
+
+        return bool(removed or added)
 
     def delete_recipe(self, recipe_id: int) -> bool:
         """Delete a recipe"""
-        self.connect()
-        self.cursor.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
-        self.conn.commit()
-        self.disconnect()
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
         return True
 
-    def get_statistics(self) -> Dict:
-        """Get database statistics"""
-        self.connect()
+    BATCH_OPERATIONS = ('create', 'update', 'delete')
 
-        stats = {}
+    def write_batch(self, operations: Iterable[Dict]) -> List[Dict]:
+        """Apply many creates, updates and deletes in one transaction
 
-        # Total recipes
-        self.cursor.execute("SELECT COUNT(*) as count FROM recipes")
-        stats['total_recipes'] = self.cursor.fetchone()['count']
+        Operations look like {'op': 'create', 'recipe': {...}},
+        {'op': 'update', 'id': 5, 'recipe': {...}} or {'op': 'delete', 'id': 5}.
+        Each runs in its own savepoint, so one that fails is undone without
+        touching the others, and the rest commit together.
 
-        # Recipes by source
-        self.cursor.execute("""
-            SELECT source_attribution, COUNT(*) as count
-            FROM recipes
-            GROUP BY source_attribution
-            ORDER BY count DESC
-        """)
-        stats['by_source'] = [dict(row) for row in self.cursor.fetchall()]
+        Returns one result per operation, in order, with the 'op', the
+        recipe 'id' and a 'result': 'created', 'updated', 'unchanged',
+        'deleted', 'not_found', 'invalid' or 'error' (the last two with an
+        'error' message).  Updates also report the sections that 'changed'.
+        """
+        results = []
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            for operation in operations:
+                fields = operation if isinstance(operation, dict) else {}
+                result = {'op': fields.get('op'), 'id': fields.get('id')}
+                try:
+                    with self.transaction():
+                        result.update(self._apply_operation(cursor, operation))
+                except ValueError as e:
+                    result.update(result='invalid', error=str(e))
+                except sqlite3.Error as e:
+                    result.update(result='error', error=str(e))
+                results.append(result)
+        return results
 
-        # Recipes by cuisine
-        self.cursor.execute("""
-            SELECT cuisine_type, COUNT(*) as count
-            FROM recipes
-            WHERE cuisine_type IS NOT NULL
-            GROUP BY cuisine_type
-            ORDER BY count DESC
-        """)
-        stats['by_cuisine'] = [dict(row) for row in self.cursor.fetchall()]
+    def _apply_operation(self, cursor: sqlite3.Cursor, operation) -> Dict:
+        """Run one write_batch() operation inside the caller's savepoint"""
+        op = operation.get('op') if isinstance(operation, dict) else None
+        if op not in self.BATCH_OPERATIONS:
+            raise ValueError(f"op must be one of: {', '.join(self.BATCH_OPERATIONS)}")
+
+        recipe_data = operation.get('recipe')
+        if op != 'delete' and not isinstance(recipe_data, dict):
+            raise ValueError("recipe is required")
+        if op == 'create':
+            if not recipe_data.get('title'):
+                raise ValueError("Title is required")
+            return {'id': self._insert_recipes(cursor.connection, [recipe_data])[0],
+                    'result': 'created'}
+
+        recipe_id = operation.get('id')
+        if not isinstance(recipe_id, int) or isinstance(recipe_id, bool):
+            raise ValueError("id must be an integer")
+        if op == 'delete':
+            cursor.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
+            return {'result': 'deleted' if cursor.rowcount else 'not_found'}
+
+        changed = self._update_recipe(cursor, recipe_id, recipe_data)
+        if changed is None:
+            return {'result': 'not_found'}
+        return {'result': 'updated' if changed else 'unchanged', 'changed': changed}
+
+    def get_statistics(self) -> Dict:
+        """Get database statistics
+
+        Reads the trigger-maintained recipe_stats counters, so the cost does
+        not grow with the number of recipes.
+        """
+        cursor = self.connect().cursor()
+
+        stats = {'total_recipes': 0, 'by_source': [], 'by_cuisine': [], 'favorites': 0}
 
-        # Favorite recipes
-        self.cursor.execute("SELECT COUNT(*) as count FROM recipes WHERE favorite = 1")
-        stats['favorites'] = self.cursor.fetchone()['count']
+        cursor.execute("SELECT dimension, value, count FROM recipe_stats")
+        for row in cursor.fetchall():
+            if row['dimension'] == 'total':
+                stats['total_recipes'] = row['count']
+            elif row['dimension'] == 'favorites':
+                stats['favorites'] = row['count']
+            elif row['count'] <= 0:
+                continue
+            elif row['dimension'] == 'source':
+                stats['by_source'].append({'source_attribution': row['value'], 'count': row['count']})
+            elif row['dimension'] == 'cuisine':
+                stats['by_cuisine'].append({'cuisine_type': row['value'], 'count': row['count']})
 
-        self.disconnect()
+        # A handful of rows; sorting here keeps the read a plain table scan
+        stats['by_source'].sort(key=lambda entry: entry['count'], reverse=True)
+        stats['by_cuisine'].sort(key=lambda entry: entry['count'], reverse=True)
         return stats
 
+    def rebuild_statistics(self):
+        """Recompute the recipe_stats counters from the recipes table"""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM recipe_stats")
+            conn.execute("""
+                INSERT INTO recipe_stats (dimension, value, count)
+                SELECT 'total', '', COUNT(*) FROM recipes
+                UNION ALL
+                SELECT 'favorites', '', COUNT(*) FROM recipes WHERE favorite = 1
+                UNION ALL
+                SELECT 'source', source_attribution, COUNT(*) FROM recipes
+                GROUP BY source_attribution
+                UNION ALL
+                SELECT 'cuisine', cuisine_type, COUNT(*) FROM recipes
+                WHERE cuisine_type IS NOT NULL
+                GROUP BY cuisine_type
+            """)
 
 if __name__ == "__main__":
     # Initialize database
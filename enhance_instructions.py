@@ -7,36 +7,20 @@ Example: "Add the onions" -> "Add the onions (2 large, diced)"
 import sqlite3
 import re
 from difflib import SequenceMatcher
+from database import RecipeDatabase
 
 def get_all_recipes():
     """Get all recipes with ingredients and instructions"""
-    conn = sqlite3.connect('recipes.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    db = RecipeDatabase('recipes.db')
+    conn = db.connect()
 
-    cursor.execute("SELECT id, title FROM recipes WHERE source_attribution != 'Janet' OR source_attribution IS NULL")
-    recipes = [dict(row) for row in cursor.fetchall()]
+    cursor = conn.execute("SELECT id FROM recipes WHERE source_attribution != 'Janet' OR source_attribution IS NULL")
+    recipe_ids = [row['id'] for row in cursor.fetchall()]
 
-    for recipe in recipes:
-        # Get ingredients
-        cursor.execute("""
-            SELECT id, quantity, unit, ingredient_name, preparation
-            FROM ingredients
-            WHERE recipe_id = ?
-            ORDER BY id
-        """, (recipe['id'],))
-        recipe['ingredients'] = [dict(row) for row in cursor.fetchall()]
-
-        # Get instructions
-        cursor.execute("""
-            SELECT id, step_number, instruction_text
-            FROM instructions
-            WHERE recipe_id = ?
-            ORDER BY step_number
-        """, (recipe['id'],))
-        recipe['instructions'] = [dict(row) for row in cursor.fetchall()]
+    # One query per table for the whole set instead of two per recipe
+    recipes = db.get_recipes_bulk(recipe_ids)
 
-    conn.close()
+    db.close()
     return recipes
 
 def similarity(a, b):
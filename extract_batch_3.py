@@ -3,7 +3,7 @@ Extract batch 3 of Janet Mason recipes (images 8124-8128)
 """
 
 import sys
-from batch_extract_janet import insert_recipe, mark_completed, mark_error
+from batch_extract_janet import insert_recipes, mark_completed, mark_error
 
 RECIPES = {
     'IMG_8124_1.JPG': {
@@ -232,18 +232,29 @@ def main():
     success_count = 0
     error_count = 0
 
+    # The whole batch goes in with one transaction; a recipe that fails is skipped alone
+    errors = {}
+    try:
+        recipe_ids = insert_recipes(RECIPES, errors=errors)
+    except Exception as e:
+        print(f"  ❌ Error: {e}")
+        print()
+        recipe_ids = {}
+        for filename in RECIPES:
+            mark_error(filename, str(e))
+
     for filename, recipe_data in RECIPES.items():
         print(f"Processing: {filename}")
         print(f"  Title: {recipe_data['title']}")
 
-        try:
-            recipe_id = insert_recipe(filename, recipe_data)
-            print(f"  ✅ Inserted as recipe #{recipe_id}")
+        if filename in recipe_ids:
+            print(f"  ✅ Inserted as recipe #{recipe_ids[filename]}")
             success_count += 1
-
-        except Exception as e:
-            print(f"  ❌ Error: {e}")
-            mark_error(filename, str(e))
+        elif filename in errors:
+            print(f"  ❌ Error: {errors[filename]}")
+            mark_error(filename, str(errors[filename]))
+            error_count += 1
+        else:
             error_count += 1
 
         print()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic recipe corpora for scale testing.
+
+Field distributions (ingredient and instruction counts, instruction and
+description lengths, vocabulary, tag sets, sources, cuisines, times...)
+are learned from the real recipes in recipes.json and recipes.db, then
+sampled to build databases and JSON exports at any size.
+
+Recipe N depends only on the seed and N, so a 10k corpus starts with the
+same 1k recipes as the 1k corpus, and reruns produce identical files.
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from database import RecipeDatabase
+from export_to_json import write_recipes_json
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+# Synthetic recipes are dated from here on, so reruns export identical JSON
+EPOCH = datetime(2015, 1, 1)
+
+# Header fields sampled independently from their observed values
+HEADER_FIELDS = ['prep_time_minutes', 'cook_time_minutes', 'total_time_minutes',
+                 'servings', 'difficulty', 'cuisine_type', 'meal_type',
+                 'source_attribution', 'rating', 'favorite', 'vegetarian', 'vegan',
+                 'gluten_free', 'dairy_free']
+
+
+SCHEMA_FILE = str(Path(__file__).resolve().parent / 'schema.sql')
+
+DIFFICULTIES = {'easy': 'Easy', 'medium': 'Medium', 'hard': 'Hard'}
+
+
+def _words(text) -> List[str]:
+    return text.split() if text else []
+
+
+class CorpusModel:
+    """Empirical field distributions taken from a set of sample recipes"""
+
+    def __init__(self, samples: List[Dict]):
+        if not samples:
+            raise ValueError("No sample recipes to learn from")
+
+        self.sample_count = len(samples)
+        self.headers = {field: [recipe.get(field) for recipe in samples]
+                        for field in HEADER_FIELDS}
+        # Exports use lower case; the schema only accepts the capitalised names
+        self.headers['difficulty'] = [DIFFICULTIES.get(str(value).lower(), 'Unknown')
+                                      for value in self.headers['difficulty']]
+        for flag in ('favorite', 'vegetarian', 'vegan', 'gluten_free', 'dairy_free'):
+            self.headers[flag] = [value or 0 for value in self.headers[flag]]
+
+        self.title_lengths = [max(1, len(_words(r.get('title')))) for r in samples]
+        self.title_words = [w for r in samples for w in _words(r.get('title'))] or ['Recipe']
+        self.description_lengths = [len(_words(r.get('description'))) for r in samples]
+        self.description_words = [w for r in samples for w in _words(r.get('description'))] or ['Tasty']
+
+        self.ingredient_counts = [len(r.get('ingredients') or []) for r in samples]
+        self.ingredients = [ing for r in samples for ing in r.get('ingredients') or []]
+
+        self.instruction_counts = [len(r.get('instructions') or []) for r in samples]
+        instructions = [step for r in samples for step in r.get('instructions') or []]
+        self.instruction_lengths = [max(1, len(_words(step))) for step in instructions] or [12]
+        self.instruction_words = [w for step in instructions for w in _words(step)] or ['Cook']
+
+        # Tag sets are kept whole so tags that go together stay together
+        self.tag_sets = [list(r.get('tags') or []) for r in samples]
+
+    @classmethod
+    def from_sources(cls, json_path: Optional[str] = 'recipes.json',
+                     db_path: Optional[str] = 'recipes.db') -> 'CorpusModel':
+        """Learn from whichever of the JSON export and database exist"""
+        samples = []
+        if json_path and os.path.exists(json_path):
+            samples.extend(load_json_samples(json_path))
+        if db_path and os.path.exists(db_path):
+            samples.extend(load_db_samples(db_path))
+        return cls(samples)
+
+    def recipe(self, seed: int, index: int) -> Dict:
+        """The synthetic recipe at `index` for `seed`"""
+        rng = random.Random(seed * 1_000_000_007 + index)
+        choice = rng.choice
+
+        recipe = {field: choice(values) for field, values in self.headers.items()}
+        recipe['title'] = ' '.join(rng.choices(self.title_words, k=choice(self.title_lengths)))
+        description_length = choice(self.description_lengths)
+        recipe['description'] = (' '.join(rng.choices(self.description_words, k=description_length))
+                                 if description_length else None)
+        added = EPOCH + timedelta(minutes=index * 5 + rng.randrange(5))
+        recipe['date_added'] = added.strftime('%Y-%m-%d %H:%M:%S')
+        recipe['date_modified'] = (added + timedelta(days=rng.randrange(730))
+                                   if rng.random() < 0.3 else added).strftime('%Y-%m-%d %H:%M:%S')
+        recipe['original_filename'] = f"synthetic_{index:07d}.pdf"
+        recipe['file_path'] = f"Synthetic/synthetic_{index:07d}.pdf"
+
+        recipe['ingredients'] = ([dict(ing) for ing in rng.choices(self.ingredients,
+                                                                   k=choice(self.ingredient_counts))]
+                                 if self.ingredients else [])
+        recipe['instructions'] = [' '.join(rng.choices(self.instruction_words,
+                                                       k=choice(self.instruction_lengths)))
+                                  for _ in range(choice(self.instruction_counts))]
+        recipe['tags'] = list(choice(self.tag_sets))
+        return recipe
+
+    def recipes(self, seed: int, count: int) -> Iterator[Dict]:
+        """The first `count` synthetic recipes for `seed`"""
+        for index in range(count):
+            yield self.recipe(seed, index)
+
+
+def _ingredient(name, quantity, unit, preparation, group) -> Dict:
+    """Ingredient in the shape add_recipes() takes"""
+    return {'name': name, 'quantity': quantity, 'unit': unit,
+            'preparation': preparation, 'group': group}
+
+
+def load_json_samples(json_path: str) -> List[Dict]:
+    """Sample recipes from a recipes.json export"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        recipes = json.load(f)
+
+    samples = []
+    for recipe in recipes:
+        sample = {field: recipe.get(field) for field in HEADER_FIELDS}
+        sample['title'] = recipe.get('title')
+        sample['description'] = recipe.get('description')
+        sample['ingredients'] = [
+            _ingredient(ing.get('ingredient_name'), ing.get('quantity'), ing.get('unit'),
+                        ing.get('preparation') or ing.get('preparation_notes'),
+                        ing.get('ingredient_group'))
+            for ing in recipe.get('ingredients') or [] if ing.get('ingredient_name')
+        ]
+        sample['instructions'] = [step.get('instruction_text') if isinstance(step, dict) else step
+                                  for step in recipe.get('instructions') or []]
+        sample['tags'] = [tag.get('tag_name') if isinstance(tag, dict) else tag
+                          for tag in recipe.get('tags') or []]
+        samples.append(sample)
+    return samples
+
+
+def load_db_samples(db_path: str) -> List[Dict]:
+    """Sample recipes from a recipes database, opened read-only"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(recipes)")}
+        samples = {}
+        for row in conn.execute("SELECT * FROM recipes"):
+            sample = {field: row[field] if field in columns else None for field in HEADER_FIELDS}
+            sample.update(title=row['title'], description=row['description'],
+                          ingredients=[], instructions=[], tags=[])
+            samples[row['id']] = sample
+
+        for row in conn.execute("""
+            SELECT recipe_id, ingredient_name, quantity, unit, preparation, ingredient_group
+            FROM ingredients ORDER BY recipe_id, ingredient_order
+        """):
+            if row['recipe_id'] in samples:
+                samples[row['recipe_id']]['ingredients'].append(_ingredient(*tuple(row)[1:]))
+
+        for row in conn.execute("""
+            SELECT recipe_id, instruction_text FROM instructions ORDER BY recipe_id, step_number
+        """):
+            if row['recipe_id'] in samples:
+                samples[row['recipe_id']]['instructions'].append(row['instruction_text'])
+
+        for row in conn.execute("""
+            SELECT rt.recipe_id, t.tag_name FROM recipe_tags rt JOIN tags t ON rt.tag_id = t.id
+        """):
+            if row['recipe_id'] in samples:
+                samples[row['recipe_id']]['tags'].append(row['tag_name'])
+    finally:
+        conn.close()
+    return list(samples.values())
+
+
+def size_label(size: int) -> str:
+    """1000 -> '1k', 1000000 -> '1m'"""
+    for factor, suffix in ((1_000_000, 'm'), (1_000, 'k')):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{suffix}"
+    return str(size)
+
+
+def generate_corpus(model: CorpusModel, size: int, output_dir: str, seed: int = 42,
+                    schema_file: str = SCHEMA_FILE, batch_size: int = 1000,
+                    write_json: bool = True) -> Dict:
+    """Build recipes_<size>.db (and .json) in output_dir"""
+    os.makedirs(output_dir, exist_ok=True)
+    label = size_label(size)
+    db_path = os.path.join(output_dir, f"recipes_{label}.db")
+    json_path = os.path.join(output_dir, f"recipes_{label}.json")
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    print(f"\n📦 Generating {size:,} recipes -> {db_path}")
+    start = time.perf_counter()
+    db = RecipeDatabase(db_path)
+    db.initialize_database(schema_file)
+
+    def report(progress):
+        if progress['recipes'] % (batch_size * 50) == 0 or progress['recipes'] == size:
+            print(f"   {progress['recipes']:>9,} recipes  {progress['rows_per_sec']:>9,.0f} rows/s")
+
+    db.add_recipes(model.recipes(seed, size), batch_size=batch_size, on_batch=report)
+    db.close()
+    result = {'size': size, 'db_path': db_path, 'db_seconds': time.perf_counter() - start}
+
+    if write_json:
+        start = time.perf_counter()
+        db = RecipeDatabase(db_path)
+        write_recipes_json(db.iter_full_recipes(), json_path)
+        db.close()
+        result.update(json_path=json_path, json_seconds=time.perf_counter() - start)
+        print(f"   Exported {json_path} ({Path(json_path).stat().st_size / 1024 / 1024:.1f} MB)")
+
+    return result
+
+
+def parse_sizes(text: str) -> List[int]:
+    """'1k,10k,1m' or '1000,10000' -> [1000, 10000, ...]"""
+    sizes = []
+    for part in text.split(','):
+        part = part.strip().lower()
+        multiplier = {'k': 1_000, 'm': 1_000_000}.get(part[-1:], 1)
+        sizes.append(int(part[:-1] if multiplier > 1 else part) * multiplier)
+    return sizes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic recipe corpora')
+    parser.add_argument('--sizes', type=parse_sizes, default=DEFAULT_SIZES,
+                        help='Comma-separated corpus sizes, e.g. 1k,10k,100k,1m (default)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--output-dir', default='corpus', help='Output directory (default: corpus)')
+    parser.add_argument('--source-json', default='recipes.json',
+                        help='Recipes JSON to learn from (default: recipes.json)')
+    parser.add_argument('--source-db', default='recipes.db',
+                        help='Recipes database to learn from (default: recipes.db)')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Recipes per insert transaction (default: 1000)')
+    parser.add_argument('--no-json', action='store_true', help='Skip the JSON exports')
+    args = parser.parse_args()
+
+    model = CorpusModel.from_sources(args.source_json, args.source_db)
+    print(f"📖 Learned field distributions from {model.sample_count} recipes")
+
+    for size in args.sizes:
+        generate_corpus(model, size, args.output_dir, seed=args.seed,
+                        batch_size=args.batch_size, write_json=not args.no_json)
+
+    print(f"\n🎉 Corpora written to {args.output_dir}/")
@@ -55,6 +55,7 @@ def main():
     }
 
     # Process each file
+    recipes = []
     for file_path in janet_files:
         try:
             filename = Path(file_path).name
@@ -83,15 +84,36 @@ def main():
                 'difficulty': 'Unknown'
             }
 
-            recipe_id = db.add_recipe(recipe_data)
-            status = "(needs review)" if needs_review else ""
-            print(f"  ✓ Added as recipe #{recipe_id}: {title} {status}")
-            stats['processed'] += 1
+            recipes.append(recipe_data)
 
         except Exception as e:
             print(f"  ✗ Error: {str(e)}")
             stats['failed'] += 1
 
+    # Write everything in batched transactions
+    committed = {'recipes': 0, 'failed': 0}
+
+    def report(progress):
+        committed.update(recipes=progress['recipes'], failed=progress['failed'])
+        print(f"  … committed {progress['recipes']} recipes ({progress['rows_per_sec']:.0f} rows/sec)")
+
+    def skip(recipe_data, error):
+        print(f"  ✗ Error: {recipe_data.get('file_path') or recipe_data.get('title')}: {str(error)}")
+
+    try:
+        recipe_ids = db.add_recipes(recipes, on_batch=report, on_error=skip)
+        for recipe_id, recipe_data in zip(recipe_ids, recipes):
+            if recipe_id is None:
+                continue
+            status = "(needs review)" if 'Needs Review' in recipe_data['tags'] else ""
+            print(f"  ✓ Added as recipe #{recipe_id}: {recipe_data['title']} {status}")
+        stats['processed'] += committed['recipes']
+        stats['failed'] += committed['failed']
+    except Exception as e:
+        print(f"  ✗ Error: {str(e)}")
+        stats['processed'] += committed['recipes']
+        stats['failed'] += len(recipes) - committed['recipes']
+
     # Print summary
     print(f"\n{'='*60}")
     print("JANET MASON IMPORT COMPLETE")
@@ -40,17 +40,38 @@ def main():
     print(f"Found {len(recipe_files)} recipe files in main folder\n")
 
     # Process each file
+    recipes = []
     for file_path in sorted(recipe_files):
         try:
             print(f"Processing: {file_path}")
-            recipe_data = extractor.extract_from_file(file_path)
-            recipe_id = db.add_recipe(recipe_data)
-            print(f"  ✓ Added as recipe #{recipe_id}: {recipe_data['title']}")
-            stats['processed'] += 1
+            recipes.append(extractor.extract_from_file(file_path))
         except Exception as e:
             print(f"  ✗ Error: {str(e)}")
             stats['failed'] += 1
 
+    # Write everything in batched transactions
+    committed = {'recipes': 0, 'failed': 0}
+
+    def report(progress):
+        committed.update(recipes=progress['recipes'], failed=progress['failed'])
+        print(f"  … committed {progress['recipes']} recipes ({progress['rows_per_sec']:.0f} rows/sec)")
+
+    def skip(recipe_data, error):
+        print(f"  ✗ Error: {recipe_data.get('file_path') or recipe_data.get('title')}: {str(error)}")
+
+    try:
+        recipe_ids = db.add_recipes(recipes, on_batch=report, on_error=skip)
+        for recipe_id, recipe_data in zip(recipe_ids, recipes):
+            if recipe_id is None:
+                continue
+            print(f"  ✓ Added as recipe #{recipe_id}: {recipe_data['title']}")
+        stats['processed'] += committed['recipes']
+        stats['failed'] += committed['failed']
+    except Exception as e:
+        print(f"  ✗ Error: {str(e)}")
+        stats['processed'] += committed['recipes']
+        stats['failed'] += len(recipes) - committed['recipes']
+
     # Print summary
     print(f"\n{'='*60}")
     print("IMPORT COMPLETE")
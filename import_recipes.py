@@ -4,7 +4,7 @@ Batch import script - processes all recipe files and populates database
 
 import os
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional
 from database import RecipeDatabase
 from recipe_extractor import RecipeExtractor
 
@@ -12,9 +12,10 @@ from recipe_extractor import RecipeExtractor
 class RecipeImporter:
     """Batch import recipes from file system"""
 
-    def __init__(self, db_path: str = "recipes.db"):
+    def __init__(self, db_path: str = "recipes.db", batch_size: int = 500):
         self.db = RecipeDatabase(db_path)
         self.extractor = RecipeExtractor()
+        self.batch_size = batch_size
         self.stats = {
             'total_files': 0,
             'processed': 0,
@@ -41,8 +42,8 @@ class RecipeImporter:
 
         return recipe_files
 
-    def import_file(self, file_path: str, override_source: str = None) -> bool:
-        """Import a single recipe file"""
+    def extract_file(self, file_path: str, override_source: str = None) -> Optional[Dict]:
+        """Extract a single recipe file (None if extraction failed)"""
         try:
             print(f"Processing: {Path(file_path).name}")
 
@@ -53,6 +54,20 @@ class RecipeImporter:
             if override_source:
                 recipe_data['source_attribution'] = override_source
 
+            return recipe_data
+
+        except Exception as e:
+            print(f"  ✗ Error: {str(e)}")
+            self.stats['failed'] += 1
+            return None
+
+    def import_file(self, file_path: str, override_source: str = None) -> bool:
+        """Import a single recipe file"""
+        recipe_data = self.extract_file(file_path, override_source)
+        if recipe_data is None:
+            return False
+
+        try:
             # Add to database
             recipe_id = self.db.add_recipe(recipe_data)
 
@@ -65,6 +80,33 @@ class RecipeImporter:
             self.stats['failed'] += 1
             return False
 
+    def import_recipes(self, recipes: List[Dict]):
+        """Write extracted recipes to the database in batched transactions"""
+        committed = {'recipes': 0, 'failed': 0}
+
+        def report(progress):
+            committed.update(recipes=progress['recipes'], failed=progress['failed'])
+            print(f"  … committed {progress['recipes']} recipes "
+                  f"({progress['rows']} rows, {progress['rows_per_sec']:.0f} rows/sec)")
+
+        def skip(recipe_data, error):
+            print(f"  ✗ Error: {recipe_data.get('file_path') or recipe_data.get('title')}: {str(error)}")
+
+        try:
+            recipe_ids = self.db.add_recipes(recipes, batch_size=self.batch_size,
+                                             on_batch=report, on_error=skip)
+        except Exception as e:
+            print(f"  ✗ Error: {str(e)}")
+            self.stats['processed'] += committed['recipes']
+            self.stats['failed'] += len(recipes) - committed['recipes']
+            return
+
+        for recipe_id, recipe_data in zip(recipe_ids, recipes):
+            if recipe_id is not None:
+                print(f"  ✓ Added as recipe #{recipe_id}: {recipe_data['title']}")
+        self.stats['processed'] += committed['recipes']
+        self.stats['failed'] += committed['failed']
+
     def import_directory(self, directory: str, override_source: str = None):
         """Import all recipes from a directory"""
         print(f"\n{'='*60}")
@@ -78,8 +120,13 @@ class RecipeImporter:
 
         print(f"Found {len(recipe_files)} recipe files\n")
 
+        recipes = []
         for file_path in recipe_files:
-            self.import_file(file_path, override_source)
+            recipe_data = self.extract_file(file_path, override_source)
+            if recipe_data is not None:
+                recipes.append(recipe_data)
+
+        self.import_recipes(recipes)
 
     def import_all(self, base_directory: str = "."):
         """Import all recipes from base directory and subdirectories"""
@@ -142,10 +189,12 @@ def main():
                        help='Override source attribution')
     parser.add_argument('--db', default='recipes.db',
                        help='Database file path (default: recipes.db)')
+    parser.add_argument('--batch-size', type=int, default=500,
+                       help='Recipes per database transaction (default: 500)')
 
     args = parser.parse_args()
 
-    importer = RecipeImporter(args.db)
+    importer = RecipeImporter(args.db, batch_size=args.batch_size)
 
     if args.file:
         # Import single file
@@ -0,0 +1,210 @@
+"""
+Prometheus-style metrics for the web server
+
+Counters, gauges and histograms with labels, kept in process memory and
+rendered in the Prometheus text exposition format (0.0.4), so any
+Prometheus-compatible scraper can read /api/metrics without a client
+library.  Values that already live elsewhere (the response cache's
+counters, say) are exposed through callbacks read at scrape time.
+
+Values are per process.  When several processes serve the same endpoint,
+give each registry constant_labels (e.g. {'worker': pid}) so a scraper
+keeps their series apart instead of seeing one series jump between them.
+"""
+
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers a cached hit (sub-millisecond) up to a full export
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    """Escape a label value"""
+    return _escape_help(value).replace('"', '\\"')
+
+
+def _escape_help(text) -> str:
+    return str(text).replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class _Metric:
+    """Base for a named family of samples keyed by label values"""
+
+    kind = 'untyped'
+    per_process = True  # gets the registry's constant_labels
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, Sequence[str], Sequence, float]]:
+        """(sample name, label names, label values, value) for rendering"""
+        with self._lock:
+            return [(self.name, self.labelnames, key, value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, plus their sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        names = self.labelnames + ('le',)
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+
+        samples = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((self.name + '_bucket', names, key + (_format_value(bound),), cumulative))
+            samples.append((self.name + '_sum', self.labelnames, key, total))
+            samples.append((self.name + '_count', self.labelnames, key, count))
+        return samples
+
+
+class _Callback(_Metric):
+    """Metric whose samples are read from a function at scrape time"""
+
+    def __init__(self, name: str, kind: str, documentation: str,
+                 function: Callable[[], Dict[Tuple, float]], labelnames: Sequence[str] = (),
+                 per_process: bool = True):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.function = function
+        self.per_process = per_process
+
+    def samples(self):
+        values = self.function() or {}
+        return [(self.name, self.labelnames, key, value) for key, value in values.items()]
+
+
+class MetricsRegistry:
+    """The set of metrics rendered together at one endpoint"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self.constant_labels: Dict[str, str] = {}  # added to every per-process sample
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if any(existing.name == metric.name for existing in self._metrics):
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, kind: str, documentation: str,
+                 function: Callable[[], Dict[Tuple, float]], labelnames: Sequence[str] = (),
+                 per_process: bool = True):
+        """Register a counter or gauge computed by function() on every scrape
+
+        function returns {label values tuple: value}; () is the key for an
+        unlabelled value.  An empty dict leaves the metric out.  Pass
+        per_process=False for values that are the same whichever process
+        is scraped (read from shared memory), so they skip constant_labels.
+        """
+        return self._register(_Callback(name, kind, documentation, function, labelnames,
+                                        per_process))
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text format"""
+        lines = []
+        constant_names = tuple(self.constant_labels)
+        constant_values = tuple(self.constant_labels.values())
+        for metric in self._metrics:
+            samples = metric.samples()
+            if not samples and isinstance(metric, _Callback):
+                continue
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labelnames, labelvalues, value in samples:
+                if metric.per_process and constant_names:
+                    labelnames = constant_names + tuple(labelnames)
+                    labelvalues = constant_values + tuple(labelvalues)
+                lines.append(f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
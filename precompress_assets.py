@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Write precompressed .gz (and .br, if brotli is installed) sidecars for the
+static files the web server sends: the HTML pages, scripts and the
+recipes.json export.  server.py serves a sidecar instead of the original
+when the client accepts that encoding and the sidecar is not older than
+the file, so run this after every build or export.
+"""
+
+import argparse
+import os
+
+from compression import SIDECAR_SUFFIXES, available_encodings, compress
+
+EXTENSIONS = {'.html', '.js', '.css', '.json', '.svg', '.txt', '.xml', '.csv'}
+SKIP_DIRS = {'.git', 'node_modules', '__pycache__', 'netlify', 'corpus', 'benchmarks',
+             'venv', '.venv'}
+
+
+def find_assets(root, min_size):
+    """Static files under root worth compressing"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.startswith('.'))
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            if (os.path.splitext(filename)[1].lower() in EXTENSIONS
+                    and os.path.getsize(path) >= min_size):
+                yield path
+
+
+def precompress_assets(root='.', min_size=1024, force=False):
+    """Create or refresh sidecars; returns (written, up_to_date, skipped)"""
+    written = up_to_date = skipped = 0
+    encodings = available_encodings()
+    if 'br' not in encodings:
+        print("brotli not installed; writing .gz only. Run: pip install brotli")
+
+    for path in find_assets(root, min_size):
+        with open(path, 'rb') as f:
+            data = None
+            for encoding in encodings:
+                sidecar = path + SIDECAR_SUFFIXES[encoding]
+                if (not force and os.path.exists(sidecar)
+                        and os.path.getmtime(sidecar) >= os.path.getmtime(path)):
+                    up_to_date += 1
+                    continue
+
+                data = data if data is not None else f.read()
+                compressed = compress(data, encoding, dynamic=False)
+                if len(compressed) >= len(data):
+                    # Not worth sending; remove any old sidecar so it isn't served
+                    if os.path.exists(sidecar):
+                        os.remove(sidecar)
+                    skipped += 1
+                    continue
+
+                with open(sidecar, 'wb') as out:
+                    out.write(compressed)
+                written += 1
+                print(f"  {sidecar}: {len(data) / 1024:.1f} KB -> {len(compressed) / 1024:.1f} KB")
+
+    return written, up_to_date, skipped
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write .gz/.br sidecars for static assets')
+    parser.add_argument('--root', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='Directory the server serves (default: this directory)')
+    parser.add_argument('--min-size', type=int, default=1024,
+                        help='Skip files smaller than this many bytes (default: 1024)')
+    parser.add_argument('--force', action='store_true', help='Rewrite up-to-date sidecars too')
+    args = parser.parse_args()
+
+    written, up_to_date, skipped = precompress_assets(args.root, args.min_size, args.force)
+    print(f"\n✓ {written} sidecars written, {up_to_date} up to date, {skipped} not worth compressing")
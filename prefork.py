@@ -0,0 +1,395 @@
+"""
+Pre-forking production server for the web app
+
+The master process binds the listening socket, then forks `workers`
+processes that all accept() on it, so the kernel spreads connections
+across cores.  Each worker serves requests on a fixed pool of threads
+(which keeps RecipeDatabase's per-thread connections alive between
+requests) with HTTP/1.1 keep-alive.  Workers must not share SQLite
+handles with the master: RecipeDatabase drops inherited connections in
+the child, and each worker opens its own on first use.
+
+Signals to the master:
+    SIGHUP          graceful restart: start fresh workers, then let the old
+                    ones finish their in-flight requests and exit
+    SIGTERM/SIGINT  graceful shutdown
+
+Workers that die are replaced.  Per-worker counters live in shared
+memory, so any worker can report them all (see stats()).
+"""
+
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.sharedctypes import RawArray
+from typing import Callable, Dict, List, Optional
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from werkzeug.wsgi import LimitedStream
+
+STAT_FIELDS = ('pid', 'generation', 'started', 'requests', 'errors', 'in_flight', 'busy_seconds')
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """WSGIRequestHandler that keeps HTTP/1.1 connections open between requests
+
+    werkzeug's handler closes every connection because it can't tell where
+    a request body ends.  This one bounds wsgi.input by Content-Length and
+    skips whatever the app left unread, so the next request starts where
+    it should.  Idle connections are dropped after `timeout` seconds.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    timeout = 5  # overridden per server
+    max_drain = 1024 * 1024  # unread body bytes skipped rather than closing
+
+    def run_wsgi(self):
+        environ = self.make_environ()
+        body = None
+        if self.server.draining:
+            self.close_connection = True
+        if environ.get('wsgi.input_terminated'):
+            # Chunked upload: simplest to close rather than find its end
+            self.close_connection = True
+        else:
+            try:
+                length = max(0, int(environ.get('CONTENT_LENGTH') or 0))
+            except ValueError:
+                length = 0
+                self.close_connection = True
+            body = environ['wsgi.input'] = LimitedStream(self.rfile, length)
+            if length > self.max_drain:
+                self.close_connection = True
+
+        if self.headers.get('Expect', '').lower().strip() == '100-continue':
+            self.wfile.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+
+        state = {'status': None, 'headers': None, 'sent': False, 'chunked': False}
+
+        def write(data: bytes):
+            if not state['sent']:
+                code, _, message = state['status'].partition(' ')
+                code = int(code)
+                self.send_response(code, message)
+                names = set()
+                for name, value in state['headers']:
+                    self.send_header(name, value)
+                    names.add(name.lower())
+                if ('content-length' not in names and self.command != 'HEAD'
+                        and not 100 <= code < 200 and code not in (204, 304)):
+                    state['chunked'] = True
+                    self.send_header('Transfer-Encoding', 'chunked')
+                if self.close_connection:
+                    self.send_header('Connection', 'close')
+                self.end_headers()
+                state['sent'] = True
+            if data:
+                if state['chunked']:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                else:
+                    self.wfile.write(data)
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and state['sent']:
+                raise exc_info[1].with_traceback(exc_info[2])
+            state['status'], state['headers'] = status, headers
+            return write
+
+        try:
+            iterable = self.server.app(environ, start_response)
+            try:
+                for data in iterable:
+                    write(data)
+                if not state['sent']:
+                    write(b'')
+                if state['chunked']:
+                    self.wfile.write(b"0\r\n\r\n")
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+            if body is not None and not self.close_connection:
+                body.exhaust()
+            self.wfile.flush()
+        except (ConnectionError, socket.timeout) as e:
+            self.close_connection = True
+            self.connection_dropped(e, environ)
+        except Exception:
+            self.close_connection = True
+            if not state['sent']:
+                self.send_error(500)
+            self.server.log('error', f"Error on request:\n{traceback.format_exc()}")
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server that handles connections on a fixed thread pool"""
+
+    multithread = True
+    draining = False  # set on shutdown: finish the current request, then close
+
+    def __init__(self, host, port, app, threads: int = 8, **kwargs):
+        super().__init__(host, port, app, **kwargs)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class WorkerStats:
+    """Per-worker counters in memory shared by the master and every worker
+
+    Each worker owns one slot and is the only process writing to it; a
+    lock in the worker serialises its own threads.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self._values = RawArray('d', slots * len(STAT_FIELDS))
+        self._lock = threading.Lock()
+        self.slot = None  # this worker's slot, set after fork
+
+    def _index(self, slot: int, field: str) -> int:
+        return slot * len(STAT_FIELDS) + STAT_FIELDS.index(field)
+
+    def claim(self, slot: int, pid: int, generation: int):
+        for field in STAT_FIELDS:
+            self._values[self._index(slot, field)] = 0
+        self._values[self._index(slot, 'pid')] = pid
+        self._values[self._index(slot, 'generation')] = generation
+        self._values[self._index(slot, 'started')] = time.time()
+
+    def release(self, slot: int):
+        self._values[self._index(slot, 'pid')] = 0
+
+    def add(self, **amounts):
+        with self._lock:
+            for field, amount in amounts.items():
+                self._values[self._index(self.slot, field)] += amount
+
+    def snapshot(self) -> List[Dict]:
+        """Counters of every live worker"""
+        workers = []
+        for slot in range(self.slots):
+            row = {field: self._values[self._index(slot, field)] for field in STAT_FIELDS}
+            if row['pid']:
+                for field in ('pid', 'generation', 'requests', 'errors', 'in_flight'):
+                    row[field] = int(row[field])
+                row['uptime_seconds'] = time.time() - row.pop('started')
+                row['slot'] = slot
+                workers.append(row)
+        return workers
+
+
+class PreforkServer:
+    """Master process that keeps `workers` forked WSGI servers running"""
+
+    def __init__(self, app, host: str = '127.0.0.1', port: int = 5000, workers: int = 2,
+                 threads: int = 8, keepalive_timeout: float = 5.0, graceful_timeout: float = 30.0,
+                 on_worker_start: Optional[Callable[[], None]] = None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.keepalive_timeout = keepalive_timeout
+        self.graceful_timeout = graceful_timeout
+        self.on_worker_start = on_worker_start
+        # Two slots per worker so a restarting generation can overlap the old one
+        self.worker_stats = WorkerStats(workers * 2)
+        self.generation = 0
+        self._children: Dict[int, tuple] = {}  # pid -> (slot, generation)
+        self._restart = False
+        self._stopping = False
+        self.socket = None
+
+    # ------------------------------------------------------------------
+    # Master
+    # ------------------------------------------------------------------
+
+    def serve_forever(self):
+        """Bind, fork the workers and supervise them until shut down"""
+        self.socket = socket.create_server((self.host, self.port), backlog=1024)
+        self.socket.set_inheritable(True)
+        self.port = self.socket.getsockname()[1]
+
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, '_restart', True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, '_stopping', True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, '_stopping', True))
+
+        print(f"🚀 Master {os.getpid()} serving http://{self.host}:{self.port} "
+              f"with {self.workers} workers x {self.threads} threads")
+        self._spawn_generation()
+        try:
+            while not self._stopping:
+                self._reap()
+                if self._restart:
+                    self._restart = False
+                    self._graceful_restart()
+                time.sleep(0.2)
+        finally:
+            self._stop_all()
+            self.socket.close()
+
+    def _spawn_generation(self):
+        self.generation += 1
+        for slot in self._free_slots()[:self.workers]:
+            self._spawn(slot, self.generation)
+
+    def _free_slots(self) -> List[int]:
+        used = {slot for slot, _ in self._children.values()}
+        return [slot for slot in range(self.worker_stats.slots) if slot not in used]
+
+    def _spawn(self, slot: int, generation: int):
+        # SIGTERM stays blocked across fork() so the child can't run the
+        # master's handler (which would swallow it) before _run_worker
+        # puts back the default
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTERM})
+        pid = None
+        try:
+            pid = os.fork()
+        finally:
+            if pid != 0:
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+        if pid == 0:
+            code = 1
+            try:
+                self._run_worker(slot, generation)
+                code = 0
+            except BaseException as e:
+                print(f"❌ Worker {os.getpid()} failed: {e}", file=sys.stderr)
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self._children[pid] = (slot, generation)
+
+    def _reap(self) -> List[int]:
+        """Collect exited workers; replace any from the current generation"""
+        reaped = []
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            slot, generation = self._children.pop(pid, (None, None))
+            if slot is None:
+                continue
+            reaped.append(pid)
+            self.worker_stats.release(slot)
+            if generation == self.generation and not self._stopping:
+                print(f"⚠️  Worker {pid} exited unexpectedly (status {status}); replacing it")
+                self._spawn(slot, generation)
+        return reaped
+
+    def _graceful_restart(self):
+        if len(self._free_slots()) < self.workers:
+            # The generation before last is still draining; try again shortly
+            self._restart = True
+            return
+        old = [pid for pid, (_, generation) in self._children.items() if generation == self.generation]
+        print(f"🔄 Restarting: {len(old)} old workers finish in-flight requests and exit")
+        self._spawn_generation()
+        for pid in old:
+            self._signal(pid, signal.SIGTERM)
+
+    def _stop_all(self):
+        for pid in list(self._children):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self._children):
+            self._signal(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self._children.pop(pid, None)
+        print("👋 All workers stopped")
+
+    @staticmethod
+    def _signal(pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _run_worker(self, slot: int, generation: int):
+        # The master handles Ctrl-C; workers only stop when it tells them to.
+        # Until the server is up, SIGTERM (even one sent during fork()) just
+        # ends the worker.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGTERM})
+        self._children = {}
+        self.worker_stats.slot = slot
+        self.worker_stats.claim(slot, os.getpid(), generation)
+
+        if self.on_worker_start:
+            self.on_worker_start()
+
+        handler = type('WorkerRequestHandler', (KeepAliveRequestHandler,),
+                       {'timeout': self.keepalive_timeout})
+        server = PooledWSGIServer(self.host, self.port, self._count_requests(self.app),
+                                  threads=self.threads, handler=handler,
+                                  fd=self.socket.fileno())
+        # socket.fromfd() duplicated the listening socket; drop the original
+        self.socket.close()
+
+        def stop(*_):
+            # Idle keep-alive connections close within keepalive_timeout
+            server.draining = True
+            # shutdown() blocks until serve_forever() returns, so not on its thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        server.serve_forever(poll_interval=0.5)
+        server.pool.shutdown(wait=True)  # let in-flight requests finish
+
+    def _count_requests(self, app):
+        """Wrap the WSGI app so each request updates this worker's counters"""
+        worker_stats = self.worker_stats
+
+        def counted(environ, start_response):
+            status = []
+
+            def recording_start_response(status_line, headers, exc_info=None):
+                status[:] = [status_line]
+                return start_response(status_line, headers, exc_info)
+
+            start = time.perf_counter()
+            worker_stats.add(in_flight=1)
+            iterable = None
+            try:
+                iterable = app(environ, recording_start_response)
+                for chunk in iterable:
+                    yield chunk
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+                failed = not status or status[0].startswith('5')
+                worker_stats.add(in_flight=-1, requests=1, errors=int(failed),
+                                 busy_seconds=time.perf_counter() - start)
+
+        return counted
+
+    def stats(self) -> List[Dict]:
+        """Counters of every live worker, readable from any process"""
+        return self.worker_stats.snapshot()
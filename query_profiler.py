@@ -0,0 +1,268 @@
+"""
+Statement-level SQL profiling for RecipeDatabase
+
+A QueryProfiler collects, per distinct SQL statement, how often it ran, how
+long it took (total and p50/p95/p99 over recent executions) and how many
+rows it returned.  RecipeDatabase opens its connections with
+ProfiledConnection when given a profiler, so every statement it runs is
+timed from execute() until its last row has been fetched.
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Collapse "?, ?, ?" runs so IN lists of different lengths share one entry
+_PLACEHOLDER_RUN = re.compile(r'\?(?:\s*,\s*\?)+')
+
+
+def normalize_sql(sql: str) -> str:
+    """Reduce a statement to the key it is reported under"""
+    return _PLACEHOLDER_RUN.sub('?, ...', ' '.join(sql.split()))
+
+
+def _percentile(sorted_samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(0, min(len(sorted_samples) - 1, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[rank]
+
+
+class _StatementStats:
+    """Running totals for one normalized statement"""
+
+    __slots__ = ('count', 'total', 'max', 'rows', 'samples')
+
+    def __init__(self, sample_size: int):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=sample_size)
+
+
+class QueryProfiler:
+    """Collects per-statement execution counts, latency and row totals
+
+    Percentiles are computed over the most recent `sample_size` executions
+    of each statement.  Statements slower than `slow_query_ms` are logged
+    as warnings.  thread_elapsed() is a running total per thread, so a
+    caller can tell how much of a request was spent in SQL.
+
+    With statements=False only the per-thread totals (and capture()) are
+    kept: no per-statement table, so nothing is normalized or locked on
+    the common path.
+    """
+
+    def __init__(self, slow_query_ms: Optional[float] = None, sample_size: int = 1024,
+                 statements: bool = True):
+        self.slow_query_ms = slow_query_ms
+        self.sample_size = sample_size
+        self.statements = statements
+        self._stats: Dict[str, _StatementStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, sql: str, elapsed: float, rows: int = 0):
+        """Record one execution of `sql` that took `elapsed` seconds"""
+        self._local.elapsed = getattr(self._local, 'elapsed', 0.0) + elapsed
+        captured = getattr(self._local, 'captured', None)
+        slow = self.slow_query_ms is not None and elapsed * 1000 >= self.slow_query_ms
+        if not self.statements and captured is None and not slow:
+            return
+
+        key = normalize_sql(sql)
+        if self.statements:
+            with self._lock:
+                stats = self._stats.get(key)
+                if stats is None:
+                    stats = self._stats[key] = _StatementStats(self.sample_size)
+                stats.count += 1
+                stats.total += elapsed
+                stats.rows += rows
+                stats.max = max(stats.max, elapsed)
+                stats.samples.append(elapsed)
+        if captured is not None:
+            captured.append((key, elapsed, rows))
+
+        if slow:
+            logger.warning("Slow query (%.1f ms, %d rows): %s", elapsed * 1000, rows, key)
+
+    def thread_elapsed(self) -> float:
+        """Seconds of SQL recorded on the calling thread so far"""
+        return getattr(self._local, 'elapsed', 0.0)
+
+    def absorb(self, statements: List):
+        """Charge (sql, seconds, rows) run on another thread to this one
+
+        For work handed off to a helper thread (see write_queue): the time
+        is added to thread_elapsed() and the statements to any open
+        capture().  The per-statement totals already counted them.
+        """
+        self._local.elapsed = self.thread_elapsed() + sum(seconds for _, seconds, _ in statements)
+        captured = getattr(self._local, 'captured', None)
+        if captured is not None:
+            captured.extend(statements)
+
+    @contextmanager
+    def capture(self):
+        """Collect (sql, seconds, rows) for each statement this thread runs in the block"""
+        captured = []
+        previous = getattr(self._local, 'captured', None)
+        self._local.captured = captured
+        try:
+            yield captured
+        finally:
+            self._local.captured = previous
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self._lock:
+            self._stats = {}
+
+    def snapshot(self) -> List[Dict]:
+        """Per-statement numbers, slowest total time first (times in ms)"""
+        with self._lock:
+            items = [(sql, stats.count, stats.total, stats.max, stats.rows, sorted(stats.samples))
+                     for sql, stats in self._stats.items()]
+
+        report = []
+        for sql, count, total, max_time, rows, samples in items:
+            report.append({
+                'sql': sql,
+                'count': count,
+                'total_ms': total * 1000,
+                'mean_ms': total * 1000 / count,
+                'p50_ms': _percentile(samples, 50) * 1000,
+                'p95_ms': _percentile(samples, 95) * 1000,
+                'p99_ms': _percentile(samples, 99) * 1000,
+                'max_ms': max_time * 1000,
+                'rows': rows,
+            })
+        report.sort(key=lambda entry: entry['total_ms'], reverse=True)
+        return report
+
+    def format_report(self, limit: int = 20) -> str:
+        """Plain-text table of the `limit` most expensive statements"""
+        lines = [f"{'count':>7} {'total ms':>10} {'p50':>8} {'p95':>8} {'p99':>8} {'rows':>8}  statement"]
+        for entry in self.snapshot()[:limit]:
+            sql = entry['sql'] if len(entry['sql']) <= 100 else entry['sql'][:97] + '...'
+            lines.append(
+                f"{entry['count']:>7} {entry['total_ms']:>10.1f} {entry['p50_ms']:>8.2f} "
+                f"{entry['p95_ms']:>8.2f} {entry['p99_ms']:>8.2f} {entry['rows']:>8}  {sql}"
+            )
+        return '\n'.join(lines)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor that reports each statement to its connection's profiler
+
+    SQLite does most of a query's work while rows are being stepped, so an
+    execution is timed across execute() and every fetch, and recorded once
+    the rows are exhausted, the cursor is reused or it goes away.
+    """
+
+    _pending = None  # [sql, elapsed, rows] of the statement being fetched
+
+    def _finish(self):
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            self.connection.profiler.record(*pending)
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._pending = [sql, time.perf_counter() - start, 0]
+            if self.description is None:  # not a query; nothing to fetch
+                self._finish()
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection.profiler.record(sql, time.perf_counter() - start)
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        result = fetch(*args)
+        if self._pending is not None:
+            self._pending[1] += time.perf_counter() - start
+        return result
+
+    def fetchone(self):
+        row = self._timed_fetch(super().fetchone)
+        if row is None:
+            self._finish()
+        elif self._pending is not None:
+            self._pending[2] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+        if self._pending is not None:
+            self._pending[2] += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(super().fetchall)
+        if self._pending is not None:
+            self._pending[2] += len(rows)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose statements all run through ProfiledCursor
+
+    Set `profiler` after connecting (RecipeDatabase does this).
+    """
+
+    profiler = None
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self.profiler.record(sql_script, time.perf_counter() - start)
@@ -7,26 +7,33 @@ instead of using indirect references like "first 5 ingredients".
 import sqlite3
 import re
 from typing import List, Dict, Tuple
-
-def get_recipe_ingredients(cursor, recipe_id: int) -> List[Dict]:
-    """Get all ingredients for a recipe in order."""
-    cursor.execute("""
-        SELECT ingredient_order, quantity, unit, ingredient_name, preparation
-        FROM ingredients
-        WHERE recipe_id = ?
-        ORDER BY ingredient_order
-    """, (recipe_id,))
-
-    ingredients = []
-    for row in cursor.fetchall():
-        order, quantity, unit, name, prep = row
-        ingredients.append({
-            'order': order,
-            'quantity': quantity,
-            'unit': unit,
-            'name': name,
-            'preparation': prep
-        })
+from database import RecipeDatabase
+
+def get_ingredients_by_recipe(cursor, recipe_ids: List[int]) -> Dict[int, List[Dict]]:
+    """Get the ordered ingredients of many recipes, one query per chunk of IDs."""
+    ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+    ids = list(ingredients)
+
+    # Chunked to stay under SQLite's limit on bound variables
+    for start in range(0, len(ids), RecipeDatabase.HYDRATE_CHUNK_SIZE):
+        chunk = ids[start:start + RecipeDatabase.HYDRATE_CHUNK_SIZE]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f"""
+            SELECT recipe_id, ingredient_order, quantity, unit, ingredient_name, preparation
+            FROM ingredients
+            WHERE recipe_id IN ({placeholders})
+            ORDER BY recipe_id, ingredient_order
+        """, chunk)
+
+        for row in cursor.fetchall():
+            recipe_id, order, quantity, unit, name, prep = row
+            ingredients[recipe_id].append({
+                'order': order,
+                'quantity': quantity,
+                'unit': unit,
+                'name': name,
+                'preparation': prep
+            })
     return ingredients
 
 def format_ingredient(ing: Dict) -> str:
@@ -175,9 +182,12 @@ def update_instructions(db_path: str, dry_run: bool = True):
     instructions = cursor.fetchall()
     updates = []
 
+    # Load every recipe's ingredients up front rather than once per instruction
+    ingredients_by_recipe = get_ingredients_by_recipe(
+        cursor, list(dict.fromkeys(row[1] for row in instructions)))
+
     for inst_id, recipe_id, step_num, text, title in instructions:
-        # Get ingredients for this recipe
-        ingredients = get_recipe_ingredients(cursor, recipe_id)
+        ingredients = ingredients_by_recipe[recipe_id]
 
         # Replace references
         new_text = replace_ingredient_references(text, ingredients)
@@ -0,0 +1,188 @@
+"""
+On-demand profiling of single requests
+
+RequestProfiler is WSGI middleware that server.py installs only when
+started with --request-profiling.  A request carrying ?__profile=1 (or an
+X-Profile: 1 header) runs under cProfile; ?__profile=sample uses a
+sampling profiler instead, whose collapsed stacks load straight into
+flamegraph.pl or speedscope.
+
+The profiled request is handled as usual (minus the __profile argument),
+but the client gets a plain-text report instead of the response: the
+hottest functions, plus every SQL statement the request ran when the
+database has a QueryProfiler.  The raw profile (.prof for pstats /
+snakeviz, .collapsed for samples) is saved to the output directory.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Callable, Optional
+from urllib.parse import parse_qsl, urlencode
+
+PROFILE_ARG = '__profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+# ?__profile= values; anything else that is truthy means cProfile
+MODES = {'1': 'cprofile', 'true': 'cprofile', 'cprofile': 'cprofile', 'sample': 'sample'}
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval
+
+    Each sample is stored collapsed (outermost frame first, frames joined
+    by ';'), the format flame graph tools read.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+    def collapsed(self) -> str:
+        """One 'frame;frame;frame count' line per distinct stack"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """WSGI middleware that profiles requests which ask for it
+
+    `query_profiler` returns the database's QueryProfiler (or None) when
+    called, so the middleware follows the server if it swaps databases.
+    """
+
+    def __init__(self, app, output_dir: str = 'profiles',
+                 query_profiler: Optional[Callable] = None,
+                 sort: str = 'cumulative', limit: int = 40, interval: float = 0.001):
+        self.app = app
+        self.output_dir = output_dir
+        self.query_profiler = query_profiler or (lambda: None)
+        self.sort = sort
+        self.limit = limit
+        self.interval = interval
+
+    def __call__(self, environ, start_response):
+        mode = self._requested_mode(environ)
+        if mode is None:
+            return self.app(environ, start_response)
+        return self._profile(mode, environ, start_response)
+
+    @staticmethod
+    def _requested_mode(environ) -> Optional[str]:
+        """'cprofile', 'sample' or None, stripping __profile from the query string"""
+        query = parse_qsl(environ.get('QUERY_STRING', ''), keep_blank_values=True)
+        values = [value for name, value in query if name == PROFILE_ARG]
+        if values:
+            environ['QUERY_STRING'] = urlencode([(name, value) for name, value in query
+                                                 if name != PROFILE_ARG])
+        value = (values[-1] if values else environ.get(PROFILE_HEADER, '')).strip().lower()
+        if not value or value in ('0', 'false'):
+            return None
+        return MODES.get(value, 'cprofile')
+
+    def _profile(self, mode, environ, start_response):
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'] = status
+            return lambda data: None
+
+        query_profiler = self.query_profiler()
+        profiler = cProfile.Profile() if mode == 'cprofile' else None
+        sampler = StackSampler(threading.get_ident(), self.interval) if mode == 'sample' else None
+
+        start = time.perf_counter()
+        with (query_profiler.capture() if query_profiler else nullcontext()) as statements, \
+                (sampler or nullcontext()):
+            if profiler:
+                profiler.enable()
+            try:
+                # Drain the body inside the profile so streamed responses count
+                body = self.app(environ, capture_start_response)
+                try:
+                    size = sum(len(chunk) for chunk in body)
+                finally:
+                    if hasattr(body, 'close'):
+                        body.close()
+            finally:
+                if profiler:
+                    profiler.disable()
+        elapsed = time.perf_counter() - start
+
+        path = self._save(environ, profiler, sampler)
+        report = io.StringIO()
+        report.write(f"{environ['REQUEST_METHOD']} {environ.get('PATH_INFO', '')}"
+                     f"{'?' + environ['QUERY_STRING'] if environ.get('QUERY_STRING') else ''}\n")
+        report.write(f"Status {captured.get('status', '?')}, {size:,} bytes, "
+                     f"{elapsed * 1000:.1f} ms wall ({mode})\n")
+        report.write(f"Profile saved to {path}\n")
+        self._write_sql(report, statements)
+        report.write("\n")
+        if profiler:
+            pstats.Stats(profiler, stream=report).sort_stats(self.sort).print_stats(self.limit)
+        else:
+            report.write(f"{sum(sampler.stacks.values())} samples, hottest stacks:\n")
+            for stack, count in sampler.stacks.most_common(self.limit):
+                # Innermost frames first; the saved file has the full stacks
+                report.write(f"{count:>6}  {' <- '.join(reversed(stack.split(';')[-4:]))}\n")
+
+        body = report.getvalue().encode('utf-8')
+        start_response('200 OK', [('Content-Type', 'text/plain; charset=utf-8'),
+                                  ('Content-Length', str(len(body))),
+                                  ('Cache-Control', 'no-store'),
+                                  ('X-Profiled-Status', captured.get('status', ''))])
+        return [body]
+
+    @staticmethod
+    def _write_sql(report, statements):
+        if statements is None:
+            report.write("SQL timings unavailable (the database is not timing statements)\n")
+            return
+        total = sum(seconds for _, seconds, _ in statements)
+        report.write(f"SQL: {len(statements)} statements, {total * 1000:.2f} ms\n")
+        for sql, seconds, rows in statements:
+            sql = sql if len(sql) <= 120 else sql[:117] + '...'
+            report.write(f"  {seconds * 1000:>8.2f} ms {rows:>6} rows  {sql}\n")
+
+    def _save(self, environ, profiler, sampler) -> str:
+        """Write the raw profile and return its path"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', environ.get('PATH_INFO', '')).strip('_') or 'root'
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{environ['REQUEST_METHOD']}-{slug}"
+        if profiler:
+            path = os.path.join(self.output_dir, name + '.prof')
+            profiler.dump_stats(path)
+        else:
+            path = os.path.join(self.output_dir, name + '.collapsed')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(sampler.collapsed())
+        return path
@@ -0,0 +1,118 @@
+"""
+In-process LRU + TTL cache for read-endpoint responses
+
+Entries are grouped under version names: a listing might depend on
+'listings', a recipe page on ('recipe', 42).  Writers call bump() on the
+names they affect, which drops those entries at once.  set() only stores a
+value computed under the current version, so a response assembled while
+a write was landing is never cached.
+
+Memory is bounded by max_bytes (the sizes given to set()); the least
+recently used entries are evicted first.  Entries also expire after `ttl`
+seconds, which bounds staleness from writers outside this process.  When
+such writers are expected (several server processes), call sync() with a
+value that changes on every write, and the cache empties when it does.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class ResponseCache:
+    """Thread-safe LRU + TTL cache with versioned invalidation"""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl: float = 60.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, size, expires_at, depends_on)
+        self._versions: Dict[Hashable, int] = {}
+        self._epoch = 0  # bumped by sync(); part of every version
+        self._external_version = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = dict(hits=0, misses=0, evictions=0, expirations=0, invalidations=0)
+
+    def version(self, name: Hashable) -> Hashable:
+        """Current version of `name`; read it before computing a value"""
+        with self._lock:
+            return (self._epoch, self._versions.get(name, 0))
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Cached value for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            if entry[2] <= time.monotonic():
+                self._remove(key)
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, size: int, depends_on: Hashable,
+            version: Hashable) -> bool:
+        """Store value if `depends_on` is still at `version`; returns whether it was stored"""
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if (self._epoch, self._versions.get(depends_on, 0)) != version:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl, depends_on)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._counters['evictions'] += 1
+            return True
+
+    def bump(self, *names: Hashable):
+        """Invalidate everything cached under the given version names"""
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+            stale = [key for key, entry in self._entries.items() if entry[3] in names]
+            for key in stale:
+                self._remove(key)
+            self._counters['invalidations'] += len(stale)
+
+    def sync(self, external_version: Hashable) -> bool:
+        """Drop everything if `external_version` moved since the last call
+
+        Values being computed when it moves are not stored either.  Returns
+        whether the cache was invalidated.
+        """
+        with self._lock:
+            if external_version == self._external_version:
+                return False
+            self._external_version = external_version
+            self._epoch += 1
+            self._counters['invalidations'] += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+            return True
+
+    def clear(self):
+        """Drop every entry (versions keep counting)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return dict(self._counters,
+                        hit_rate=self._counters['hits'] / lookups if lookups else 0.0,
+                        entries=len(self._entries), bytes=self._bytes,
+                        max_bytes=self.max_bytes, ttl=self.ttl)
+
+    def _remove(self, key):
+        value, size, expires_at, depends_on = self._entries.pop(key)
+        self._bytes -= size
@@ -88,14 +88,61 @@ CREATE TABLE IF NOT EXISTS recipe_images (
     FOREIGN KEY (recipe_id) REFERENCES recipes(id) ON DELETE CASCADE
 );
 
--- Full-text search virtual table for recipes
+-- Full-text search virtual table for recipes (rowid = recipes.id)
 CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
     title,
     description,
     ingredients_text,
     instructions_text,
     tags_text,
-    content=recipes
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+-- Recipes whose search document is out of date. Triggers only queue the
+-- recipe id here; RecipeDatabase rebuilds the queued documents once per
+-- transaction (see RecipeDatabase.sync_search_index).
+CREATE TABLE IF NOT EXISTS search_index_queue (
+    recipe_id INTEGER PRIMARY KEY
+);
+
+-- Fully assembled recipe documents (the JSON get_recipe returns), so a
+-- detail read is one primary-key lookup. RecipeDatabase rebuilds a recipe's
+-- document in the same transaction as any change it makes; the
+-- recipe_docs_* triggers drop documents changed behind its back, and those
+-- are rebuilt on next read.
+-- etag is a hash of doc and modified the recipe's date_modified; together they
+-- answer conditional GETs without reading any other table.
+CREATE TABLE IF NOT EXISTS recipe_docs (
+    recipe_id INTEGER PRIMARY KEY,
+    doc TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    modified TEXT,
+    FOREIGN KEY (recipe_id) REFERENCES recipes(id) ON DELETE CASCADE
+);
+
+-- Counters bumped by triggers whenever a set of rows changes. 'recipes'
+-- changes with every insert, update or delete on recipes or their child
+-- rows and versions the recipe list for conditional GETs. 'epoch' is
+-- random per database file, so a regenerated database (whose counter starts
+-- over) never reuses an old version. 'recipes_modified' is the Unix time
+-- 'recipes' last moved, the Last-Modified of the recipe list.
+CREATE TABLE IF NOT EXISTS change_counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO change_counters (name, value) VALUES ('recipes', 0);
+INSERT OR IGNORE INTO change_counters (name, value) VALUES ('epoch', abs(random() % 4294967296));
+INSERT OR IGNORE INTO change_counters (name, value) VALUES ('recipes_modified', CAST(strftime('%s', 'now') AS INTEGER));
+
+-- Running counts behind RecipeDatabase.get_statistics, kept current by the
+-- recipe_stats_* triggers below. dimension is 'total', 'favorites', 'source'
+-- or 'cuisine'; value is the source/cuisine name ('' for the two totals).
+CREATE TABLE IF NOT EXISTS recipe_stats (
+    dimension TEXT NOT NULL,
+    value TEXT,
+    count INTEGER NOT NULL DEFAULT 0
 );
 
 -- Indexes for better query performance
@@ -105,10 +152,20 @@ CREATE INDEX IF NOT EXISTS idx_recipes_cuisine ON recipes(cuisine_type);
 CREATE INDEX IF NOT EXISTS idx_recipes_meal_type ON recipes(meal_type);
 CREATE INDEX IF NOT EXISTS idx_recipes_favorite ON recipes(favorite);
 CREATE INDEX IF NOT EXISTS idx_recipes_rating ON recipes(rating);
-CREATE INDEX IF NOT EXISTS idx_ingredients_recipe ON ingredients(recipe_id);
-CREATE INDEX IF NOT EXISTS idx_instructions_recipe ON instructions(recipe_id);
+CREATE INDEX IF NOT EXISTS idx_recipes_filename ON recipes(original_filename); -- import dedup lookups
+CREATE INDEX IF NOT EXISTS idx_recipes_modified ON recipes(date_modified, id); -- keyset pagination
+CREATE UNIQUE INDEX IF NOT EXISTS idx_recipe_stats_key ON recipe_stats(dimension, value);
 CREATE INDEX IF NOT EXISTS idx_cooking_log_recipe ON cooking_log(recipe_id);
-CREATE INDEX IF NOT EXISTS idx_recipe_images_recipe ON recipe_images(recipe_id);
+CREATE INDEX IF NOT EXISTS idx_recipe_tags_tag ON recipe_tags(tag_id); -- tag lookups and cascades
+
+-- Child rows are always read per recipe in display order, so the recipe
+-- indexes carry the order column too (replacing the recipe_id-only indexes)
+DROP INDEX IF EXISTS idx_ingredients_recipe;
+DROP INDEX IF EXISTS idx_instructions_recipe;
+DROP INDEX IF EXISTS idx_recipe_images_recipe;
+CREATE INDEX IF NOT EXISTS idx_ingredients_recipe_order ON ingredients(recipe_id, ingredient_order);
+CREATE INDEX IF NOT EXISTS idx_instructions_recipe_step ON instructions(recipe_id, step_number);
+CREATE INDEX IF NOT EXISTS idx_recipe_images_recipe_order ON recipe_images(recipe_id, display_order);
 
 -- Triggers to update modified timestamp
 CREATE TRIGGER IF NOT EXISTS update_recipe_timestamp
@@ -116,3 +173,317 @@ AFTER UPDATE ON recipes
 BEGIN
     UPDATE recipes SET date_modified = CURRENT_TIMESTAMP WHERE id = NEW.id;
 END;
+
+-- Triggers to queue recipes for search re-indexing
+CREATE TRIGGER IF NOT EXISTS search_queue_recipe_insert
+AFTER INSERT ON recipes
+BEGIN
+    INSERT OR IGNORE INTO search_index_queue (recipe_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_queue_recipe_update
+AFTER UPDATE OF title, description ON recipes
+BEGIN
+    INSERT OR IGNORE INTO search_index_queue (recipe_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_queue_recipe_delete
+AFTER DELETE ON recipes
+BEGIN
+    INSERT OR IGNORE INTO search_index_queue (recipe_id) VALUES (OLD.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_queue_ingredient_insert
+AFTER INSERT ON ingredients
+BEGIN
+    INSERT OR IGNORE INTO search_index_queue (recipe_id) VALUES (NEW.recipe_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_queue_ingredient_update
+AFTER UPDATE OF ingredient_name, recipe_id ON ingredients
+BEGIN
+    INSERT OR IGNORE INTO search_index_queue (recipe_id) VALUES (OLD.recipe_id), (NEW.recipe_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_queue_ingredient_delete
+AFTER DELETE ON ingredients
+BEGIN
+    INSERT OR IGNORE INTO search_index_queue (recipe_id) VALUES (OLD.recipe_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_queue_instruction_insert
+AFTER INSERT ON instructions
+BEGIN
+    INSERT OR IGNORE INTO search_index_queue (recipe_id) VALUES (NEW.recipe_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_queue_instruction_update
+AFTER UPDATE OF instruction_text, recipe_id ON instructions
+BEGIN
+    INSERT OR IGNORE INTO search_index_queue (recipe_id) VALUES (OLD.recipe_id), (NEW.recipe_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_queue_instruction_delete
+AFTER DELETE ON instructions
+BEGIN
+    INSERT OR IGNORE INTO search_index_queue (recipe_id) VALUES (OLD.recipe_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_queue_recipe_tag_insert
+AFTER INSERT ON recipe_tags
+BEGIN
+    INSERT OR IGNORE INTO search_index_queue (recipe_id) VALUES (NEW.recipe_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_queue_recipe_tag_delete
+AFTER DELETE ON recipe_tags
+BEGIN
+    INSERT OR IGNORE INTO search_index_queue (recipe_id) VALUES (OLD.recipe_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS search_queue_tag_rename
+AFTER UPDATE OF tag_name ON tags
+BEGIN
+    INSERT OR IGNORE INTO search_index_queue (recipe_id)
+    SELECT recipe_id FROM recipe_tags WHERE tag_id = NEW.id;
+END;
+
+-- Triggers to keep recipe_stats current
+CREATE TRIGGER IF NOT EXISTS recipe_stats_insert
+AFTER INSERT ON recipes
+BEGIN
+    INSERT INTO recipe_stats (dimension, value)
+    SELECT 'source', NEW.source_attribution
+    WHERE NOT EXISTS (SELECT 1 FROM recipe_stats
+                      WHERE dimension = 'source' AND value IS NEW.source_attribution);
+    INSERT INTO recipe_stats (dimension, value)
+    SELECT 'cuisine', NEW.cuisine_type
+    WHERE NEW.cuisine_type IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM recipe_stats
+                      WHERE dimension = 'cuisine' AND value = NEW.cuisine_type);
+
+    UPDATE recipe_stats SET count = count + 1 WHERE dimension = 'total' AND value = '';
+    UPDATE recipe_stats SET count = count + 1 WHERE dimension = 'favorites' AND value = '' AND NEW.favorite = 1;
+    UPDATE recipe_stats SET count = count + 1 WHERE dimension = 'source' AND value IS NEW.source_attribution;
+    UPDATE recipe_stats SET count = count + 1 WHERE dimension = 'cuisine' AND value = NEW.cuisine_type;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_stats_update
+AFTER UPDATE OF source_attribution, cuisine_type, favorite ON recipes
+BEGIN
+    INSERT INTO recipe_stats (dimension, value)
+    SELECT 'source', NEW.source_attribution
+    WHERE NOT EXISTS (SELECT 1 FROM recipe_stats
+                      WHERE dimension = 'source' AND value IS NEW.source_attribution);
+    INSERT INTO recipe_stats (dimension, value)
+    SELECT 'cuisine', NEW.cuisine_type
+    WHERE NEW.cuisine_type IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM recipe_stats
+                      WHERE dimension = 'cuisine' AND value = NEW.cuisine_type);
+
+    UPDATE recipe_stats SET count = count - 1 WHERE dimension = 'favorites' AND value = '' AND OLD.favorite = 1;
+    UPDATE recipe_stats SET count = count + 1 WHERE dimension = 'favorites' AND value = '' AND NEW.favorite = 1;
+    UPDATE recipe_stats SET count = count - 1 WHERE dimension = 'source' AND value IS OLD.source_attribution;
+    UPDATE recipe_stats SET count = count + 1 WHERE dimension = 'source' AND value IS NEW.source_attribution;
+    UPDATE recipe_stats SET count = count - 1 WHERE dimension = 'cuisine' AND value = OLD.cuisine_type;
+    UPDATE recipe_stats SET count = count + 1 WHERE dimension = 'cuisine' AND value = NEW.cuisine_type;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_stats_delete
+AFTER DELETE ON recipes
+BEGIN
+    UPDATE recipe_stats SET count = count - 1 WHERE dimension = 'total' AND value = '';
+    UPDATE recipe_stats SET count = count - 1 WHERE dimension = 'favorites' AND value = '' AND OLD.favorite = 1;
+    UPDATE recipe_stats SET count = count - 1 WHERE dimension = 'source' AND value IS OLD.source_attribution;
+    UPDATE recipe_stats SET count = count - 1 WHERE dimension = 'cuisine' AND value = OLD.cuisine_type;
+END;
+
+-- Triggers to version the recipe list
+
+CREATE TRIGGER IF NOT EXISTS change_counter_recipe_insert
+AFTER INSERT ON recipes
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_recipe_update
+AFTER UPDATE ON recipes
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_recipe_delete
+AFTER DELETE ON recipes
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+-- Child rows appear in listings with ?include=, and maintenance scripts
+-- edit them with raw SQL, so they move the version too
+
+CREATE TRIGGER IF NOT EXISTS change_counter_ingredient_insert
+AFTER INSERT ON ingredients
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_ingredient_update
+AFTER UPDATE ON ingredients
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_ingredient_delete
+AFTER DELETE ON ingredients
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_instruction_insert
+AFTER INSERT ON instructions
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_instruction_update
+AFTER UPDATE ON instructions
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_instruction_delete
+AFTER DELETE ON instructions
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_image_insert
+AFTER INSERT ON recipe_images
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_image_update
+AFTER UPDATE ON recipe_images
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_image_delete
+AFTER DELETE ON recipe_images
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_recipe_tag_insert
+AFTER INSERT ON recipe_tags
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_recipe_tag_delete
+AFTER DELETE ON recipe_tags
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_tag_rename
+AFTER UPDATE OF tag_name ON tags
+BEGIN
+    UPDATE change_counters SET value = value + 1 WHERE name = 'recipes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_counter_recipes_modified
+AFTER UPDATE OF value ON change_counters
+WHEN NEW.name = 'recipes'
+BEGIN
+    UPDATE change_counters SET value = CAST(strftime('%s', 'now') AS INTEGER)
+    WHERE name = 'recipes_modified';
+END;
+
+-- Triggers to drop recipe documents that no longer match their rows
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_recipe_update
+AFTER UPDATE ON recipes
+BEGIN
+    DELETE FROM recipe_docs WHERE recipe_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_recipe_delete
+AFTER DELETE ON recipes
+BEGIN
+    DELETE FROM recipe_docs WHERE recipe_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_ingredient_insert
+AFTER INSERT ON ingredients
+BEGIN
+    DELETE FROM recipe_docs WHERE recipe_id = NEW.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_ingredient_update
+AFTER UPDATE ON ingredients
+BEGIN
+    DELETE FROM recipe_docs WHERE recipe_id IN (OLD.recipe_id, NEW.recipe_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_ingredient_delete
+AFTER DELETE ON ingredients
+BEGIN
+    DELETE FROM recipe_docs WHERE recipe_id = OLD.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_instruction_insert
+AFTER INSERT ON instructions
+BEGIN
+    DELETE FROM recipe_docs WHERE recipe_id = NEW.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_instruction_update
+AFTER UPDATE ON instructions
+BEGIN
+    DELETE FROM recipe_docs WHERE recipe_id IN (OLD.recipe_id, NEW.recipe_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_instruction_delete
+AFTER DELETE ON instructions
+BEGIN
+    DELETE FROM recipe_docs WHERE recipe_id = OLD.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_image_insert
+AFTER INSERT ON recipe_images
+BEGIN
+    DELETE FROM recipe_docs WHERE recipe_id = NEW.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_image_update
+AFTER UPDATE ON recipe_images
+BEGIN
+    DELETE FROM recipe_docs WHERE recipe_id IN (OLD.recipe_id, NEW.recipe_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_image_delete
+AFTER DELETE ON recipe_images
+BEGIN
+    DELETE FROM recipe_docs WHERE recipe_id = OLD.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_recipe_tag_insert
+AFTER INSERT ON recipe_tags
+BEGIN
+    DELETE FROM recipe_docs WHERE recipe_id = NEW.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_recipe_tag_delete
+AFTER DELETE ON recipe_tags
+BEGIN
+    DELETE FROM recipe_docs WHERE recipe_id = OLD.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS recipe_docs_tag_rename
+AFTER UPDATE OF tag_name ON tags
+BEGIN
+    DELETE FROM recipe_docs
+    WHERE recipe_id IN (SELECT recipe_id FROM recipe_tags WHERE tag_id = NEW.id);
+END;
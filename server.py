@@ -2,10 +2,32 @@
 Flask web server - REST API and web interface for recipe database
 """
 
-from flask import Flask, jsonify, request, send_from_directory, render_template_string
+from flask import (Flask, g, has_request_context, jsonify, request, send_from_directory,
+                   render_template_string, stream_with_context)
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
 from database import RecipeDatabase
+from response_cache import ResponseCache
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from request_profiler import RequestProfiler
+from prefork import PreforkServer
+from write_queue import WriteCoordinator
+from admission import AdmissionController, parse_budget
+from compression import (SIDECAR_SUFFIXES, available_encodings, choose_encoding,
+                         compress, fresh_sidecars, is_compressible)
+from datetime import datetime, timezone
+from typing import Optional
+import functools
+import hashlib
+import json
+import logging
+import mimetypes
 import os
+import sqlite3
+import sys
+import time
 from pathlib import Path
 
 app = Flask(__name__)
@@ -13,50 +35,584 @@ CORS(app)  # Enable CORS for API access
 
 # Database instance
 db = RecipeDatabase()
+# Every API write goes through one writer thread (None: write directly)
+write_queue = WriteCoordinator(lambda: db)
+db.write_behind = write_queue.submit  # reads hand cache/index catch-up to the writer
 
 # Configuration
 RECIPES_DIR = os.path.dirname(os.path.abspath(__file__))
+app.config.setdefault('COMPRESS_MIN_SIZE', 1024)  # bytes; smaller bodies go out as-is
+app.config.setdefault('MAX_BATCH_SIZE', 500)  # IDs per ?ids= fetch, operations per batch write
+# Serve /api/debug/sql-profile (statement text and timings); set by --profile-sql
+app.config.setdefault('SQL_PROFILE_ENDPOINT', False)
+app.config.setdefault('WRITE_TIMEOUT', 30)  # seconds a request waits for its queued write
+# (concurrency, queue) per request class, see _admission_class(); over budget gets a 503
+app.config.setdefault('ADMISSION_BUDGETS', {'read': (64, 64), 'search': (4, 4), 'write': (8, 16)})
+app.config.setdefault('ADMISSION_WAIT', 1.0)  # seconds a queued request waits for a slot
+app.config.setdefault('ADMISSION_RETRY_AFTER', 1)  # seconds, sent with the 503
+# Set when other processes write to the database (--workers), so the
+# response cache checks the recipes change counter before serving
+app.config.setdefault('RESPONSE_CACHE_SYNC', False)
+
+
+# ============================================================================
+# Metrics (exposed at /api/metrics)
+# ============================================================================
+
+# Each process keeps its own numbers.  Under --workers every series gets a
+# worker="<pid>" label (see _label_worker_metrics), and the prefork_worker_*
+# series report all workers from shared memory whichever one is scraped.
+metrics = MetricsRegistry()
+REQUESTS = metrics.counter('http_requests_total', 'HTTP requests served',
+                           ('method', 'route', 'status'))
+REQUEST_LATENCY = metrics.histogram('http_request_duration_seconds',
+                                    'Time from request start until the response was done',
+                                    ('method', 'route', 'status'))
+IN_FLIGHT = metrics.gauge('http_requests_in_flight', 'Requests being handled right now')
+RESPONSE_BYTES = metrics.counter('http_response_bytes_total',
+                                 'Response body bytes sent, after compression (streamed bodies not counted)',
+                                 ('route',))
+DB_TIME = metrics.histogram('http_request_db_seconds',
+                            'Time spent running SQL per request (needs SQL timing, see --no-sql-timing)',
+                            ('route',))
+SERIALIZATION_TIME = metrics.histogram('http_request_serialization_seconds',
+                                       'Time spent encoding JSON responses per request', ('route',))
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that adds its encoding time to the current request's"""
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            if has_request_context():
+                g.serialization_seconds = g.get('serialization_seconds', 0.0) + time.perf_counter() - start
+
+
+app.json = TimedJSONProvider(app)
+
+
+def _route_label() -> str:
+    """The matched URL rule, so per-recipe URLs share one label"""
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _db_elapsed() -> Optional[float]:
+    return db.profiler.thread_elapsed() if db.profiler else None
+
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    g.db_start = _db_elapsed()
+    IN_FLIGHT.inc()
+
+
+# Registered ahead of compress_response so it runs after it (Flask runs
+# after_request hooks in reverse) and counts the bytes actually sent
+@app.after_request
+def record_response_metrics(response):
+    g.metrics_status = response.status_code
+    length = response.content_length
+    if length is None and not response.is_streamed:
+        length = response.calculate_content_length()
+    if length:
+        RESPONSE_BYTES.inc(length, route=_route_label())
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    """Runs once the response is done, after streaming for streamed ones"""
+    if 'metrics_start' not in g:
+        return
+    IN_FLIGHT.dec()
+    route = _route_label()
+    status = 500 if exc is not None else g.get('metrics_status', 500)
+    REQUESTS.inc(method=request.method, route=route, status=status)
+    REQUEST_LATENCY.observe(time.perf_counter() - g.metrics_start,
+                            method=request.method, route=route, status=status)
+    SERIALIZATION_TIME.observe(g.get('serialization_seconds', 0.0), route=route)
+    db_end = _db_elapsed()
+    if g.db_start is not None and db_end is not None:
+        DB_TIME.observe(db_end - g.db_start, route=route)
+
+
+def _response_cache_metric(field):
+    """Scrape-time reader for one response_cache.stats() field"""
+    def read():
+        return {(): response_cache.stats()[field]} if response_cache is not None else {}
+    return read
+
+
+for _field, _kind, _help in (
+        ('hits', 'counter', 'Response cache lookups answered from memory'),
+        ('misses', 'counter', 'Response cache lookups that ran the view'),
+        ('evictions', 'counter', 'Response cache entries evicted for space'),
+        ('invalidations', 'counter', 'Response cache entries dropped by writes'),
+        ('hit_rate', 'gauge', 'Response cache hits / lookups since start'),
+        ('entries', 'gauge', 'Responses held in the cache'),
+        ('bytes', 'gauge', 'Approximate memory held by cached responses')):
+    metrics.callback(f"response_cache_{_field}" + ('_total' if _kind == 'counter' else ''),
+                     _kind, _help, _response_cache_metric(_field))
+
+
+def _write_queue_metric(field):
+    """Scrape-time reader for one write_queue.stats() field"""
+    def read():
+        return {(): write_queue.stats()[field]} if write_queue is not None else {}
+    return read
+
+
+for _field, _kind, _help in (
+        ('writes', 'counter', 'Writes run by the database writer thread'),
+        ('failed', 'counter', 'Queued writes that raised or were rolled back'),
+        ('groups', 'counter', 'Transactions committed by the writer (each holds one or more writes)'),
+        ('lock_retries', 'counter', 'Write groups retried because another process held the lock'),
+        ('queued', 'gauge', 'Writes waiting for the writer thread')):
+    metrics.callback(f"db_write_queue_{_field}" + ('_total' if _kind == 'counter' else ''),
+                     _kind, _help, _write_queue_metric(_field))
+
+
+# ============================================================================
+# Admission control: separate concurrency budgets for reads, searches, writes
+# ============================================================================
+
+admission = AdmissionController(app.config['ADMISSION_BUDGETS'], wait=app.config['ADMISSION_WAIT'])
+# Monitoring, debugging and static files are never turned away
+ADMISSION_EXEMPT = {'get_metrics', 'worker_stats', 'sql_profile', 'response_cache_stats',
+                    'index', 'serve_static'}
+
+
+def _admission_class() -> Optional[str]:
+    """The budget a request counts against ('read', 'search', 'write'), or None
+
+    Searches and unpaged listings (no ?limit= or ?ids=) share the 'search'
+    budget; recipe pages, cursor pages, ?ids= fetches and statistics are
+    cheap 'read's.  Cached views only count against it on a cache miss.
+    """
+    if request.method == 'OPTIONS' or request.endpoint in ADMISSION_EXEMPT or request.endpoint is None:
+        return None
+    if request.method not in ('GET', 'HEAD'):
+        return 'write'
+    if request.endpoint == 'search_recipes':
+        return 'search'
+    if request.endpoint == 'get_recipes' and (
+            request.args.get('search') or not (request.args.get('limit') or request.args.get('ids'))):
+        return 'search'
+    return 'read'
+
+
+def admit():
+    """Hold a slot in the request's budget; a 503 response if it is full"""
+    if admission is None or 'admission_class' in g:
+        return None
+    name = _admission_class()
+    if not admission.enter(name):
+        response = jsonify({'success': False, 'error': f"Server busy ({name}), retry shortly"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(app.config['ADMISSION_RETRY_AFTER'])
+        return response
+    g.admission_class = name
+    return None
+
+
+@app.before_request
+def admit_request():
+    """Admit requests up front, except cached views (see cached_get)"""
+    if getattr(app.view_functions.get(request.endpoint), 'admits_on_miss', False):
+        return None
+    return admit()
+
+
+@app.teardown_request
+def release_admission(exc):
+    """Runs once the response is done, so streamed listings keep their slot"""
+    if 'admission_class' in g:
+        admission.leave(g.pop('admission_class'))
+
+
+def _admission_metric(field):
+    """Scrape-time reader for one field of admission.stats(), by class"""
+    def read():
+        if admission is None:
+            return {}
+        return {(name,): stats[field] for name, stats in admission.stats().items()}
+    return read
+
+
+for _field, _kind, _help in (
+        ('admitted', 'counter', 'Requests given a slot in their budget'),
+        ('rejected', 'counter', 'Requests turned away with a 503 because the queue was full'),
+        ('timed_out', 'counter', 'Queued requests turned away with a 503 after waiting for a slot'),
+        ('active', 'gauge', 'Requests holding a slot'),
+        ('waiting', 'gauge', 'Requests queued for a slot')):
+    metrics.callback(f"admission_{_field}" + ('_total' if _kind == 'counter' else ''),
+                     _kind, _help, _admission_metric(_field), ('class',))
+
+
+def _prefork_metric(field):
+    """Scrape-time reader for one WorkerStats field of every live worker"""
+    def read():
+        if prefork_server is None:
+            return {}
+        return {(str(worker['pid']),): worker[field] for worker in prefork_server.stats()}
+    return read
+
+
+for _field, _kind, _help in (
+        ('requests', 'counter', 'Requests finished by each worker process'),
+        ('errors', 'counter', 'Requests each worker answered with a 5xx'),
+        ('busy_seconds', 'counter', 'Time each worker spent handling requests'),
+        ('in_flight', 'gauge', 'Requests each worker is handling right now')):
+    metrics.callback(f"prefork_worker_{_field}" + ('_total' if _kind == 'counter' else ''),
+                     _kind, _help, _prefork_metric(_field), ('pid',), per_process=False)
+
+
+def _label_worker_metrics():
+    """Run in each forked worker: tell its series apart from the other workers'"""
+    metrics.constant_labels = {'worker': str(os.getpid())}
+
+
+@app.after_request
+def compress_response(response):
+    """Compress API responses for clients that accept gzip or brotli
+
+    Static files are skipped (they are sent straight from disk, from a
+    precompressed sidecar when there is one), as are streamed responses.
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or not is_compressible(response.mimetype)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    encoding = choose_encoding(request.accept_encodings, available_encodings())
+    if encoding is None:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes differ from the identity body, so a strong
+    # validator becomes weak (If-None-Match uses weak comparison anyway)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+# Read responses kept in memory; the write endpoints invalidate what they touch.
+# Listings, search results and statistics share the LISTINGS version; each
+# recipe page has its own ('recipe', id) version.
+response_cache = ResponseCache()
+prefork_server = None  # set by main() with --workers
+LISTINGS = 'listings'
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Vary')
+
+
+def cached_get(depends_on):
+    """Serve a GET view from response_cache
+
+    depends_on(**view_args) names the version the response depends on; the
+    cache key is that name plus the path and query string.  Only 200
+    responses are stored; conditional requests are answered from the
+    cached validators.  Cache hits are never turned away by admission
+    control; a miss takes its slot before running the view.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**view_args):
+            if response_cache is None or _stream_requested():
+                # Streamed listings are never stored, and NDJSON shares their URL
+                return admit() or view(**view_args)
+
+            if app.config['RESPONSE_CACHE_SYNC']:
+                response_cache.sync(db.get_recipes_version())
+
+            name = depends_on(**view_args)
+            key = (name, request.path, request.query_string)
+            entry = response_cache.get(key)
+            if entry is not None:
+                body, headers = entry
+                return app.response_class(body, headers=headers).make_conditional(request)
+
+            busy = admit()
+            if busy is not None:
+                return busy
+            version = response_cache.version(name)
+            response = app.make_response(view(**view_args))
+            if (response.status_code == 200 and not response.is_streamed
+                    and not response.direct_passthrough):
+                body = response.get_data()
+                headers = [(k, v) for k, v in response.headers.items() if k in CACHED_HEADERS]
+                size = len(body) + sum(len(k) + len(v) for k, v in headers) + 100
+                response_cache.set(key, (body, headers), size, name, version)
+            return response
+        wrapper.admits_on_miss = True
+        return wrapper
+    return decorator
+
+
+def run_write(method, *args):
+    """Run a RecipeDatabase write method through write_queue and return its result"""
+    if write_queue is None:
+        return method(*args)
+    return write_queue.call(method, *args, timeout=app.config['WRITE_TIMEOUT'])
+
+
+def invalidate_cached(*recipe_ids):
+    """Drop cached responses affected by a write (to the given recipes)"""
+    if response_cache is not None:
+        response_cache.bump(LISTINGS, *(('recipe', recipe_id) for recipe_id in recipe_ids))
 
 
 # ============================================================================
 # API Endpoints
 # ============================================================================
 
+def _parse_db_timestamp(value) -> Optional[datetime]:
+    """A stored timestamp as an aware UTC datetime (None if unparseable)"""
+    if not value:
+        return None
+    try:
+        timestamp = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
+
+
+def _projection_args():
+    """(fields, include) from ?fields= and ?include=; None when not given
+
+    Both are comma-separated; an empty ?include= asks for no child sections.
+    """
+    fields = request.args.get('fields')
+    include = request.args.get('include')
+    return (fields.split(',') if fields is not None else None,
+            include.split(',') if include is not None else None)
+
+
+def _ids_arg() -> Optional[list]:
+    """Recipe IDs from ?ids=1,5,9, or None when not given"""
+    ids = request.args.get('ids')
+    if ids is None:
+        return None
+    try:
+        ids = [int(recipe_id) for recipe_id in ids.split(',') if recipe_id.strip()]
+    except ValueError:
+        raise ValueError("ids must be a comma-separated list of integers")
+    if len(ids) > app.config['MAX_BATCH_SIZE']:
+        raise ValueError(f"At most {app.config['MAX_BATCH_SIZE']} ids per request")
+    return ids
+
+
+def _recipes_by_id(ids, fields, include):
+    """Response for GET /api/recipes?ids=...
+
+    Full recipes are spliced together from their cached documents, with an
+    ETag derived from theirs; IDs with no recipe are listed in `missing`.
+    """
+    if fields is not None or include is not None:
+        recipes = db.get_recipes_bulk(ids, fields=fields, include=include)
+        found = {recipe['id'] for recipe in recipes}
+        return jsonify({
+            'success': True,
+            'count': len(recipes),
+            'recipes': recipes,
+            'missing': [recipe_id for recipe_id in dict.fromkeys(ids) if recipe_id not in found]
+        })
+
+    documents = db.get_recipe_documents(ids)
+    missing = [recipe_id for recipe_id in dict.fromkeys(ids) if recipe_id not in documents]
+    response = app.response_class(
+        '{"success":true,"count":%d,"recipes":[%s],"missing":%s}' % (
+            len(documents), ','.join(doc for doc, _, _ in documents.values()), json.dumps(missing)),
+        mimetype='application/json'
+    )
+    etags = ','.join(etag for _, etag, _ in documents.values()) + '|' + json.dumps(missing)
+    response.set_etag(hashlib.blake2b(etags.encode('utf-8'), digest_size=16).hexdigest())
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def _stream_requested() -> Optional[str]:
+    """'ndjson' or 'json' when the client asked for a streamed listing
+
+    Accept: application/x-ndjson selects one JSON record per line; ?stream=1
+    streams the usual {"success": ..., "recipes": [...]} envelope.
+    """
+    offered = ['application/json', 'application/x-ndjson']
+    if request.accept_mimetypes.best_match(offered) == 'application/x-ndjson':
+        return 'ndjson'
+    if request.args.get('stream', type=int):
+        return 'json'
+    return None
+
+
+def _stream_recipes(recipes, mode):
+    """Streamed response that encodes recipes as they come off the cursor"""
+    def ndjson():
+        for recipe in recipes:
+            yield json.dumps(recipe, ensure_ascii=False) + '\n'
+
+    def envelope():
+        count = 0
+        yield '{"success":true,"recipes":['
+        for recipe in recipes:
+            yield (',' if count else '') + json.dumps(recipe, ensure_ascii=False)
+            count += 1
+        yield f'],"count":{count},"next_cursor":null}}'
+
+    if mode == 'ndjson':
+        return app.response_class(stream_with_context(ndjson()), mimetype='application/x-ndjson')
+    return app.response_class(stream_with_context(envelope()), mimetype='application/json')
+
+
+def _not_modified(etag):
+    """Empty 304 response carrying the current ETag"""
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+def _listing_etag(version: str, representation: str) -> str:
+    """ETag of one listing: the recipes version, the query and the representation
+
+    The query is normalized (parameters sorted) so reordering it doesn't
+    defeat revalidation.
+    """
+    query = sorted(request.args.items(multi=True))
+    digest = hashlib.blake2b(json.dumps([representation, query]).encode('utf-8'),
+                             digest_size=8).hexdigest()
+    return f"recipes-{version}-{digest}"
+
+
+def _set_listing_validators(response, etag, last_modified):
+    """Add a listing's validators, and Vary: Accept since NDJSON shares its URL"""
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    response.vary.add('Accept')
+    return response
+
+
 @app.route('/api/recipes', methods=['GET'])
+@cached_get(lambda: LISTINGS)
 def get_recipes():
-    """Get all recipes (summary view)"""
+    """Get all recipes (summary view)
+
+    With ?limit=N the response is one page plus a `next_cursor`; pass it
+    back as ?cursor= to get the following page.  ?offset= is still accepted
+    for older clients.  ?fields= picks the recipe columns (default: the
+    summary columns) and ?include= adds child sections, e.g.
+    ?fields=title,rating&include=tags.
+
+    ?ids=1,5,9 returns those recipes (complete, unless narrowed with
+    ?fields=/?include=) in the order given, replacing one request per recipe.
+
+    Outside cursor paging, Accept: application/x-ndjson or ?stream=1 streams
+    the listing (see _stream_requested) instead of building it in memory.
+
+    Listings carry an ETag built from the recipes change counter, the query
+    string and the representation (JSON or NDJSON), and the time recipes
+    last changed as Last-Modified.  A repeat request with If-None-Match or
+    If-Modified-Since gets a 304 without running the query.
+    """
     try:
         limit = request.args.get('limit', type=int)
         offset = request.args.get('offset', default=0, type=int)
+        page_cursor = request.args.get('cursor', default='', type=str)
         search = request.args.get('search', default='', type=str)
-
-        if search:
-            recipes = db.search_recipes(search)
-        else:
-            recipes = db.get_all_recipes(limit=limit, offset=offset)
-
-        return jsonify({
+        fields, include = _projection_args()
+        ids = _ids_arg()
+        if ids is not None:
+            return _recipes_by_id(ids, fields, include)
+        if page_cursor and not limit:
+            raise ValueError("cursor needs a limit")
+
+        etag = last_modified = None
+        next_cursor = None
+        with db.snapshot():
+            if search:
+                recipes = db.search_recipes(search, limit=limit)
+            else:
+                # Search ranks depend on child rows, so only listings are versioned
+                stream = _stream_requested() if not (limit and 'offset' not in request.args) else None
+                etag = _listing_etag(db.get_recipes_version(), stream or 'page')
+                last_modified = db.get_recipes_modified()
+                if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                    return _set_listing_validators(app.response_class(status=304), etag, last_modified)
+                if stream:
+                    # iter_recipes reads its own snapshot while the body is sent
+                    recipes = db.iter_recipes(limit=limit, offset=offset,
+                                              fields=fields, include=include or ())
+                    return _set_listing_validators(_stream_recipes(recipes, stream), etag, last_modified)
+                if limit and 'offset' not in request.args:
+                    recipes, next_cursor = db.get_recipes_page(
+                        limit, cursor=page_cursor or None, fields=fields, include=include or ())
+                else:
+                    recipes = db.get_all_recipes(limit=limit, offset=offset,
+                                                 fields=fields, include=include or ())
+
+        response = jsonify({
             'success': True,
             'count': len(recipes),
-            'recipes': recipes
+            'recipes': recipes,
+            'next_cursor': next_cursor
         })
+        if etag:
+            _set_listing_validators(response, etag, last_modified)
+        return response
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @app.route('/api/recipes/<int:recipe_id>', methods=['GET'])
+@cached_get(lambda recipe_id: ('recipe', recipe_id))
 def get_recipe(recipe_id):
-    """Get single recipe with full details"""
+    """Get single recipe with full details
+
+    Answers If-None-Match / If-Modified-Since with 304 using the ETag and
+    date stored next to the cached document.  ?fields= and ?include= (see
+    RecipeDatabase.get_recipe) return a partial recipe instead, reading
+    only the columns and child tables asked for.
+    """
     try:
-        recipe = db.get_recipe(recipe_id)
+        fields, include = _projection_args()
+        if fields is not None or include is not None:
+            recipe = db.get_recipe(recipe_id, fields=fields, include=include)
+            if recipe is None:
+                return jsonify({'success': False, 'error': 'Recipe not found'}), 404
+            return jsonify({'success': True, 'recipe': recipe})
+
+        document = db.get_recipe_document(recipe_id)
 
-        if not recipe:
+        if document is None:
             return jsonify({'success': False, 'error': 'Recipe not found'}), 404
 
-        return jsonify({
-            'success': True,
-            'recipe': recipe
-        })
+        # The cached document is already JSON, so it is spliced into the
+        # envelope as-is rather than decoded and re-encoded
+        recipe_json, etag, modified = document
+        response = app.response_class(
+            '{"success":true,"recipe":' + recipe_json + '}',
+            mimetype='application/json'
+        )
+        response.set_etag(etag)
+        response.last_modified = _parse_db_timestamp(modified)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -70,7 +626,8 @@ def create_recipe():
         if not recipe_data or 'title' not in recipe_data:
             return jsonify({'success': False, 'error': 'Title is required'}), 400
 
-        recipe_id = db.add_recipe(recipe_data)
+        recipe_id = run_write(db.add_recipe, recipe_data)
+        invalidate_cached()
 
         return jsonify({
             'success': True,
@@ -81,6 +638,46 @@ def create_recipe():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# HTTP-style status for each RecipeDatabase.write_batch() result
+BATCH_STATUS = {'created': 201, 'updated': 200, 'unchanged': 200, 'deleted': 200,
+                'not_found': 404, 'invalid': 400, 'error': 500}
+
+
+@app.route('/api/recipes/batch', methods=['POST'])
+def write_recipes_batch():
+    """Create, update and delete many recipes in one transaction
+
+    The body is {"operations": [...]} with items like
+    {"op": "create", "recipe": {...}}, {"op": "update", "id": 5, "recipe": {...}}
+    or {"op": "delete", "id": 9}.  Every operation gets its own result and
+    status; one that fails is rolled back alone and the rest still commit.
+    """
+    try:
+        payload = request.get_json(silent=True)
+        operations = payload.get('operations') if isinstance(payload, dict) else None
+
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'success': False, 'error': 'operations must be a non-empty list'}), 400
+        if len(operations) > app.config['MAX_BATCH_SIZE']:
+            return jsonify({'success': False,
+                            'error': f"At most {app.config['MAX_BATCH_SIZE']} operations per batch"}), 400
+
+        results = run_write(db.write_batch, operations)
+        for result in results:
+            result['status'] = BATCH_STATUS[result['result']]
+
+        if any(result['result'] in ('created', 'updated', 'deleted') for result in results):
+            invalidate_cached(*(result['id'] for result in results
+                                if result['result'] in ('updated', 'deleted')))
+
+        return jsonify({
+            'success': all(result['status'] < 400 for result in results),
+            'results': results
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/recipes/<int:recipe_id>', methods=['PUT'])
 def update_recipe(recipe_id):
     """Update existing recipe"""
@@ -90,15 +687,18 @@ def update_recipe(recipe_id):
         if not recipe_data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
 
-        success = db.update_recipe(recipe_id, recipe_data)
+        changed = run_write(db.update_recipe, recipe_id, recipe_data)
 
-        if success:
-            return jsonify({
-                'success': True,
-                'message': 'Recipe updated successfully'
-            })
-        else:
-            return jsonify({'success': False, 'error': 'Update failed'}), 500
+        if changed is None:
+            return jsonify({'success': False, 'error': 'Recipe not found'}), 404
+        if changed:
+            invalidate_cached(recipe_id)
+
+        return jsonify({
+            'success': True,
+            'message': 'Recipe updated successfully',
+            'changed': changed
+        })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -107,7 +707,8 @@ def update_recipe(recipe_id):
 def delete_recipe(recipe_id):
     """Delete recipe"""
     try:
-        success = db.delete_recipe(recipe_id)
+        success = run_write(db.delete_recipe, recipe_id)
+        invalidate_cached(recipe_id)
 
         if success:
             return jsonify({
@@ -121,6 +722,7 @@ def delete_recipe(recipe_id):
 
 
 @app.route('/api/statistics', methods=['GET'])
+@cached_get(lambda: LISTINGS)
 def get_statistics():
     """Get database statistics"""
     try:
@@ -134,39 +736,113 @@ def get_statistics():
 
 
 @app.route('/api/search', methods=['GET'])
+@cached_get(lambda: LISTINGS)
 def search_recipes():
-    """Search recipes"""
+    """Search recipes (full-text, ranked by relevance)"""
     try:
         query = request.args.get('q', default='', type=str)
+        limit = request.args.get('limit', type=int)
 
         if not query:
             return jsonify({'success': False, 'error': 'Search query required'}), 400
 
-        recipes = db.search_recipes(query)
+        recipes = db.search_recipes(query, limit=limit)
 
         return jsonify({
             'success': True,
             'count': len(recipes),
             'recipes': recipes
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request, latency, DB/serialization time and cache metrics for Prometheus
+
+    Under --workers a scrape reaches one worker: its series carry that
+    worker's pid as the `worker` label; sum them by the other labels for
+    server totals.  prefork_worker_* cover every live worker.
+    """
+    return app.response_class(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route('/api/debug/workers', methods=['GET'])
+def worker_stats():
+    """Per-worker request counters (only when started with --workers)"""
+    if prefork_server is None:
+        return jsonify({'success': False, 'error': 'Not running with --workers'}), 404
+    return jsonify({'success': True, 'pid': os.getpid(), 'workers': prefork_server.stats()})
+
+
+@app.route('/api/debug/sql-profile', methods=['GET', 'POST'])
+def sql_profile():
+    """Per-statement SQL timings (only when started with --profile-sql)
+
+    GET returns them (?format=text for a plain-text table); POST clears
+    them.
+    """
+    if not app.config['SQL_PROFILE_ENDPOINT'] or not db.profiler or not db.profiler.statements:
+        return jsonify({'success': False, 'error': 'SQL profiling is not enabled (--profile-sql)'}), 404
+
+    if request.method == 'POST':
+        db.profiler.reset()
+        return jsonify({'success': True, 'message': 'SQL profile cleared'})
+    if request.args.get('format') == 'text':
+        return app.response_class(db.profiler.format_report(), mimetype='text/plain')
+    return jsonify({'success': True, 'statements': db.query_stats()})
+
+
+@app.route('/api/debug/response-cache', methods=['GET'])
+def response_cache_stats():
+    """Response cache hit/miss/eviction counters; ?clear=1 empties the cache"""
+    if response_cache is None:
+        return jsonify({'success': False, 'error': 'Response cache is disabled'}), 404
+
+    stats = response_cache.stats()
+    if request.args.get('clear'):
+        response_cache.clear()
+    return jsonify({'success': True, 'cache': stats})
+
+
 # ============================================================================
 # Web Interface Routes
 # ============================================================================
 
+def _send_static(path):
+    """Send a static file, from a precompressed .br/.gz sidecar if one fits"""
+    full_path = safe_join(RECIPES_DIR, path)
+    sidecars = fresh_sidecars(full_path) if full_path else {}
+    if not sidecars:
+        return send_from_directory('.', path)
+
+    encoding = choose_encoding(request.accept_encodings,
+                               [name for name in SIDECAR_SUFFIXES if name in sidecars])
+    if encoding is None:
+        response = send_from_directory('.', path)
+    else:
+        response = send_from_directory(
+            '.', path + SIDECAR_SUFFIXES[encoding],
+            mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        )
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
 @app.route('/')
 def index():
     """Serve main web interface"""
-    return send_from_directory('.', 'index.html')
+    return _send_static('index.html')
 
 
 @app.route('/<path:path>')
 def serve_static(path):
     """Serve static files"""
-    return send_from_directory('.', path)
+    return _send_static(path)
 
 
 # ============================================================================
@@ -187,9 +863,20 @@ def server_error(e):
 # Main
 # ============================================================================
 
+def upgrade_database():
+    """Run the schema upgrade before serving; exits if the database can't take it"""
+    try:
+        return db.initialize_database()
+    except (OSError, sqlite3.Error) as e:
+        print(f"❌ Could not upgrade {db.db_path} to the current schema: {e}")
+        print("   Restore a backup or rebuild it with: python import_recipes.py")
+        sys.exit(1)
+
+
 def main():
     """Start the server"""
     import argparse
+    global response_cache, prefork_server, write_queue, admission
 
     parser = argparse.ArgumentParser(description='Recipe database web server')
     parser.add_argument('--host', default='127.0.0.1',
@@ -198,17 +885,119 @@ def main():
                        help='Port to bind to (default: 5000)')
     parser.add_argument('--debug', action='store_true',
                        help='Enable debug mode')
+    parser.add_argument('--workers', type=int, default=0,
+                       help='Serve with this many pre-forked worker processes instead of '
+                            'the development server (SIGHUP restarts them gracefully)')
+    parser.add_argument('--threads', type=int, default=8,
+                       help='With --workers, request threads per worker (default: 8)')
+    parser.add_argument('--keepalive-timeout', type=float, default=5,
+                       help='With --workers, seconds an idle keep-alive connection is kept (default: 5)')
+    parser.add_argument('--profile-sql', action='store_true',
+                       help='Keep per-statement SQL timings at /api/debug/sql-profile and log '
+                            'slow statements (see --slow-query-ms)')
+    parser.add_argument('--slow-query-ms', type=float,
+                       help='With --profile-sql, log statements slower than this')
+    parser.add_argument('--no-sql-timing', action='store_true',
+                       help="Don't time SQL at all (drops DB time from /api/metrics)")
+    parser.add_argument('--request-profiling', action='store_true',
+                       help='Profile requests sent with ?__profile=1 (or =sample) or an '
+                            'X-Profile header; never enable on a public server')
+    parser.add_argument('--profile-dir', default='profiles',
+                       help='Where --request-profiling saves profiles (default: profiles)')
+    parser.add_argument('--no-write-queue', action='store_true',
+                       help='Let request threads write to the database directly instead '
+                            'of through one writer thread that group-commits')
+    parser.add_argument('--read-limit', type=parse_budget,
+                       help='Concurrent[:queued] cheap reads, e.g. recipe pages (default: 64:64)')
+    parser.add_argument('--search-limit', type=parse_budget,
+                       help='Concurrent[:queued] searches and unpaged listings '
+                            '(default: 4:4, with --workers a quarter:eighth of --threads)')
+    parser.add_argument('--write-limit', type=parse_budget,
+                       help='Concurrent[:queued] writes (default: 8:16, with --workers as for searches)')
+    parser.add_argument('--no-admission-control', action='store_true',
+                       help="Don't limit concurrent requests or answer 503 when busy")
+    parser.add_argument('--response-cache-mb', type=float, default=32,
+                       help='Memory for cached read responses, 0 to disable (default: 32)')
+    parser.add_argument('--response-cache-ttl', type=float, default=60,
+                       help='Seconds a cached response may be served (default: 60)')
 
     args = parser.parse_args()
+    if args.workers and args.debug:
+        parser.error('--debug only works with the development server (no --workers)')
+
+    if args.profile_sql:
+        logging.basicConfig(level=logging.INFO)
+    # Per-request SQL time feeds the DB time metric; the per-statement table
+    # (and the endpoint that shows statement text) only with --profile-sql
+    if args.profile_sql or not args.no_sql_timing:
+        db.enable_profiling(slow_query_ms=args.slow_query_ms, statements=args.profile_sql)
+    app.config['SQL_PROFILE_ENDPOINT'] = args.profile_sql
+
+    if args.request_profiling:
+        app.wsgi_app = RequestProfiler(app.wsgi_app, output_dir=args.profile_dir,
+                                       query_profiler=lambda: db.profiler)
+
+    if args.no_write_queue:
+        write_queue = None
+        db.write_behind = None
+
+    # Bring an older recipes.db up to the current schema and build whatever
+    # derived data an upgrade or a script left missing, so requests start
+    # with nothing to catch up
+    derived = upgrade_database()
+    if any(derived.values()):
+        print(f"🔧 Indexed {derived['indexed']} recipes, built {derived['documents']} recipe documents")
+
+    budgets = dict(app.config['ADMISSION_BUDGETS'])
+    if args.workers:
+        # A worker has only --threads threads: leave most of them to reads
+        budgets.update(search=(max(1, args.threads // 4), args.threads // 8),
+                       write=(max(1, args.threads // 4), args.threads // 8))
+    for name, budget in (('read', args.read_limit), ('search', args.search_limit),
+                         ('write', args.write_limit)):
+        if budget:
+            budgets[name] = budget
+    if args.no_admission_control:
+        admission = None
+    else:
+        admission = AdmissionController(budgets, wait=app.config['ADMISSION_WAIT'])
+        # Queued requests hold a worker thread while they wait
+        held = sum(concurrency + queue for name, (concurrency, queue) in budgets.items()
+                   if name != 'read')
+        if args.workers and held >= args.threads:
+            print(f"⚠️  Search and write budgets can hold all {args.threads} threads of a worker; "
+                  f"lower --search-limit/--write-limit or raise --threads")
+
+    if args.response_cache_mb > 0:
+        response_cache = ResponseCache(max_bytes=int(args.response_cache_mb * 1024 * 1024),
+                                       ttl=args.response_cache_ttl)
+    else:
+        response_cache = None
 
     print(f"\n{'='*60}")
     print("Recipe Database Server")
     print(f"{'='*60}")
     print(f"Server starting at: http://{args.host}:{args.port}")
     print(f"API endpoint: http://{args.host}:{args.port}/api")
+    print(f"Metrics: http://{args.host}:{args.port}/api/metrics")
+    if args.request_profiling:
+        print(f"Request profiling: add ?__profile=1 to any URL (saved to {args.profile_dir}/)")
+    if args.profile_sql:
+        print(f"SQL profile: http://{args.host}:{args.port}/api/debug/sql-profile")
+    if args.workers:
+        print(f"Worker stats: http://{args.host}:{args.port}/api/debug/workers")
     print(f"{'='*60}\n")
 
-    app.run(host=args.host, port=args.port, debug=args.debug)
+    if args.workers:
+        # Writes land in whichever worker takes them; the others notice via the DB
+        app.config['RESPONSE_CACHE_SYNC'] = args.workers > 1
+        prefork_server = PreforkServer(app, host=args.host, port=args.port,
+                                       workers=args.workers, threads=args.threads,
+                                       keepalive_timeout=args.keepalive_timeout,
+                                       on_worker_start=_label_worker_metrics)
+        prefork_server.serve_forever()
+    else:
+        app.run(host=args.host, port=args.port, debug=args.debug)
 
 
 if __name__ == '__main__':
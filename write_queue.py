@@ -0,0 +1,213 @@
+"""
+Single-writer queue for database mutations
+
+SQLite allows one writer at a time.  When many request threads write at
+once, each opens its own BEGIN IMMEDIATE and the losers sit in
+busy_timeout (or fail with "database is locked"), and every small write
+pays for its own commit.  A WriteCoordinator instead funnels writes
+through one thread: callers submit() a function and get a Future, and the
+writer runs whatever has queued up since its last commit inside a single
+transaction, each write in its own savepoint.  One failing write is
+rolled back alone; the others still commit together (group commit).
+Futures resolve only after the commit, so a caller never sees a result
+that could still be rolled back.
+
+When the database times its statements (QueryProfiler), each future also
+carries the SQL its write ran, plus the group's BEGIN, commit-time index
+updates and COMMIT, which every write in the group waited for.  call()
+charges them to the calling thread, so per-request DB time and request
+profiles include writes made on the writer thread.
+
+Reads don't go through the queue: under WAL they keep running in parallel
+on their own connections.
+
+Other processes (pre-forked workers, the import scripts) still take the
+write lock directly.  The writer waits for them through busy_timeout and
+retries a group that could not get the lock, so they only contend with
+one connection per process.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Tuple
+
+# Stops the writer thread
+_STOP = object()
+
+
+class WriteFuture(Future):
+    """Future of a queued write, with the SQL it ran once it has finished"""
+
+    def __init__(self):
+        super().__init__()
+        self.statements: List[Tuple[str, float, int]] = []  # (sql, seconds, rows)
+
+
+class WriteCoordinator:
+    """Runs database writes on one thread, committing them in groups
+
+    `database` returns the RecipeDatabase to write to when called, so the
+    coordinator follows the server if it swaps databases.  Submitted
+    functions run inside an open transaction of it on the writer thread,
+    so RecipeDatabase's own write methods can be submitted as they are:
+    their transaction() blocks become savepoints.  At most `max_group`
+    writes share a commit; `max_delay` seconds is how long the writer
+    waits for more to arrive before committing (0 commits whatever is
+    queued right away).
+    """
+
+    # Times a group is retried after failing to get the write lock
+    LOCK_RETRIES = 3
+
+    def __init__(self, database: Callable, max_group: int = 64, max_delay: float = 0.0):
+        self.database = database
+        self.max_group = max_group
+        self.max_delay = max_delay
+        self._reset()
+
+        # The writer thread does not survive fork(); the child starts its own
+        if hasattr(os, 'register_at_fork'):
+            ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: ref() and ref()._reset())
+
+    def _reset(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = dict(writes=0, failed=0, groups=0, largest_group=0, lock_retries=0)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> WriteFuture:
+        """Queue fn(*args, **kwargs) to run on the writer thread
+
+        The Future holds its return value (or exception) once the group it
+        ran in has committed.  Called from the writer thread itself, fn
+        runs at once inside the current write.
+        """
+        future = WriteFuture()
+        if threading.current_thread() is self._thread:
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+            self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def call(self, fn: Callable, *args, timeout: float = None, **kwargs):
+        """submit() and wait for the result, charging its SQL to this thread"""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout)
+        finally:
+            profiler = self.database().profiler
+            if profiler and future.done():
+                profiler.absorb(future.statements)
+
+    def close(self, timeout: float = None):
+        """Finish the queued writes and stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self) -> Dict:
+        """Counters since start, plus the current queue depth"""
+        with self._lock:
+            return dict(self._stats, queued=self._queue.qsize())
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            group = self._next_group()
+            stop = group[-1] is _STOP
+            if stop:
+                group.pop()
+            if group:
+                self._commit_group(group)
+            if stop:
+                self.database().disconnect()
+                return
+
+    def _next_group(self):
+        """Block for one write, then take whatever else is queued (up to max_group)"""
+        group = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(group) < self.max_group and group[-1] is not _STOP:
+            try:
+                remaining = deadline - time.monotonic()
+                group.append(self._queue.get(timeout=remaining) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return group
+
+    def _commit_group(self, group):
+        # Cancelled futures are dropped; the rest can no longer be cancelled
+        group = [job for job in group if job[0].set_running_or_notify_cancel()]
+        db = self.database()
+        for attempt in range(self.LOCK_RETRIES + 1):
+            outcomes = []
+            try:
+                with self._capture(db) as shared, db.transaction():
+                    for future, fn, args, kwargs in group:
+                        with self._capture(db) as statements:
+                            try:
+                                with db.transaction():
+                                    outcomes.append((True, fn(*args, **kwargs), statements))
+                            except Exception as e:
+                                outcomes.append((False, e, statements))
+                break
+            except sqlite3.OperationalError as e:
+                # Another process held the write lock past busy_timeout
+                locked = 'locked' in str(e) or 'busy' in str(e)
+                if not locked or attempt == self.LOCK_RETRIES:
+                    return self._fail_group(group, e, shared)
+                with self._lock:
+                    self._stats['lock_retries'] += 1
+            except Exception as e:
+                return self._fail_group(group, e, shared)
+
+        failed = 0
+        for (future, _, _, _), (ok, value, statements) in zip(group, outcomes):
+            future.statements = (statements or []) + (shared or [])
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+                failed += 1
+        self._count(group, failed)
+
+    @staticmethod
+    def _capture(db):
+        """Collect the statements run in the block, if the database times them"""
+        return db.profiler.capture() if db.profiler else nullcontext()
+
+    def _fail_group(self, group, error: Exception, statements):
+        """Nothing in the group was committed: every write fails with `error`"""
+        for future, _, _, _ in group:
+            future.statements = list(statements or [])
+            future.set_exception(error)
+        self._count(group, len(group))
+
+    def _count(self, group, failed: int):
+        with self._lock:
+            self._stats['writes'] += len(group)
+            self._stats['failed'] += failed
+            self._stats['groups'] += 1
+            self._stats['largest_group'] = max(self._stats['largest_group'], len(group))